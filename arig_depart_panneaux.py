@@ -45,7 +45,7 @@ class CustomScenario(handlers.Scenario):
         #self.move(275-(ROBOT_LENGTH-ARM_OFFSET_TO_FRONT), 0)
         #self.arm_deploy(not BLUE_SIDE, False)
         #self.arm_deploy(BLUE_SIDE, False)
-        time.sleep(8)
+        self.sleep(8)
         self.move(215)
         for i in range(3):
             self.arm_deploy(not BLUE_SIDE, True)
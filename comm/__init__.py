@@ -1,4 +1,10 @@
-from .robot import Asserv, Action
+import atexit
+import os
+import time
+
+from .robot import Asserv, Action, I2CBase
+from .completion import make_completion
+from .profiler import BusProfiler
 
 NO_SMBUS = False
 
@@ -14,10 +20,41 @@ except Exception:
 ASSERV_I2C_ADDR = 0x69
 ACTION_I2C_ADDR = 0x68
 
-I2C_BUS = None if NO_SMBUS else smbus2.SMBus(1)
+# GPIO lines (BCM) raised by the picos when an order is done, None to poll over I2C
+ASSERV_READY_PIN = None
+ACTION_READY_PIN = None
+
+# HL_SIM=<speed> runs against simulated picos, <speed> times faster than real time
+SIM_SPEED = float(os.environ["HL_SIM"]) if os.environ.get("HL_SIM") else None
+SIMULATED = SIM_SPEED is not None
+
+if SIMULATED:
+	from . import sim
+	print(f"Running on simulated picos at x{SIM_SPEED}")
+	I2C_BUS = sim.make_bus(SIM_SPEED, ASSERV_I2C_ADDR, ACTION_I2C_ADDR)
+else:
+	I2C_BUS = None if NO_SMBUS else smbus2.SMBus(1)
+
+# Time the picos run at, waits in scenarios go through sleep() to keep up with the simulator
+TIME_SCALE = SIM_SPEED if SIMULATED else 1.0
+
+def sleep(seconds):
+	time.sleep(seconds/TIME_SCALE)
+
+# HL_PROFILE=<trace file> records every I2C transfer and writes the trace on exit
+PROFILE_PATH = os.environ.get("HL_PROFILE")
+
+if PROFILE_PATH:
+	I2CBase.profiler = BusProfiler()
+
+	def dump_profile():
+		I2CBase.profiler.dump(PROFILE_PATH)
+		print(I2CBase.profiler.summary())
+
+	atexit.register(dump_profile)
 
 def make_asserv():
-	return Asserv(I2C_BUS, ASSERV_I2C_ADDR)
+	return Asserv(I2C_BUS, ASSERV_I2C_ADDR, make_completion(ASSERV_READY_PIN, TIME_SCALE))
 
 def make_action():
-	return Action(I2C_BUS, ACTION_I2C_ADDR)
+	return Action(I2C_BUS, ACTION_I2C_ADDR, make_completion(ACTION_READY_PIN, TIME_SCALE))
@@ -0,0 +1,125 @@
+"""
+asyncio flavour of the picos, every order returns an awaitable.
+
+	asserv, action = AsyncAsserv(comm.make_asserv()), AsyncAction(comm.make_action())
+	await asyncio.gather(asserv.move(300, 0), action.left_arm_deploy())
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import math
+
+from .completion import POLL_MAX_INTERVAL
+
+# One worker thread per bus, I2C transfers from coroutines run there one at a time
+# (the bus lock still keeps them in line with the other threads)
+
+class AsyncBus:
+	def __init__(self):
+		self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="i2c")
+
+	async def run(self, func, *args, **kwargs):
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+	def close(self):
+		self.executor.shutdown()
+
+ASYNC_BUSES = {}
+
+def async_bus(bus):
+	if bus not in ASYNC_BUSES:
+		ASYNC_BUSES[bus] = AsyncBus()
+	return ASYNC_BUSES[bus]
+
+# Wraps a PicoBase, orders (block_cmd) are sent without blocking then awaited,
+# any other method runs on the bus executor and its result is awaited.
+
+class AsyncPico:
+	def __init__(self, pico):
+		self.pico = pico
+		self.bus = async_bus(pico.bus)
+		# A pico does one order at a time, gathered orders on the same one queue up
+		self.order_lock = asyncio.Lock()
+
+	def __getattr__(self, name):
+		attr = getattr(self.pico, name)
+		if not callable(attr):
+			return attr
+
+		if getattr(attr, "block_cmd", False):
+			stoppable = attr.stoppable
+
+			async def order(*args, **kwargs):
+				return await self.order(attr, stoppable, *args, **kwargs)
+		else:
+			async def order(*args, **kwargs):
+				return await self.bus.run(attr, *args, **kwargs)
+
+		order.__name__ = name
+		return order
+
+	async def wait_running(self):
+		while not self.pico.running_flag.is_set():
+			await asyncio.sleep(POLL_MAX_INTERVAL)
+
+	async def wait_completed(self):
+		if self.pico.i2c_simulate:
+			return
+
+		# The pico's own completion engine (polling or GPIO edges) blocks in a thread of its own,
+		# not on the bus executor, so other coroutines keep the bus meanwhile
+		loop = asyncio.get_running_loop()
+		await loop.run_in_executor(None, self.pico.completion.wait, self.pico)
+
+	async def order(self, func, stoppable, *args, blocking=True, **kwargs):
+		if stoppable:
+			await self.wait_running()
+
+		async with self.order_lock:
+			await self.bus.run(func, *args, blocking=False, **kwargs)
+
+			if blocking:
+				await self.wait_completed()
+
+		if stoppable and not self.pico.running_flag.is_set():
+			await self.wait_running()
+
+class AsyncAction(AsyncPico):
+	pass
+
+class AsyncAsserv(AsyncPico):
+	# Same restart logic as block_cmd(move_func=True), after an emergency stop
+	# we go on with what's left of the move
+	async def move(self, rho, theta, blocking=True):
+		await self.wait_running()
+		old_rho, old_theta = await self.bus.run(self.pico.get_pos)
+		await self.order(self.pico.move, False, rho, theta, blocking=blocking)
+
+		if not blocking or self.pico.running_flag.is_set():
+			return
+
+		await self.wait_running()
+		new_rho, new_theta = await self.bus.run(self.pico.get_pos)
+		new_cons_rho = 0 if rho == 0 else rho - (new_rho - old_rho)
+		new_cons_theta = 0 if theta == 0 else theta - (new_theta - old_theta)
+		print(f"Restart {new_cons_rho:.2f} {new_cons_theta:.2f}")
+		await self.move(new_cons_rho, new_cons_theta)
+
+	async def move_abs(self, tx, ty, blocking=True):
+		(dst, theta), (cx, cy) = await self.bus.run(lambda: (self.pico.get_pos(), self.pico.get_pos_xy()))
+		dx = tx - cx
+		dy = ty - cy
+
+		deltaTheta = (math.atan2(dy, dx)-theta)
+		deltaDst = math.sqrt(dx * dx + dy * dy)
+
+		sign = 1 if deltaTheta > 0 else -1
+
+		deltaTheta %= sign*2*math.pi
+
+		if abs(deltaTheta) > math.pi:
+			deltaTheta = deltaTheta - sign*2*math.pi
+
+		await self.move(deltaDst, deltaTheta, blocking=blocking)
@@ -0,0 +1,133 @@
+from enum import IntEnum
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+
+# Lower goes first
+class Priority(IntEnum):
+	SAFETY = 0
+	MOTION = 1
+	TELEMETRY = 2
+	DISPLAY = 3
+
+# Max number of waiters before telemetry/display requests get turned down
+BUS_MAX_QUEUE = 8
+
+class BusBusy(RuntimeError):
+	pass
+
+# Priority of the bus accesses made by the current thread, MOTION by default
+
+THREAD_PRIORITY = threading.local()
+
+def thread_priority():
+	return getattr(THREAD_PRIORITY, "priority", Priority.MOTION)
+
+def set_thread_priority(priority):
+	THREAD_PRIORITY.priority = priority
+
+@contextlib.contextmanager
+def bus_priority(priority):
+	old = thread_priority()
+	set_thread_priority(priority)
+	try:
+		yield
+	finally:
+		set_thread_priority(old)
+
+# A held bus, batches call preempt() between transfers to let more urgent requests through
+class Hold:
+	def __init__(self, arbiter, priority):
+		self.arbiter = arbiter
+		self.priority = priority
+		self.held = False
+
+	def __enter__(self):
+		self.priority = self.arbiter.acquire(self.priority)
+		self.held = True
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		if self.held:
+			self.arbiter.release()
+			self.held = False
+
+	def preempt(self):
+		if not self.arbiter.should_yield(self.priority):
+			return
+		self.arbiter.release()
+		self.held = False
+		# It already had the bus, wait for it back instead of being turned down mid batch
+		self.arbiter.acquire(self.priority, reject=False)
+		self.held = True
+
+# Drop-in for the bus lock, waiters are served by priority then arrival order
+
+class BusArbiter:
+	def __init__(self, max_queue=BUS_MAX_QUEUE):
+		self.cond = threading.Condition()
+		self.busy = False
+		self.queue = []
+		self.seq = itertools.count()
+		self.max_queue = max_queue
+
+		self.counts = {prio: 0 for prio in Priority}
+		self.worst_waits = {prio: 0.0 for prio in Priority}
+		self.rejected = {prio: 0 for prio in Priority}
+
+	# reject=False waits even if the queue is full
+	def acquire(self, priority=None, reject=True):
+		priority = thread_priority() if priority is None else priority
+		st = time.perf_counter()
+
+		with self.cond:
+			if self.busy or self.queue:
+				if reject and len(self.queue) >= self.max_queue and priority >= Priority.TELEMETRY:
+					self.rejected[priority] += 1
+					raise BusBusy(f"I2C bus queue full, dropping {priority.name} request")
+
+				ticket = (priority, next(self.seq))
+				heapq.heappush(self.queue, ticket)
+				while self.busy or self.queue[0] != ticket:
+					self.cond.wait()
+				heapq.heappop(self.queue)
+
+			self.busy = True
+			wait = time.perf_counter() - st
+			self.counts[priority] += 1
+			self.worst_waits[priority] = max(self.worst_waits[priority], wait)
+
+		return priority
+
+	def release(self):
+		with self.cond:
+			self.busy = False
+			if self.queue:
+				self.cond.notify_all()
+
+	# Is someone more urgent waiting, no lock needed it's only a hint
+	def should_yield(self, priority):
+		queue = self.queue
+		return len(queue) > 0 and queue[0][0] < priority
+
+	def hold(self, priority=None):
+		return Hold(self, priority)
+
+	# Same use as a threading.Lock
+	def __enter__(self):
+		self.acquire()
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self.release()
+
+	def worst_wait(self, priority=Priority.SAFETY):
+		return self.worst_waits[priority]
+
+	def report(self):
+		lines = [f"{'class':<10} {'count':>7} {'worst wait':>11} {'rejected':>9}"]
+		for prio in Priority:
+			lines.append(f"{prio.name:<10} {self.counts[prio]:7d} {self.worst_waits[prio]*1e3:9.2f}ms {self.rejected[prio]:9d}")
+		return "\n".join(lines)
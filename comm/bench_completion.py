@@ -0,0 +1,46 @@
+"""
+Latency of chained blocking orders against a simulated pico.
+
+python -m comm.bench_completion [nb_cmds] [max_cmd_duration_s]
+"""
+
+import random
+import statistics
+import sys
+import time
+
+from . import ACTION_I2C_ADDR
+from .completion import POLLING_RATE, PollCompletion, EdgeCompletion
+from .robot import Action
+from .sim import SimBus, SimPico
+
+def bench(name, completion, durations, edge=False):
+	bus = SimBus()
+	pico = bus.add(ACTION_I2C_ADDR, SimPico(0, completion.notify if edge else None))
+	action = Action(bus, ACTION_I2C_ADDR, completion)
+
+	lates = []
+	st = time.perf_counter()
+	for duration in durations:
+		pico.duration = duration
+		cmd_st = time.perf_counter()
+		action.left_arm_deploy()
+		lates.append(time.perf_counter() - cmd_st - duration)
+	total = time.perf_counter() - st
+
+	lates = [late*1e3 for late in lates]
+	print(f"{name:<10} total: {total:.3f}s late/cmd mean: {statistics.mean(lates):.2f}ms "
+		f"p50: {statistics.median(lates):.2f}ms max: {max(lates):.2f}ms")
+
+if __name__ == "__main__":
+	nb_cmds = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+	max_duration = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+
+	# Same random orders for every engine
+	random.seed(1)
+	durations = [random.uniform(0, max_duration) for _ in range(nb_cmds)]
+
+	print(f"{nb_cmds} chained orders, {sum(durations):.3f}s of actual work")
+	bench("fixed", PollCompletion(1.0/POLLING_RATE, 1.0/POLLING_RATE), durations)
+	bench("adaptive", PollCompletion(), durations)
+	bench("edge", EdgeCompletion(), durations, edge=True)
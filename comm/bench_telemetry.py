@@ -0,0 +1,92 @@
+"""
+Telemetry receive throughput against a local fake sender.
+
+python -m comm.bench_telemetry [nb_packets]
+"""
+
+import socket
+import struct
+import sys
+import threading
+import time
+import zlib
+
+from .telemetry import ENDIANNESS, UPLINK_HEADER, Client, Telemetry, PidTelemetryPacket, frame
+
+# Sends the whole stream to the first client and closes
+def fake_sender(data):
+	srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	srv.bind(("127.0.0.1", 0))
+	srv.listen(1)
+
+	def serve():
+		conn, _ = srv.accept()
+		conn.sendall(data)
+		conn.close()
+		srv.close()
+
+	threading.Thread(target=serve, daemon=True).start()
+	return srv.getsockname()[1]
+
+# The previous receiver, a few recv per packet
+def legacy_receive(port, callback):
+	sock = socket.create_connection(("127.0.0.1", port))
+	while True:
+		dat = sock.recv(1)
+		if not dat:
+			break
+		if dat[0] != UPLINK_HEADER[0]:
+			continue
+		dat = sock.recv(1)
+		if not dat or dat[0] != UPLINK_HEADER[1]:
+			continue
+		size_dat = sock.recv(2)
+		if len(size_dat) < 2:
+			continue
+		size, idx = struct.unpack(ENDIANNESS + "BB", size_dat)
+		pkt_data = sock.recv(size)
+		crc, = struct.unpack(ENDIANNESS + "I", sock.recv(4))
+		if crc != zlib.crc32(size_dat+pkt_data):
+			continue
+		callback(idx, pkt_data)
+	sock.close()
+
+def bench(name, data, nb_pkts, run):
+	count = [0]
+	def cb(idx, dat, n=1):
+		count[0] += n
+
+	port = fake_sender(data)
+	st = time.perf_counter()
+	run(port, cb)
+	total = time.perf_counter() - st
+	print(f"{name:<8} {count[0]}/{nb_pkts} packets in {total:.3f}s, {count[0]/total/1e3:.1f}k pkt/s, {len(data)/total/1e6:.1f}MB/s")
+
+def run_client(port, cb):
+	cl = Client("127.0.0.1", port, cb)
+	cl.client_thread.join()
+
+def run_batched(port, cb):
+	def batch_cb(pkts):
+		for idx, dat in pkts:
+			cb(idx, dat)
+	cl = Client("127.0.0.1", port, batch_cb, batch=True)
+	cl.client_thread.join()
+
+def run_arrays(port, cb, telems):
+	def array_cb(idx, arr):
+		cb(idx, arr, len(arr))
+	cl = Client("127.0.0.1", port, array_cb, telems=telems)
+	cl.client_thread.join()
+
+if __name__ == "__main__":
+	nb_pkts = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+	telem = Telemetry("pid_dst", 0, PidTelemetryPacket)
+	data = b"".join(frame(i % 4, telem.to_bytes(PidTelemetryPacket(i*1e-3, 1.0, 2.0, 3.0))) for i in range(nb_pkts))
+
+	bench("legacy", data, nb_pkts, legacy_receive)
+	bench("client", data, nb_pkts, run_client)
+	bench("batched", data, nb_pkts, run_batched)
+	bench("arrays", data, nb_pkts, lambda port, cb: run_arrays(port, cb, {i: telem for i in range(4)}))
@@ -0,0 +1,84 @@
+import threading
+import time
+
+# Optional, only available on the raspi
+try:
+	import RPi.GPIO as GPIO
+except Exception:
+	GPIO = None
+
+# Old fixed polling rate, still the safety net when waiting on edges
+POLLING_RATE = 30
+
+# Adaptive polling starts tight and backs off, most orders are either instant or long
+POLL_MIN_INTERVAL = 0.001
+POLL_MAX_INTERVAL = 0.01
+POLL_BACKOFF = 1.5
+
+# Completion engines, they block until the pico says it's ready for a new order
+
+class PollCompletion:
+	def __init__(self, min_interval=POLL_MIN_INTERVAL, max_interval=POLL_MAX_INTERVAL, backoff=POLL_BACKOFF):
+		self.min_interval = min_interval
+		self.max_interval = max_interval
+		self.backoff = backoff
+
+	def wait(self, pico):
+		interval = self.min_interval
+		while not pico.ready_for_order():
+			time.sleep(interval)
+			interval = min(interval*self.backoff, self.max_interval)
+
+	def close(self):
+		pass
+
+# Woken up by notify(), only checks the pico on each edge.
+# Still re-checks every timeout in case an edge got lost.
+class EdgeCompletion:
+	def __init__(self, timeout=1.0/POLLING_RATE):
+		self.timeout = timeout
+		self.cond = threading.Condition()
+		self.edges = 0
+
+	def notify(self, *args):
+		with self.cond:
+			self.edges += 1
+			self.cond.notify_all()
+
+	def wait(self, pico):
+		while True:
+			# Take the edge count before reading, so an edge between the read and the wait isn't missed
+			with self.cond:
+				seen = self.edges
+
+			if pico.ready_for_order():
+				return
+
+			with self.cond:
+				self.cond.wait_for(lambda: self.edges != seen, self.timeout)
+
+	def close(self):
+		pass
+
+# The pico raises a GPIO line when it finishes an order
+class GpioCompletion(EdgeCompletion):
+	def __init__(self, pin, timeout=1.0/POLLING_RATE):
+		if GPIO is None:
+			raise RuntimeError("RPi.GPIO isn't available, can't use a GPIO completion line")
+
+		super().__init__(timeout)
+		self.pin = pin
+
+		if GPIO.getmode() is None:
+			GPIO.setmode(GPIO.BCM)
+		GPIO.setup(pin, GPIO.IN, GPIO.PUD_DOWN)
+		GPIO.add_event_detect(pin, GPIO.RISING, callback=self.notify)
+
+	def close(self):
+		GPIO.remove_event_detect(self.pin)
+
+# speed: how much faster than real time the picos run (simulator), the polls keep up with it
+def make_completion(pin=None, speed=1.0):
+	if pin is None or GPIO is None:
+		return PollCompletion(POLL_MIN_INTERVAL/speed, POLL_MAX_INTERVAL/speed)
+	return GpioCompletion(pin, 1.0/POLLING_RATE/speed)
@@ -0,0 +1,238 @@
+"""
+Telemetry fan-out proxy, keeps the single upstream connection and serves many viewers.
+
+python -m comm.fanout [upstream ip] [upstream port] [listen port]
+
+Viewers connect to the listen port like they would to the telemetry port and can send text lines:
+  sub [idx...]            only receive these indexes, everything without any (the default)
+  unsub <idx> [idx...]
+  rate <idx> <hz>         rate wanted for an index, full rate by default, the extra frames aren't sent
+  policy drop|decimate    what to do when the viewer can't keep up
+
+With a TelemetryManager (comm.subscriptions), the pico only streams what viewers subscribed to,
+downsampled to the highest rate they asked for.
+The manager needs the pico object, so that's for a proxy started in process with start().
+"""
+
+import asyncio
+import collections
+import sys
+import threading
+import time
+
+from .telemetry import FrameParser, TELEMETRY_PORT
+
+FANOUT_PORT = 1338
+# Period of the telemetry manager updates (s)
+MANAGER_PERIOD = 1.0
+
+# Frames queued per subscriber before the backpressure policy kicks in
+SUB_QUEUE = 4096
+# Decimation bounds and the queue fill that doubles it
+MAX_DECIMATION = 64
+DECIMATE_HIGH = SUB_QUEUE//2
+
+DROP_OLDEST = "drop"
+DECIMATE = "decimate"
+POLICIES = (DROP_OLDEST, DECIMATE)
+
+class Subscriber:
+	def __init__(self, reader, writer, on_change=None):
+		self.reader = reader
+		self.writer = writer
+		self.on_change = on_change
+		self.name = writer.get_extra_info("peername")
+		self.idxs = None # None for all
+		self.rates = {}
+		# idx: time the next frame can be sent at, to keep to the rates
+		self.next_frame = {}
+		self.policy = DROP_OLDEST
+		self.queue = collections.deque(maxlen=SUB_QUEUE)
+		self.ready = asyncio.Event()
+		self.alive = True
+
+		self.decimation = 1
+		self.counters = collections.Counter()
+		self.sent = 0
+		self.dropped = 0
+
+	def wants(self, idx):
+		return self.idxs is None or idx in self.idxs
+
+	# Never blocks, called from the upstream loop
+	def push(self, idx, frame):
+		rate = self.rates.get(idx)
+		if rate is not None and rate > 0:
+			now = time.monotonic()
+			next_frame = self.next_frame.get(idx, now)
+			if now < next_frame:
+				return
+			# Late frames don't earn a burst after them
+			self.next_frame[idx] = max(next_frame, now - 1/rate) + 1/rate
+		if self.policy == DECIMATE and self.decimation > 1:
+			self.counters[idx] += 1
+			if self.counters[idx] % self.decimation != 0:
+				self.dropped += 1
+				return
+		if len(self.queue) == self.queue.maxlen:
+			self.dropped += 1
+		self.queue.append(frame)
+		self.ready.set()
+
+	def command(self, line):
+		args = line.split()
+		if not args:
+			return
+		cmd, args = args[0].lower(), args[1:]
+		if cmd == "sub":
+			self.idxs = None if not args else (self.idxs or set()) | {int(arg) for arg in args}
+		elif cmd == "unsub":
+			self.idxs = (self.idxs if self.idxs is not None else set(range(256))) - {int(arg) for arg in args}
+		elif cmd == "rate" and len(args) == 2:
+			self.rates[int(args[0])] = float(args[1])
+		elif cmd == "policy" and args and args[0] in POLICIES:
+			self.policy = args[0]
+			self.decimation = 1
+
+	# {idx: wanted rate or None} among the given indexes
+	def subscription(self, idxs):
+		return {idx: self.rates.get(idx) for idx in idxs if self.wants(idx)}
+
+	async def send_loop(self):
+		while self.alive:
+			await self.ready.wait()
+			self.ready.clear()
+
+			# Adapt the decimation to how far behind the viewer is
+			if self.policy == DECIMATE:
+				if len(self.queue) > DECIMATE_HIGH:
+					self.decimation = min(self.decimation*2, MAX_DECIMATION)
+				elif len(self.queue) == 0 and self.decimation > 1:
+					self.decimation //= 2
+
+			frames = []
+			while self.queue:
+				frames.append(self.queue.popleft())
+			if not frames:
+				continue
+
+			self.writer.write(b"".join(frames))
+			self.sent += len(frames)
+			await self.writer.drain()
+
+	async def command_loop(self):
+		while self.alive:
+			line = await self.reader.readline()
+			if not line:
+				break
+			try:
+				self.command(line.decode())
+			except ValueError:
+				continue
+			if self.on_change is not None:
+				self.on_change(self)
+
+class FanoutProxy:
+	def __init__(self, upstream_addr, upstream_port=TELEMETRY_PORT, port=FANOUT_PORT, manager=None):
+		self.upstream_addr = upstream_addr
+		self.upstream_port = upstream_port
+		self.port = port
+		self.manager = manager
+		self.parser = FrameParser()
+		self.subs = set()
+		self.received = 0
+		self.changed = None
+
+	def broadcast(self, pkts):
+		self.received += len(pkts)
+		subs = self.subs
+		manager = self.manager
+		for idx, _, frame in pkts:
+			if manager is not None:
+				manager.observe(idx, len(frame))
+			data = None
+			for sub in subs:
+				if sub.wants(idx):
+					# One copy per frame, shared by every subscriber
+					if data is None:
+						data = bytes(frame)
+					sub.push(idx, data)
+
+	async def upstream_loop(self):
+		reader, writer = await asyncio.open_connection(self.upstream_addr, self.upstream_port)
+		print(f"Connected to {self.upstream_addr}:{self.upstream_port}")
+		try:
+			while True:
+				data = await reader.read(1 << 15)
+				if not data:
+					break
+				self.broadcast(self.parser.feed(data, frames=True))
+		finally:
+			writer.close()
+			print("Upstream closed")
+
+	def subscription_changed(self, sub):
+		if self.manager is None:
+			return
+		self.manager.set_subscription(sub, sub.subscription(self.manager.pico.telems) if sub.alive else {})
+		self.changed.set()
+
+	# Applies the subscriptions right away when they change, and every period to follow the measured rates
+	async def manager_loop(self):
+		while True:
+			try:
+				await asyncio.wait_for(self.changed.wait(), MANAGER_PERIOD)
+			except asyncio.TimeoutError:
+				pass
+			self.changed.clear()
+			try:
+				await asyncio.to_thread(self.manager.update)
+			except Exception as e:
+				print(f"Telemetry manager Exception: {e}")
+
+	async def handle_sub(self, reader, writer):
+		sub = Subscriber(reader, writer, self.subscription_changed)
+		self.subs.add(sub)
+		self.subscription_changed(sub)
+		print(f"{sub.name} connected")
+
+		send = asyncio.create_task(sub.send_loop())
+		cmds = asyncio.create_task(sub.command_loop())
+		try:
+			await asyncio.wait((send, cmds), return_when=asyncio.FIRST_COMPLETED)
+		finally:
+			sub.alive = False
+			self.subs.discard(sub)
+			self.subscription_changed(sub)
+			send.cancel()
+			cmds.cancel()
+			writer.close()
+			print(f"{sub.name} disconnected, sent {sub.sent} dropped {sub.dropped}")
+
+	async def run(self):
+		self.changed = asyncio.Event()
+		server = await asyncio.start_server(self.handle_sub, port=self.port)
+		print(f"Serving telemetry on port {self.port}")
+		manager = asyncio.create_task(self.manager_loop()) if self.manager is not None else None
+		try:
+			async with server:
+				await self.upstream_loop()
+		finally:
+			if manager is not None:
+				manager.cancel()
+				await asyncio.to_thread(self.manager.stop)
+
+	# Runs the proxy in a background thread of the current process
+	def start(self):
+		self.thread = threading.Thread(target=asyncio.run, args=(self.run(),), daemon=True)
+		self.thread.start()
+
+if __name__ == "__main__":
+	addr = sys.argv[1] if len(sys.argv) > 1 else "127.0.0.1"
+	upstream_port = int(sys.argv[2]) if len(sys.argv) > 2 else TELEMETRY_PORT
+	port = int(sys.argv[3]) if len(sys.argv) > 3 else FANOUT_PORT
+
+	try:
+		asyncio.run(FanoutProxy(addr, upstream_port, port).run())
+	except KeyboardInterrupt:
+		pass
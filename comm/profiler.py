@@ -0,0 +1,164 @@
+"""
+Bus level I2C profiler, records every transfer in a ring buffer.
+
+Enable it with HL_PROFILE=<trace file> (see comm/__init__.py), the trace is written on exit.
+python -m comm.profiler <trace file> prints the summary of a trace.
+"""
+
+import struct
+import sys
+import threading
+import time
+
+READ = 0
+WRITE = 1
+BATCH = 2
+KIND_NAMES = {READ: "R", WRITE: "W", BATCH: "B"}
+
+# start (ns since profiler start), addr, reg, kind, thread, size, lock wait (ns), transfer (ns)
+RECORD = struct.Struct("<QBBBBHII")
+TRACE_MAGIC = b"HLI2"
+TRACE_VERSION = 1
+TRACE_HEADER = struct.Struct("<4sHII") # magic, version, nb threads, nb records
+
+# Waits longer than this count as contention
+CONTENDED_NS = 50_000
+
+U32_MAX = 0xFFFFFFFF
+
+# Wraps the lock (or arbiter hold) context of a bus access
+class Access:
+	def __init__(self, profiler, lock, addr, kind, reg, size):
+		self.profiler = profiler
+		self.lock = lock
+		self.addr = addr
+		self.kind = kind
+		self.reg = reg
+		self.size = size
+
+	def __enter__(self):
+		self.t_req = time.perf_counter_ns()
+		ret = self.lock.__enter__()
+		self.t_acq = time.perf_counter_ns()
+		return ret
+
+	def __exit__(self, exc_type, exc, tb):
+		t_end = time.perf_counter_ns()
+		self.lock.__exit__(exc_type, exc, tb)
+		self.profiler.record(self.t_req, self.addr, self.kind, self.reg, self.size, self.t_acq - self.t_req, t_end - self.t_acq)
+
+class BusProfiler:
+	def __init__(self, capacity=1 << 16):
+		self.capacity = capacity
+		self.buf = bytearray(RECORD.size*capacity)
+		self.count = 0
+		# Only held to grab a slot (and name a new thread), the record is packed outside of it
+		self.lock = threading.Lock()
+		self.t0 = time.perf_counter_ns()
+		self.threads = {}
+		# Per thread index, not by ident: idents are reused once a thread ends
+		self.local = threading.local()
+
+	def access(self, lock, addr, kind, reg, size):
+		return Access(self, lock, addr, kind, reg, size)
+
+	def thread_idx(self):
+		idx = getattr(self.local, "idx", None)
+		if idx is None:
+			name = threading.current_thread().name
+			with self.lock:
+				idx = self.threads.setdefault(name, len(self.threads))
+			self.local.idx = idx
+		return idx
+
+	def record(self, t_req, addr, kind, reg, size, wait, xfer):
+		thread = self.thread_idx()
+		with self.lock:
+			n = self.count
+			self.count = n + 1
+		off = (n % self.capacity)*RECORD.size
+		RECORD.pack_into(self.buf, off, t_req - self.t0, addr or 0, reg & 0xFF, kind, thread & 0xFF, size & 0xFFFF,
+			min(wait, U32_MAX), min(xfer, U32_MAX))
+
+	# Records in chronological order
+	def records(self):
+		n = min(self.count, self.capacity)
+		first = self.count % self.capacity if self.count > self.capacity else 0
+		for i in range(n):
+			yield RECORD.unpack_from(self.buf, ((first + i) % self.capacity)*RECORD.size)
+
+	def dump(self, path):
+		recs = list(self.records())
+		names = sorted(self.threads, key=self.threads.get)
+		with open(path, "wb") as f:
+			f.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, len(names), len(recs)))
+			for name in names:
+				enc = name.encode()[:255]
+				f.write(bytes([len(enc)]) + enc)
+			for rec in recs:
+				f.write(RECORD.pack(*rec))
+
+	def summary(self):
+		return summarize(list(self.records()), sorted(self.threads, key=self.threads.get))
+
+def load(path):
+	with open(path, "rb") as f:
+		data = f.read()
+
+	magic, version, nb_threads, nb_recs = TRACE_HEADER.unpack_from(data)
+	if magic != TRACE_MAGIC or version != TRACE_VERSION:
+		raise ValueError(f"{path} isn't an I2C trace")
+
+	off = TRACE_HEADER.size
+	names = []
+	for _ in range(nb_threads):
+		ln = data[off]
+		names.append(data[off+1:off+1+ln].decode())
+		off += 1 + ln
+
+	recs = [RECORD.unpack_from(data, off + i*RECORD.size) for i in range(nb_recs)]
+	return recs, names
+
+def percentile(vals, p):
+	if not vals:
+		return 0
+	return vals[min(len(vals)-1, int(p*len(vals)))]
+
+def summarize(recs, names):
+	if not recs:
+		return "No I2C transfer recorded"
+
+	span = max((recs[-1][0] - recs[0][0])/1e9, 1e-9)
+	lines = [f"{len(recs)} transfers over {span:.2f}s"]
+
+	regs = {}
+	threads = {}
+	for start, addr, reg, kind, thread, size, wait, xfer in recs:
+		regs.setdefault((addr, reg, kind), []).append((wait, xfer))
+		threads.setdefault(thread, []).append((wait, xfer))
+
+	lines.append(f"{'addr':>5} {'reg':>4} {'k':>1} {'count':>6} {'rate':>8} {'p50 us':>8} {'p99 us':>8} {'wait p99':>9}")
+	for (addr, reg, kind), vals in sorted(regs.items(), key=lambda x: -len(x[1])):
+		xfers = sorted(v[1] for v in vals)
+		waits = sorted(v[0] for v in vals)
+		lines.append(f"{addr:#5x} {reg:#4x} {KIND_NAMES[kind]:>1} {len(vals):6d} {len(vals)/span:7.1f}/s "
+			f"{percentile(xfers, 0.5)/1e3:8.1f} {percentile(xfers, 0.99)/1e3:8.1f} {percentile(waits, 0.99)/1e3:9.1f}")
+
+	lines.append("")
+	lines.append(f"{'thread':<24} {'count':>6} {'contended':>9} {'wait p50':>9} {'wait p99':>9} {'wait max':>9} {'bus %':>6}")
+	for thread, vals in sorted(threads.items()):
+		waits = sorted(v[0] for v in vals)
+		contended = sum(1 for w in waits if w > CONTENDED_NS)
+		busy = sum(v[1] for v in vals)/1e9/span*100
+		name = names[thread] if thread < len(names) else str(thread)
+		lines.append(f"{name[:24]:<24} {len(vals):6d} {contended/len(vals)*100:8.1f}% {percentile(waits, 0.5)/1e3:8.1f}u "
+			f"{percentile(waits, 0.99)/1e3:8.1f}u {waits[-1]/1e3:8.1f}u {busy:5.1f}%")
+
+	return "\n".join(lines)
+
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("Give a trace file")
+		exit()
+
+	print(summarize(*load(sys.argv[1])))
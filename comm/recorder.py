@@ -0,0 +1,205 @@
+"""
+Records telemetry to memory mapped column files, one directory per match.
+
+python -m comm.recorder <ip> [log dir] records until Ctrl-C.
+load_match(<match dir>) opens a recorded match instantly with np.memmap.
+"""
+
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from .telemetry import Client, Telemetry
+
+# magic, version, idx, capacity, count, fmt, name, comma separated field names
+LOG_MAGIC = b"HLTM"
+LOG_VERSION = 1
+# Sizes of the fmt, name and field names strings
+LOG_STR_SIZES = (32, 32, 168)
+LOG_HEADER = struct.Struct("<4sHBxQQ%ds%ds%ds" % LOG_STR_SIZES)
+LOG_HEADER_SIZE = LOG_HEADER.size
+# Offset of count in the header, updated after every append
+LOG_COUNT_OFF = 16
+
+# Enough for a whole match at a few kHz
+RECORD_DURATION = 100
+RECORD_RATE = 5000
+
+def column_offsets(dtype, capacity):
+	offs = {}
+	off = LOG_HEADER_SIZE
+	for name in dtype.names:
+		offs[name] = off
+		off += dtype[name].itemsize*capacity
+	return offs, off
+
+def columns(mm, dtype, capacity, count=None):
+	offs, _ = column_offsets(dtype, capacity)
+	count = capacity if count is None else count
+	return {name: mm[off:off+dtype[name].itemsize*capacity].view(dtype[name])[:count] for name, off in offs.items()}
+
+# One telemetry index, every field stored as a contiguous column of capacity samples
+
+class ColumnLog:
+	def __init__(self, path, telem, capacity):
+		self.path = path
+		self.telem = telem
+		self.capacity = capacity
+		self.count = 0
+		self.dropped = 0
+
+		# struct would silently cut them and load() couldn't read the file back
+		strs = (telem.fmt.encode(), telem.name.encode(), ",".join(telem.dtype.names).encode())
+		for value, size in zip(strs, LOG_STR_SIZES):
+			if len(value) > size:
+				raise ValueError(f"{telem.name}: {value.decode()!r} doesn't fit in the {size} bytes of the log header")
+
+		_, size = column_offsets(telem.dtype, capacity)
+		self.mm = np.memmap(path, np.uint8, "w+", shape=(size,))
+		LOG_HEADER.pack_into(self.mm, 0, LOG_MAGIC, LOG_VERSION, telem.idx, capacity, 0, *strs)
+		self.cols = columns(self.mm, telem.dtype, capacity)
+
+	def append(self, arr):
+		n = min(len(arr), self.capacity - self.count)
+		if n < len(arr):
+			self.dropped += len(arr) - n
+		if n == 0:
+			return
+
+		for name, col in self.cols.items():
+			col[self.count:self.count+n] = arr[name][:n]
+		self.count += n
+		struct.pack_into("<Q", self.mm, LOG_COUNT_OFF, self.count)
+
+	def close(self):
+		self.mm.flush()
+		del self.cols
+		del self.mm
+
+# Opens a log file read only, returns (header dict, {field: column})
+def load(path):
+	mm = np.memmap(path, np.uint8, "r")
+	magic, version, idx, capacity, count, fmt, name, names = LOG_HEADER.unpack_from(mm)
+	if magic != LOG_MAGIC or version != LOG_VERSION:
+		raise ValueError(f"{path} isn't a telemetry log")
+
+	fmt = fmt.rstrip(b"\0").decode()
+	names = tuple(names.rstrip(b"\0").decode().split(","))
+	dtype = Telemetry.get_dtype(fmt, names)
+	header = {"idx": idx, "name": name.rstrip(b"\0").decode(), "fmt": fmt, "capacity": capacity, "count": count}
+	return header, columns(mm, dtype, capacity, count)
+
+# {telemetry name: {field: column}} of a match directory
+def load_match(path):
+	logs = {}
+	for fname in sorted(os.listdir(path)):
+		if fname.endswith(".tlm"):
+			header, cols = load(os.path.join(path, fname))
+			logs[header["name"]] = cols
+	return logs
+
+def close_logs(logs):
+	for log in logs.values():
+		if log.dropped > 0:
+			print(f"{log.telem.name}: log full, dropped {log.dropped} samples")
+		log.close()
+
+class TelemetryRecorder:
+	def __init__(self, telems, path="logs", duration=RECORD_DURATION, rate=RECORD_RATE):
+		self.telems = telems
+		self.path = path
+		self.capacity = int(duration*rate)
+		self.logs = {}
+		# Logs of the previous match, kept until each index sees the restart
+		self.prev_logs = {}
+		self.started = set()
+		# Last timestamp of each index
+		self.last_ts = {}
+		self.match_path = None
+		self.client = None
+
+	# Starts a new match directory
+	def rotate(self):
+		close_logs(self.prev_logs)
+		self.prev_logs = self.logs
+		self.logs = {}
+		self.started = set()
+		self.match_path = os.path.join(self.path, time.strftime("%Y%m%d_%H%M%S"))
+		os.makedirs(self.match_path, exist_ok=True)
+		print(f"Recording to {self.match_path}")
+
+	def log_for(self, idx):
+		log = self.logs.get(idx)
+		if log is None:
+			if self.match_path is None:
+				self.rotate()
+			telem = self.telems[idx]
+			log = ColumnLog(os.path.join(self.match_path, f"{telem.name}.tlm"), telem, self.capacity)
+			self.logs[idx] = log
+		return log
+
+	# Log of the match the index is currently in
+	def current_log(self, idx):
+		if idx not in self.started and idx in self.prev_logs:
+			return self.prev_logs[idx]
+		return self.log_for(idx)
+
+	# Client callback, the timestamps going back means a new match,
+	# whether or not the sample at 0 made it (downsampling, pico counting since boot).
+	# The first index to restart rotates, the others follow when they restart too.
+	def handle_data(self, idx, arr):
+		ts = arr["timestamp"]
+		if len(ts) == 0:
+			return
+		resets = np.flatnonzero(ts[1:] < ts[:-1]) + 1
+		last = self.last_ts.get(idx)
+		if last is not None and ts[0] < last:
+			resets = np.concatenate(([0], resets))
+		self.last_ts[idx] = ts[-1]
+
+		if len(resets) == 0:
+			self.current_log(idx).append(arr)
+			return
+
+		reset = resets[-1]
+		if reset > 0:
+			self.current_log(idx).append(arr[:reset])
+		if idx in self.started or (not self.started and any(log.count > 0 for log in self.logs.values())):
+			self.rotate()
+		self.started.add(idx)
+		self.log_for(idx).append(arr[reset:])
+
+	def connect(self, addr, port=1337):
+		self.client = Client(addr, port, self.handle_data, telems=self.telems)
+
+	def close(self):
+		close_logs(self.prev_logs)
+		close_logs(self.logs)
+		self.prev_logs = {}
+		self.logs = {}
+
+	def stop(self):
+		if self.client is not None:
+			self.client.stop()
+			self.client = None
+		self.close()
+
+if __name__ == "__main__":
+	import comm
+
+	if len(sys.argv) < 2:
+		print("Give IP")
+		exit()
+
+	robot = comm.make_asserv()
+	rec = TelemetryRecorder(robot.telems, sys.argv[2] if len(sys.argv) > 2 else "logs")
+	rec.connect(sys.argv[1])
+	try:
+		while rec.client.alive:
+			time.sleep(0.5)
+	except KeyboardInterrupt:
+		pass
+	rec.stop()
@@ -0,0 +1,112 @@
+import struct
+
+from .arbiter import Priority
+
+ENDIANNESS = "<"
+
+# Compiled struct codecs, shared by format
+CODECS = {}
+
+def codec(fmt):
+	if fmt not in CODECS:
+		CODECS[fmt] = struct.Struct(ENDIANNESS + fmt)
+	return CODECS[fmt]
+
+# Register/sub-command pair with its precompiled codec.
+# A sub of None means it's given at call time (pid index, pump index...).
+# Single field registers decode to the value itself, others to a tuple.
+# priority None uses the calling thread's bus priority.
+
+class Register:
+	def __init__(self, name, reg, sub=0, fmt="", fields=(), write=False, block=False, priority=None):
+		self.name = name
+		self.reg = reg
+		self.sub = sub
+		self.addr = None if sub is None else reg | (sub << 4)
+		self.fmt = fmt
+		self.fields = fields
+		self.write = write
+		self.block = block
+		self.priority = priority
+
+		self.codec = codec(fmt)
+		self.size = self.codec.size
+		self.scalar = len(fields) == 1
+		self.zero = self.unpack(bytes(self.size))
+
+	def __repr__(self):
+		return f"Register({self.name}, {self.reg}, {self.sub}, {self.fmt!r})"
+
+	def addr_for(self, sub=None):
+		return self.addr if sub is None else self.reg | (sub << 4)
+
+	def unpack(self, data):
+		vals = self.codec.unpack(data)
+		return vals[0] if self.scalar else vals
+
+	def pack(self, *vals):
+		return self.codec.pack(*vals)
+
+class RegisterMap:
+	def __init__(self, *regs):
+		self.regs = regs
+		for reg in regs:
+			setattr(self, reg.name, reg)
+
+	def __iter__(self):
+		return iter(self.regs)
+
+# Register tables, names are the accessors generated on the classes
+
+PICO_REGS = RegisterMap(
+	Register("set_running", 0, 0, "B", ("state",), write=True, block=True, priority=Priority.SAFETY),
+	Register("telem_disable", 6, 0, "B", ("idx",), write=True),
+	Register("telem_enable", 6, 1, "B", ("idx",), write=True),
+	Register("telem_downsample", 6, 2, "BB", ("idx", "downsample"), write=True),
+	Register("ready_for_order", 10, 0, "?", ("ready",)),
+)
+
+ASSERV_REGS = RegisterMap(
+	Register("emergency_stop", 0, 1, write=True, priority=Priority.SAFETY),
+	Register("move", 1, 0, "ff", ("rho", "theta"), write=True, block=True),
+	Register("get_pid", 2, None, "fff", ("kp", "ki", "kd")),
+	Register("get_pos", 3, 0, "ff", ("rho", "theta")),
+	Register("get_pos_xy", 3, 1, "ff", ("x", "y")),
+	Register("set_pid", 5, None, "fff", ("kp", "ki", "kd"), write=True),
+	Register("debug_get_encoders", 11, 0, "iiii", ("left", "right", "left_spd", "right_spd")),
+	Register("debug_set_motors", 11, 1, "ff", ("left", "right"), write=True),
+	Register("debug_set_target", 11, 2, "ff", ("dst", "theta"), write=True),
+	Register("debug_set_motors_enable", 11, 3, "?", ("state",), write=True),
+	Register("debug_get_controller_state", 11, 4, "B", ("state",)),
+	Register("debug_get_left_bg_stats", 11, 5, "ffff", ("vel", "curr", "temp", "vbus")),
+	Register("debug_get_right_bg_stats", 11, 6, "ffff", ("vel", "curr", "temp", "vbus")),
+	Register("debug_set_effects", 11, 7, "BBBBBff", ("bools", "control", "blinker", "headlight", "ring", "pop_left", "pop_right"), write=True),
+	Register("debug_set_rgb", 11, 8, "IIB", ("rgb", "idx", "brightness"), write=True),
+	Register("debug_set_popup", 11, 9, "ff", ("left", "right"), write=True),
+	Register("get_dst_speedprofile", 12, 0, "ff", ("vmax", "amax")),
+	Register("get_angle_speedprofile", 12, 1, "ff", ("vmax", "amax")),
+	Register("set_dst_speedprofile", 13, 0, "ff", ("vmax", "amax"), write=True),
+	Register("set_angle_speedprofile", 13, 1, "ff", ("vmax", "amax"), write=True),
+	Register("get_battery_stats", 14, 0, "ffff", ("voltage", "current", "power", "percent")),
+)
+
+ACTION_REGS = RegisterMap(
+	Register("elev_home", 1, 0, write=True, block=True),
+	Register("elev_move_abs", 1, 1, "f", ("pos",), write=True, block=True),
+	Register("elev_move_rel", 1, 2, "f", ("pos",), write=True, block=True),
+	Register("elev_homed", 1, 3, "?", ("homed",)),
+	Register("elev_pos", 1, 4, "f", ("pos",)),
+	Register("right_arm_deploy", 2, 0, write=True, block=True),
+	Register("right_arm_fold", 2, 1, write=True, block=True),
+	Register("right_arm_turn", 2, 2, "f", ("angle",), write=True, block=True),
+	Register("right_arm_deployed", 2, 3, "?", ("deployed",)),
+	Register("right_arm_angles", 2, 4, "ff", ("deploy", "turn")),
+	Register("right_arm_half_deploy", 2, 5, write=True, block=True),
+	Register("left_arm_deploy", 3, 0, write=True, block=True),
+	Register("left_arm_fold", 3, 1, write=True, block=True),
+	Register("left_arm_turn", 3, 2, "f", ("angle",), write=True, block=True),
+	Register("left_arm_deployed", 3, 3, "?", ("deployed",)),
+	Register("left_arm_angles", 3, 4, "ff", ("deploy", "turn")),
+	Register("left_arm_half_deploy", 3, 5, write=True, block=True),
+	Register("pump_enable", 4, None, "?", ("state",), write=True, block=True),
+)
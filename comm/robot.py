@@ -1,14 +1,23 @@
 from dataclasses import dataclass
-import struct
 import time
 import math
 import threading
 from enum import Enum
 
 from . import telemetry
+from .completion import POLLING_RATE, PollCompletion
+from .registers import ENDIANNESS, codec, PICO_REGS, ASSERV_REGS, ACTION_REGS
+from .profiler import READ, WRITE, BATCH
+from .arbiter import BusArbiter, Priority
 
-ENDIANNESS = "<"
-POLLING_RATE = 30
+# Optional, only available on the raspi
+try:
+	from smbus2 import i2c_msg
+except Exception:
+	i2c_msg = None
+
+# Max number of messages the kernel takes in one I2C_RDWR
+I2C_RDWR_MAX_MSGS = 42
 
 @dataclass
 class Pid:
@@ -25,18 +34,22 @@ class Pid:
 		return self
 
 	def from_bytes(self, bys):
-		kp, ki, kd = struct.unpack(ENDIANNESS + "fff", bys)
+		kp, ki, kd = codec("fff").unpack(bys)
 		self.set(kp, ki, kd)
 		return self
 
 	def to_bytes(self):
-		return struct.pack(ENDIANNESS + "fff", self.kp, self.ki, self.kd)
+		return codec("fff").pack(self.kp, self.ki, self.kd)
 
 # Base class with I2C comm helpers
 
+# One BusArbiter per bus, it's used like a lock but serves requests by priority
 I2C_LOCKS = {}
 
 class I2CBase:
+	# Shared BusProfiler, None when not profiling
+	profiler = None
+
 	def __init__(self, bus=None, addr=None):
 		self.bus = bus
 		self.addr = addr
@@ -44,21 +57,29 @@ class I2CBase:
 		if bus in I2C_LOCKS:
 			self.lock = I2C_LOCKS[bus]
 		else:
-			self.lock = threading.Lock()
+			self.lock = BusArbiter()
 			I2C_LOCKS[bus] = self.lock
 
+	# Every bus access takes the lock through here, so it can be profiled.
+	# priority None uses the calling thread's priority (see comm.arbiter)
+	def access(self, kind, reg, size, priority=None):
+		hold = self.lock.hold(priority)
+		if self.profiler is None:
+			return hold
+		return self.profiler.access(hold, self.addr, kind, reg, size)
+
 	def write(self, reg, data):
 		if self.i2c_simulate:
 			return
 
-		with self.lock:
+		with self.access(WRITE, reg, len(data)):
 			self.bus.write_i2c_block_data(self.addr, reg, data)
 
 	def read(self, reg, size):
 		if self.i2c_simulate:
 			return b"\x00"*size
 
-		with self.lock:
+		with self.access(READ, reg, size):
 			dat = bytes(self.bus.read_i2c_block_data(self.addr, reg, size))
 
 		return dat
@@ -67,11 +88,125 @@ class I2CBase:
 		self.write(reg, [])
 
 	def write_struct(self, reg, fmt, *data):
-		self.write(reg, struct.pack(ENDIANNESS + fmt, *data))
+		self.write(reg, codec(fmt).pack(*data))
 
 	def read_struct(self, reg, fmt):
-		ret = self.read(reg, struct.calcsize(fmt))
-		return struct.unpack(ENDIANNESS + fmt, ret)
+		st = codec(fmt)
+		return st.unpack(self.read(reg, st.size))
+
+	# Register descriptor access with its precompiled codec
+
+	def read_reg(self, reg, sub=None):
+		if self.i2c_simulate:
+			return reg.zero
+
+		with self.access(READ, reg.addr_for(sub), reg.size, reg.priority):
+			return reg.unpack(bytes(self.bus.read_i2c_block_data(self.addr, reg.addr_for(sub), reg.size)))
+
+	def write_reg(self, reg, *vals, sub=None):
+		if self.i2c_simulate:
+			return
+
+		with self.access(WRITE, reg.addr_for(sub), reg.size, reg.priority):
+			self.bus.write_i2c_block_data(self.addr, reg.addr_for(sub), reg.pack(*vals))
+
+	def batch(self):
+		return I2CBatch(self)
+
+	# Runs queued (reg, data, size) ops under one lock, returns the data of every read
+	def transfer(self, ops):
+		if self.i2c_simulate:
+			return [b"\x00"*size for _, data, size in ops if data is None]
+
+		# Profiled as one access on the first register, with the total size
+		with self.access(BATCH, ops[0][0] if ops else 0, sum(size or len(data) for _, data, size in ops)) as hold:
+			if i2c_msg is None or not hasattr(self.bus, "i2c_rdwr"):
+				rets = []
+				for reg, data, size in ops:
+					hold.preempt()
+					if data is None:
+						rets.append(bytes(self.bus.read_i2c_block_data(self.addr, reg, size)))
+					else:
+						self.bus.write_i2c_block_data(self.addr, reg, data)
+				return rets
+
+			# Low priority batches go one op per transfer so more urgent requests can cut in
+			preemptible = hold.priority > Priority.MOTION
+
+			# Reads are a register write and a read with a repeated start
+			msgs, reads = [], []
+			for reg, data, size in ops:
+				if data is None:
+					read = i2c_msg.read(self.addr, size)
+					op_msgs = [i2c_msg.write(self.addr, [reg]), read]
+					reads.append(read)
+				else:
+					op_msgs = [i2c_msg.write(self.addr, [reg] + list(data))]
+
+				# Don't split a register write from its read
+				if msgs and (preemptible or len(msgs) + len(op_msgs) > I2C_RDWR_MAX_MSGS):
+					self.bus.i2c_rdwr(*msgs)
+					msgs = []
+					hold.preempt()
+				msgs.extend(op_msgs)
+
+			if msgs:
+				self.bus.i2c_rdwr(*msgs)
+
+		return [bytes(msg) for msg in reads]
+
+# Reads and writes queued to run as one I2C transaction
+
+class I2CBatch:
+	def __init__(self, dev):
+		self.dev = dev
+		self.ops = []
+		self.decoders = []
+		self.results = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		if exc_type is None:
+			self.run()
+
+	def write(self, reg, data):
+		self.ops.append((reg, bytes(data), 0))
+		return self
+
+	def write_cmd(self, reg):
+		return self.write(reg, [])
+
+	def write_struct(self, reg, fmt, *data):
+		return self.write(reg, codec(fmt).pack(*data))
+
+	def write_reg(self, reg, *vals, sub=None):
+		return self.write(reg.addr_for(sub), reg.pack(*vals))
+
+	def read(self, reg, size):
+		self.ops.append((reg, None, size))
+		self.decoders.append(None)
+		return self
+
+	def read_struct(self, reg, fmt):
+		st = codec(fmt)
+		self.ops.append((reg, None, st.size))
+		self.decoders.append(st.unpack)
+		return self
+
+	def read_reg(self, reg, sub=None):
+		self.ops.append((reg.addr_for(sub), None, reg.size))
+		self.decoders.append(reg.unpack)
+		return self
+
+	# Returns one result per queued read, in order. Raw bytes for read(), decoded values otherwise
+	def run(self):
+		rets = self.dev.transfer(self.ops)
+		self.results = [ret if dec is None else dec(ret) for dec, ret in zip(self.decoders, rets)]
+		self.ops = []
+		self.decoders = []
+		return self.results
 
 # A decorator to block until the command has finished
 def block_cmd(stoppable=False, move_func=False):
@@ -125,16 +260,55 @@ def block_cmd(stoppable=False, move_func=False):
 					print(f"Restart {new_cons_rho:.2f} {new_cons_theta:.2f} {kwargs}")
 					inner(self, new_cons_rho, new_cons_theta, blocking=blocking, **kwargs)
 
+		# Lets wrappers (comm.aio) know this is an order
+		inner.block_cmd = True
+		inner.stoppable = stoppable
+		inner.__name__ = func.__name__
+		inner.__doc__ = func.__doc__
 		return inner
 
 	return decorator
 
+# Generates the plain accessors of a register table, unless the class writes them by hand
+def register_accessors(regs):
+
+	def decorator(cls):
+		for reg in regs:
+			if reg.name not in cls.__dict__:
+				setattr(cls, reg.name, make_accessor(reg))
+		return cls
+
+	return decorator
+
+def make_accessor(reg):
+	# Registers without a fixed sub take it as first argument
+	if reg.write and reg.sub is None:
+		def accessor(self, sub, *vals):
+			self.write_reg(reg, *vals, sub=sub)
+	elif reg.write:
+		def accessor(self, *vals):
+			self.write_reg(reg, *vals)
+	elif reg.sub is None:
+		def accessor(self, sub):
+			return self.read_reg(reg, sub)
+	else:
+		def accessor(self):
+			return self.read_reg(reg)
+
+	if reg.block:
+		accessor = block_cmd()(accessor)
+
+	accessor.__name__ = reg.name
+	accessor.__doc__ = f"{'Writes' if reg.write else 'Reads'} register {reg.reg}: {', '.join(reg.fields) or 'command'}"
+	return accessor
 
 # Base class for pico microcontrollers on robots
 
+@register_accessors(PICO_REGS)
 class PicoBase(I2CBase):
-	def __init__(self, bus=None, addr=None):
+	def __init__(self, bus=None, addr=None, completion=None):
 		super().__init__(bus, addr)
+		self.set_completion(completion)
 		self.set_blocking(True)
 		self.set_running(False)
 		self.telems = {}
@@ -163,6 +337,11 @@ class PicoBase(I2CBase):
 	def is_blocking(self):
 		return self.blocking
 
+	# Completion logic
+
+	def set_completion(self, completion):
+		self.completion = completion if completion is not None else PollCompletion()
+
 	# Stoppable state logic
 
 	def notify_stop(self):
@@ -182,7 +361,7 @@ class PicoBase(I2CBase):
 	@block_cmd()
 	def set_running(self, state):
 		state = not not state
-		self.write_struct(0, "B", state)
+		self.write_reg(PICO_REGS.set_running, state)
 		self.running = state
 
 	def start(self):
@@ -192,21 +371,17 @@ class PicoBase(I2CBase):
 		self.set_running(False)
 
 	def set_telem(self, telem, state):
-		self.write_struct(6 | ((1 if state else 0) << 4), "B", telem.idx)
+		self.write_reg(PICO_REGS.telem_enable if state else PICO_REGS.telem_disable, telem.idx)
 
 	def set_telem_downsample(self, telem, downsample):
-		self.write_struct(6 | (2 << 4), "BB", telem.idx, downsample)
-
-	# Read registers
+		self.write_reg(PICO_REGS.telem_downsample, telem.idx, downsample)
 
-	def ready_for_order(self):
-		return self.read_struct(10, "?")[0] == 1
+	# Read registers are generated from PICO_REGS (ready_for_order)
 
 	# Command Helpers
 
 	def wait_completed(self):
-		while not self.ready_for_order():
-			time.sleep(1.0/POLLING_RATE)
+		self.completion.wait(self)
 
 class BlinkerState(Enum):
 	OFF = 0
@@ -236,10 +411,12 @@ class RingState(Enum):
 	BATTERY = 6
 
 # Class for the pico that handles moving
+# Plain register accessors are generated from ASSERV_REGS
 
+@register_accessors(ASSERV_REGS)
 class Asserv(PicoBase):
-	def __init__(self, bus=None, addr=None):
-		super().__init__(bus, addr)
+	def __init__(self, bus=None, addr=None, completion=None):
+		super().__init__(bus, addr, completion)
 
 		self.last_pos = (0,0) # rho, theta
 		self.last_pos_xy = (0,0) # x, y
@@ -277,7 +454,7 @@ class Asserv(PicoBase):
 
 	@block_cmd(stoppable=True, move_func=True)
 	def move(self, rho, theta):
-		self.write_struct(1, "ff", rho, theta)
+		self.write_reg(ASSERV_REGS.move, rho, theta)
 
 	def move_abs(self, tx, ty):
 		dst, theta = self.get_pos()
@@ -298,153 +475,70 @@ class Asserv(PicoBase):
 		#print(f"Moving {deltaTheta}rads, {deltaDst}mm")
 		self.move(deltaDst, deltaTheta)
 
-	def emergency_stop(self):
-		self.write_cmd(0 | (1 << 4))
-
 	def set_pid(self, pid):
 		self.pids[pid.idx] = pid
-		self.write(5 | (pid.idx << 4), pid.to_bytes())
-
-	def set_dst_speedprofile(self, vmax, amax):
-		return self.write_struct(13 | (0 << 4), "ff", vmax, amax)
-
-	def set_angle_speedprofile(self, vmax, amax):
-		return self.write_struct(13 | (1 << 4), "ff", vmax, amax)
+		self.write_reg(ASSERV_REGS.set_pid, pid.kp, pid.ki, pid.kd, sub=pid.idx)
 
 	# Read registers
 
 	def get_pos(self):
-		self.last_pos = self.read_struct(3 | (0 << 4), "ff")
+		self.last_pos = self.read_reg(ASSERV_REGS.get_pos)
 		return self.last_pos
 
 	def get_pos_xy(self):
-		self.last_pos_xy = self.read_struct(3 | (1 << 4), "ff")
+		self.last_pos_xy = self.read_reg(ASSERV_REGS.get_pos_xy)
 		return self.last_pos_xy
 
 	def get_pid(self, pid):
-		ret = self.read(2 | (pid.idx << 4), 4*3)
-		return pid.from_bytes(ret)
-
-	def get_dst_speedprofile(self):
-		return self.read_struct(12 | (0 << 4), "ff")
-
-	def get_angle_speedprofile(self):
-		return self.read_struct(12 | (1 << 4), "ff")
-
-	def get_battery_stats(self):
-		return self.read_struct(14 | (0 << 4), "ffff")
+		return pid.set(*self.read_reg(ASSERV_REGS.get_pid, pid.idx))
+
+	# Pose, controller state and optionally battery in one transaction
+	# returns (rho, theta), (x, y), controller state, battery stats or None
+	def get_state(self, battery=True):
+		with self.batch() as batch:
+			batch.read_reg(ASSERV_REGS.get_pos)
+			batch.read_reg(ASSERV_REGS.get_pos_xy)
+			batch.read_reg(ASSERV_REGS.debug_get_controller_state)
+			if battery:
+				batch.read_reg(ASSERV_REGS.get_battery_stats)
+		self.last_pos, self.last_pos_xy, state = batch.results[:3]
+		return self.last_pos, self.last_pos_xy, state, batch.results[3] if battery else None
+
+	# Everything the debug screen shows, in one transaction
+	# returns (rho, theta), (x, y), controller state, left & right bg stats
+	def debug_get_state(self):
+		with self.batch() as batch:
+			batch.read_reg(ASSERV_REGS.get_pos)
+			batch.read_reg(ASSERV_REGS.get_pos_xy)
+			batch.read_reg(ASSERV_REGS.debug_get_controller_state)
+			batch.read_reg(ASSERV_REGS.debug_get_left_bg_stats)
+			batch.read_reg(ASSERV_REGS.debug_get_right_bg_stats)
+		self.last_pos, self.last_pos_xy, state, left, right = batch.results
+		return self.last_pos, self.last_pos_xy, state, left, right
 
 	# Read/Write
 
-	# returns left,right ticks
-	def debug_get_encoders(self):
-		return self.read_struct(11 | (0 << 4), "iiii")
-
-	# sets motor speed values manually
-	def debug_set_motors(self, left, right):
-		self.write_struct(11 | (1 << 4), "ff", left, right)
-
-	def debug_set_target(self, dst, theta):
-		self.write_struct(11 | (2 << 4), "ff", dst, theta)
-
-	def debug_set_motors_enable(self, state):
-		state = not not state
-		self.write_struct(11 | (3 << 4), "?", state)
-
-	def debug_get_controller_state(self):
-		return self.read_struct(11 | (4 << 4), "B")[0]
-
-	def debug_get_left_bg_stats(self):
-		return self.read_struct(11 | (5 << 4), "ffff")
-
-	def debug_get_right_bg_stats(self):
-		return self.read_struct(11 | (6 << 4), "ffff")
-
 	def debug_set_effects(self, control: ControlState, blinker: BlinkerState = BlinkerState.OFF, stop: bool = False, 
 		center_stop: bool = False, headlight: HeadlightState = HeadlightState.OFF, ring: RingState = RingState.OFF, disco: bool = False, rev: bool = False, smoke: bool = False,
 		pop_left: float = 0, pop_right: float = 0):
 
 		boules = bool(stop) | (bool(center_stop) << 1) | (bool(disco) << 2) | (bool(rev) << 3) | (bool(smoke) << 4)
-		self.write_struct(11 | (7 << 4), "BBBBBff", boules, control.value, blinker.value, headlight.value, ring.value, pop_left, pop_right)
+		self.write_reg(ASSERV_REGS.debug_set_effects, boules, control.value, blinker.value, headlight.value, ring.value, pop_left, pop_right)
 
 	def debug_set_rgb(self, rgb: int, brightness: int, idx: int = 0xFFFFFFFF):
-		self.write_struct(11 | (8 << 4), "IIB", rgb, idx, brightness)
-
-	def debug_set_popup(self, left: float, right: float):
-		self.write_struct(11 | (9 << 4), "ff", left, right)
+		self.write_reg(ASSERV_REGS.debug_set_rgb, rgb, idx, brightness)
 
 # Class for the pico that handles actuators
+# Orders and reads are all generated from ACTION_REGS
 
+@register_accessors(ACTION_REGS)
 class Action(PicoBase):
-	def __init__(self, bus=None, addr=None):
-		super().__init__(bus, addr)
-
-	# Read
-
-	def elev_homed(self):
-		return self.read_struct(1 | (3 << 4), "?")[0]
-
-	def elev_pos(self):
-		return self.read_struct(1 | (4 << 4), "f")[0]
-
-	def right_arm_deployed(self):
-		return self.read_struct(2 | (3 << 4), "?")[0]
-
-	def right_arm_angles(self):
-		return self.read_struct(2 | (4 << 4), "ff")
-
-	def left_arm_deployed(self):
-		return self.read_struct(3 | (3 << 4), "?")[0]
-
-	def left_arm_angles(self):
-		return self.read_struct(3 | (4 << 4), "ff")
-
-	# Write
-
-	@block_cmd()
-	def elev_home(self):
-		self.write_cmd(1 | (0 << 4))
-
-	@block_cmd()
-	def elev_move_abs(self, pos):
-		self.write_struct(1 | (1 << 4), "f", pos)
-
-	@block_cmd()
-	def elev_move_rel(self, pos):
-		self.write_struct(1 | (2 << 4), "f", pos)
-
-	@block_cmd()
-	def right_arm_deploy(self):
-		self.write_cmd(2 | (0 << 4))
-
-	@block_cmd()
-	def right_arm_half_deploy(self):
-		self.write_cmd(2 | (5 << 4))
-
-	@block_cmd()
-	def right_arm_fold(self):
-		self.write_cmd(2 | (1 << 4))
-
-	@block_cmd()
-	def right_arm_turn(self, angle):
-		self.write_struct(2 | (2 << 4), "f", angle)
-
-	@block_cmd()
-	def left_arm_deploy(self):
-		self.write_cmd(3 | (0 << 4))
-
-	@block_cmd()
-	def left_arm_half_deploy(self):
-		self.write_cmd(3 | (5 << 4))
-
-	@block_cmd()
-	def left_arm_fold(self):
-		self.write_cmd(3 | (1 << 4))
-
-	@block_cmd()
-	def left_arm_turn(self, angle):
-		self.write_struct(3 | (2 << 4), "f", angle)
-
-	@block_cmd()
-	def pump_enable(self, pump_idx, state):
-		self.write_struct(4 | (pump_idx << 4), "?", state)
\ No newline at end of file
+	def __init__(self, bus=None, addr=None, completion=None):
+		super().__init__(bus, addr, completion)
+
+	# returns left, right deployed in one transaction
+	def arms_deployed(self):
+		with self.batch() as batch:
+			batch.read_reg(ACTION_REGS.left_arm_deployed)
+			batch.read_reg(ACTION_REGS.right_arm_deployed)
+		return tuple(batch.results)
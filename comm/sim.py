@@ -0,0 +1,396 @@
+from dataclasses import dataclass
+import ctypes
+import threading
+import math
+import time
+
+from .registers import PICO_REGS, ASSERV_REGS, ACTION_REGS
+
+# Software stand-in for the picos, plugs in place of the smbus2 bus.
+# Run a scenario against it with HL_SIM=<speed> (see comm/__init__.py).
+
+# Default speed profiles, mm/s mm/s² and rad/s rad/s²
+SIM_DST_PROFILE = (600.0, 800.0)
+SIM_ANGLE_PROFILE = (4.0, 8.0)
+SIM_BATTERY = (16.2, 1.5, 24.3, 90.0)
+SIM_BG_TEMP = 30.0
+
+# Actuators, mm/s, s and deg/s
+SIM_ELEV_SPEED = 150.0
+SIM_ELEV_HOME_TIME = 1.5
+SIM_ARM_DEPLOY_TIME = 0.4
+SIM_ARM_HALF_TIME = 0.25
+SIM_ARM_TURN_SPEED = 360.0
+SIM_ARM_DEPLOY_ANGLE = 90.0
+SIM_ARM_HALF_ANGLE = 45.0
+
+# I2C_M_RD from linux/i2c.h
+I2C_M_RD = 0x0001
+
+# Simulated time, runs `speed` times faster than real time
+class SimClock:
+	def __init__(self, speed=1.0):
+		self.speed = speed
+		self.t0 = time.monotonic()
+
+	def now(self):
+		return (time.monotonic() - self.t0)*self.speed
+
+# Trapezoidal speed profile over a signed distance
+class Trapezoid:
+	def __init__(self, dist, vmax, amax):
+		self.dist = dist
+		self.sign = 1 if dist >= 0 else -1
+		dist = abs(dist)
+
+		self.amax = amax
+		self.t_acc = vmax/amax
+		# Not enough room to reach vmax, it's a triangle
+		if amax*self.t_acc*self.t_acc > dist:
+			self.t_acc = math.sqrt(dist/amax)
+		self.vpeak = amax*self.t_acc
+		d_acc = 0.5*amax*self.t_acc*self.t_acc
+		self.t_cruise = (dist - 2*d_acc)/self.vpeak if self.vpeak > 0 else 0
+		self.duration = 2*self.t_acc + self.t_cruise
+
+	def at(self, t):
+		if t >= self.duration:
+			return self.dist
+		if t <= 0:
+			return 0.0
+
+		if t < self.t_acc:
+			pos = 0.5*self.amax*t*t
+		elif t < self.t_acc + self.t_cruise:
+			pos = 0.5*self.amax*self.t_acc*self.t_acc + self.vpeak*(t - self.t_acc)
+		else:
+			t_left = self.duration - t
+			pos = abs(self.dist) - 0.5*self.amax*t_left*t_left
+		return self.sign*pos
+
+@dataclass
+class CommandRecord:
+	name: str
+	args: tuple
+	start: float # sim time the order was written
+	duration: float # modelled duration
+	seen: float = None # sim time the host first saw it done
+
+# Base simulated pico, decodes writes through the register tables and calls
+# on_<register name>(*vals), reads call read_<register name>() and are zero otherwise.
+# Unknown orders keep the pico busy for `duration`.
+
+class SimPico:
+	REGS = ()
+
+	def __init__(self, duration=0.0, on_ready=None, clock=None):
+		self.clock = clock if clock is not None else SimClock()
+		self.duration = duration
+		self.on_ready = on_ready
+		self.done_at = 0.0
+		self.timer = None
+		self.log = []
+
+		self.regs = {}
+		self.sub_regs = {}
+		for regs in (PICO_REGS, self.REGS):
+			for reg in regs:
+				if reg.sub is None:
+					self.sub_regs[reg.reg] = reg
+				else:
+					self.regs[reg.addr] = reg
+
+	def lookup(self, addr):
+		if addr in self.regs:
+			return self.regs[addr], None
+		if addr & 0xF in self.sub_regs:
+			return self.sub_regs[addr & 0xF], addr >> 4
+		return None, None
+
+	def ready(self):
+		return self.clock.now() >= self.done_at
+
+	# Keeps the pico busy for duration (in sim time)
+	def order(self, name, duration, args=()):
+		now = self.clock.now()
+		self.done_at = now + duration
+		self.log.append(CommandRecord(name, args, now, duration))
+
+		if self.on_ready is not None:
+			if self.timer is not None:
+				self.timer.cancel()
+			self.timer = threading.Timer(duration/self.clock.speed, self.on_ready)
+			self.timer.start()
+
+	def write(self, addr, data):
+		reg, sub = self.lookup(addr)
+		if reg is None:
+			self.order(hex(addr), self.duration)
+			return
+
+		vals = reg.codec.unpack(data)
+		if sub is not None:
+			vals = (sub,) + vals
+
+		handler = getattr(self, "on_" + reg.name, None)
+		if handler is not None:
+			handler(*vals)
+		elif reg.block:
+			self.order(reg.name, self.duration, vals)
+
+	def read(self, addr, size):
+		reg, sub = self.lookup(addr)
+		if reg is None or reg.size != size:
+			return [0]*size
+
+		handler = getattr(self, "read_" + reg.name, None)
+		if handler is None:
+			return [0]*size
+
+		vals = handler() if sub is None else handler(sub)
+		return list(reg.pack(*vals) if isinstance(vals, tuple) else reg.pack(vals))
+
+	def read_ready_for_order(self):
+		ready = self.ready()
+		if ready and self.log and self.log[-1].seen is None:
+			self.log[-1].seen = self.clock.now()
+		return ready
+
+# The moving pico, rotates then drives for each move like the real controller
+
+class SimAsserv(SimPico):
+	REGS = ASSERV_REGS
+
+	def __init__(self, clock=None, on_ready=None):
+		super().__init__(0.0, on_ready, clock)
+		self.running = False
+		self.dst_profile = SIM_DST_PROFILE
+		self.angle_profile = SIM_ANGLE_PROFILE
+		self.pids = {}
+
+		# rho is the total signed distance travelled
+		self.rho, self.theta, self.x, self.y = 0.0, 0.0, 0.0, 0.0
+		self.motion = None
+
+	# Current motion: start time, start pose, theta and dst profiles
+	def pose_at(self, now):
+		t0, (rho, theta, x, y), theta_prof, dst_prof = self.motion
+		t = now - t0
+		theta += theta_prof.at(t)
+		dst = dst_prof.at(t - theta_prof.duration)
+		return rho + dst, theta, x + dst*math.cos(theta), y + dst*math.sin(theta)
+
+	def update(self):
+		if self.motion is None:
+			return
+		now = self.clock.now()
+		self.rho, self.theta, self.x, self.y = self.pose_at(now)
+		if now >= self.done_at:
+			self.motion = None
+
+	def on_set_running(self, state):
+		self.update()
+		self.running = state
+		if not state:
+			self.motion = None
+		self.order("set_running", 0, (state,))
+
+	def on_move(self, rho, theta):
+		self.update()
+		if not self.running:
+			self.order("move", 0, (rho, theta))
+			return
+
+		theta_prof = Trapezoid(theta, *self.angle_profile)
+		dst_prof = Trapezoid(rho, *self.dst_profile)
+		self.motion = (self.clock.now(), (self.rho, self.theta, self.x, self.y), theta_prof, dst_prof)
+		self.order("move", theta_prof.duration + dst_prof.duration, (rho, theta))
+
+	def on_emergency_stop(self):
+		self.update()
+		self.motion = None
+		self.done_at = self.clock.now()
+
+	def on_set_pid(self, idx, kp, ki, kd):
+		self.pids[idx] = (kp, ki, kd)
+
+	def on_set_dst_speedprofile(self, vmax, amax):
+		self.dst_profile = (vmax, amax)
+
+	def on_set_angle_speedprofile(self, vmax, amax):
+		self.angle_profile = (vmax, amax)
+
+	def read_get_pid(self, idx):
+		return self.pids.get(idx, (0.0, 0.0, 0.0))
+
+	def read_get_pos(self):
+		self.update()
+		return self.rho, self.theta
+
+	def read_get_pos_xy(self):
+		self.update()
+		return self.x, self.y
+
+	def read_debug_get_controller_state(self):
+		self.update()
+		if self.motion is None:
+			return 2
+		t0, _, theta_prof, _ = self.motion
+		return 0 if self.clock.now() - t0 < theta_prof.duration else 1
+
+	def read_get_dst_speedprofile(self):
+		return self.dst_profile
+
+	def read_get_angle_speedprofile(self):
+		return self.angle_profile
+
+	def read_get_battery_stats(self):
+		return SIM_BATTERY
+
+	def read_debug_get_left_bg_stats(self):
+		return 0.0, 0.0, SIM_BG_TEMP, SIM_BATTERY[0]
+
+	def read_debug_get_right_bg_stats(self):
+		return 0.0, 0.0, SIM_BG_TEMP, SIM_BATTERY[0]
+
+# The actuator pico, elevator and two arms
+
+class SimArm:
+	def __init__(self):
+		self.deployed = False
+		self.deploy_angle = 0.0
+		self.turn_angle = 0.0
+
+class SimAction(SimPico):
+	REGS = ACTION_REGS
+
+	def __init__(self, clock=None, on_ready=None):
+		super().__init__(0.0, on_ready, clock)
+		self.homed = False
+		self.elev = 0.0
+		self.arms = {"left": SimArm(), "right": SimArm()}
+
+	def on_elev_home(self):
+		self.homed = True
+		self.elev = 0.0
+		self.order("elev_home", SIM_ELEV_HOME_TIME)
+
+	def on_elev_move_abs(self, pos):
+		self.order("elev_move_abs", abs(pos - self.elev)/SIM_ELEV_SPEED, (pos,))
+		self.elev = pos
+
+	def on_elev_move_rel(self, pos):
+		self.order("elev_move_rel", abs(pos)/SIM_ELEV_SPEED, (pos,))
+		self.elev += pos
+
+	def read_elev_homed(self):
+		return self.homed
+
+	def read_elev_pos(self):
+		return self.elev
+
+	def arm_deploy(self, name, side, angle, duration):
+		arm = self.arms[side]
+		arm.deployed = angle == SIM_ARM_DEPLOY_ANGLE
+		arm.deploy_angle = angle
+		self.order(name, duration)
+
+	def arm_turn(self, side, angle):
+		self.arms[side].turn_angle += angle
+		self.order(f"{side}_arm_turn", abs(angle)/SIM_ARM_TURN_SPEED, (angle,))
+
+	def on_right_arm_deploy(self):
+		self.arm_deploy("right_arm_deploy", "right", SIM_ARM_DEPLOY_ANGLE, SIM_ARM_DEPLOY_TIME)
+
+	def on_right_arm_half_deploy(self):
+		self.arm_deploy("right_arm_half_deploy", "right", SIM_ARM_HALF_ANGLE, SIM_ARM_HALF_TIME)
+
+	def on_right_arm_fold(self):
+		self.arm_deploy("right_arm_fold", "right", 0.0, SIM_ARM_DEPLOY_TIME)
+
+	def on_right_arm_turn(self, angle):
+		self.arm_turn("right", angle)
+
+	def on_left_arm_deploy(self):
+		self.arm_deploy("left_arm_deploy", "left", SIM_ARM_DEPLOY_ANGLE, SIM_ARM_DEPLOY_TIME)
+
+	def on_left_arm_half_deploy(self):
+		self.arm_deploy("left_arm_half_deploy", "left", SIM_ARM_HALF_ANGLE, SIM_ARM_HALF_TIME)
+
+	def on_left_arm_fold(self):
+		self.arm_deploy("left_arm_fold", "left", 0.0, SIM_ARM_DEPLOY_TIME)
+
+	def on_left_arm_turn(self, angle):
+		self.arm_turn("left", angle)
+
+	def read_right_arm_deployed(self):
+		return self.arms["right"].deployed
+
+	def read_right_arm_angles(self):
+		return self.arms["right"].deploy_angle, self.arms["right"].turn_angle
+
+	def read_left_arm_deployed(self):
+		return self.arms["left"].deployed
+
+	def read_left_arm_angles(self):
+		return self.arms["left"].deploy_angle, self.arms["left"].turn_angle
+
+class SimBus:
+	def __init__(self, picos=None):
+		self.picos = picos if picos is not None else {}
+
+	def add(self, addr, pico):
+		self.picos[addr] = pico
+		return pico
+
+	def write_i2c_block_data(self, addr, reg, data):
+		self.picos[addr].write(reg, bytes(data))
+
+	def read_i2c_block_data(self, addr, reg, size):
+		return self.picos[addr].read(reg, size)
+
+	# Takes smbus2 i2c_msg, a lone register byte followed by a read selects the register
+	def i2c_rdwr(self, *msgs):
+		reg = None
+		for i, msg in enumerate(msgs):
+			if msg.flags & I2C_M_RD:
+				data = bytes(self.picos[msg.addr].read(reg, msg.len))
+				ctypes.memmove(msg.buf, data, msg.len)
+				continue
+
+			data = bytes(msg)
+			reg = data[0]
+			next_read = i+1 < len(msgs) and msgs[i+1].flags & I2C_M_RD
+			if len(data) > 1 or not next_read:
+				self.picos[msg.addr].write(reg, data[1:])
+
+	# Per command timing of every pico, in sim time.
+	# seen is when the host polled it done, as precise as the completion polling (scaled by the speed too)
+	def report(self):
+		records = sorted(((addr, rec) for addr, pico in self.picos.items() for rec in pico.log), key=lambda x: x[1].start)
+
+		lines = [f"{'start':>8} {'addr':>5} {'command':<24} {'model':>8} {'seen':>8}"]
+		totals = {}
+		for addr, rec in records:
+			seen = rec.seen - rec.start if rec.seen is not None else None
+			seen_str = f"{seen:8.3f}" if seen is not None else f"{'-':>8}"
+			lines.append(f"{rec.start:8.3f} {addr:#5x} {rec.name:<24} {rec.duration:8.3f} {seen_str}")
+
+			count, model, seen_sum = totals.get(rec.name, (0, 0.0, 0.0))
+			totals[rec.name] = (count + 1, model + rec.duration, seen_sum + (seen or 0.0))
+
+		lines.append("")
+		lines.append(f"{'command':<24} {'count':>5} {'model':>8} {'seen':>8}")
+		for name, (count, model, seen_sum) in sorted(totals.items(), key=lambda x: -x[1][2]):
+			lines.append(f"{name:<24} {count:5d} {model:8.3f} {seen_sum:8.3f}")
+
+		if records:
+			lines.append(f"Total sim time: {max(pico.clock.now() for pico in self.picos.values()):.3f}s")
+		return "\n".join(lines)
+
+def make_bus(speed=1.0, asserv_addr=0x69, action_addr=0x68):
+	clock = SimClock(speed)
+	bus = SimBus()
+	bus.add(asserv_addr, SimAsserv(clock))
+	bus.add(action_addr, SimAction(clock))
+	return bus
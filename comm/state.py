@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+import threading
+import time
+
+from .arbiter import Priority, bus_priority
+
+@dataclass(frozen=True)
+class RobotState:
+	timestamp: float # time.monotonic() of the read
+	pos: tuple # rho, theta
+	pos_xy: tuple # x, y
+	controller_state: int
+	battery: tuple # voltage, current, power, percent or None
+
+# Samples the asserv in the background so every thread shares the same reads
+# instead of fighting over the bus lock
+
+class StateSampler:
+	def __init__(self, asserv, rate=50, battery=True):
+		self.asserv = asserv
+		self.rate = rate
+		self.battery = battery
+
+		# Latest RobotState, published with a single assignment.
+		# States are immutable so readers never lock, they just grab the reference.
+		self.state = None
+
+		self.thread = None
+		self.thread_lock = threading.Lock()
+		self.alive = False
+
+	def start(self):
+		self.alive = True
+		self.thread = threading.Thread(target=self.thread_func, daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		# Only one caller gets the thread to join
+		with self.thread_lock:
+			thread, self.thread = self.thread, None
+		if thread is None:
+			return
+		self.alive = False
+		if thread is not threading.current_thread():
+			thread.join()
+
+	def sample(self):
+		pos, pos_xy, controller_state, battery = self.asserv.get_state(self.battery)
+		state = RobotState(time.monotonic(), pos, pos_xy, controller_state, battery)
+		self.state = state
+		return state
+
+	# Latest state, read from the bus if it's older than max_age seconds (None for any age)
+	def get(self, max_age=None):
+		state = self.state
+		if state is None or (max_age is not None and time.monotonic() - state.timestamp > max_age):
+			return self.sample()
+		return state
+
+	def thread_func(self):
+		with bus_priority(Priority.TELEMETRY):
+			while self.alive:
+				st = time.monotonic()
+				try:
+					self.sample()
+				except Exception as e:
+					print(f"State sampler Exception: {e}")
+				time.sleep(max(0, 1.0/self.rate - (time.monotonic() - st)))
@@ -0,0 +1,127 @@
+import math
+import threading
+import time
+
+# Telemetry stream rate assumed until it's been measured (Hz)
+DEFAULT_NATIVE_RATE = 1000
+# Bytes/s the telemetry link can carry, downsampling goes up when the streams need more
+LINK_BUDGET = 100_000
+MAX_DOWNSAMPLE = 255
+# Smoothing of the measured rates
+RATE_ALPHA = 0.3
+
+# Enables pico telemetries only while someone reads them, with the downsampling
+# chosen from the rate they asked for and what the link actually carries.
+# subscribers are any hashable, their subscriptions are {idx: wanted rate (Hz) or None for full rate}
+
+class TelemetryManager:
+	def __init__(self, pico, budget=LINK_BUDGET):
+		self.pico = pico
+		self.budget = budget
+		self.lock = threading.Lock()
+
+		self.subs = {}
+		# What has been sent to the pico, idx: downsample or None when disabled
+		self.applied = {idx: None for idx in pico.telems}
+
+		# Measured from the received frames
+		self.frames = {idx: 0 for idx in pico.telems}
+		self.nbytes = {idx: 0 for idx in pico.telems}
+		self.rates = {}
+		self.frame_sizes = {}
+		self.link_rate = 0.0
+		self.last_update = time.monotonic()
+
+	def set_subscription(self, sub, rates):
+		with self.lock:
+			if rates:
+				self.subs[sub] = dict(rates)
+			else:
+				self.subs.pop(sub, None)
+
+	# Feed it every received frame
+	def observe(self, idx, size):
+		if idx in self.frames:
+			# update() reads and resets them from another thread
+			with self.lock:
+				self.frames[idx] += 1
+				self.nbytes[idx] += size
+
+	# Wanted rate per index, None for full rate, absent if nobody reads it
+	def wanted(self):
+		wanted = {}
+		with self.lock:
+			for rates in self.subs.values():
+				for idx, rate in rates.items():
+					if idx not in self.applied:
+						continue
+					if idx in wanted and (wanted[idx] is None or rate is None):
+						wanted[idx] = None
+					else:
+						wanted[idx] = rate if idx not in wanted else max(wanted[idx], rate)
+		return wanted
+
+	# Rate the pico produces at downsample 1
+	def native_rate(self, idx):
+		return self.rates.get(idx, DEFAULT_NATIVE_RATE)
+
+	def frame_size(self, idx):
+		return self.frame_sizes.get(idx, self.pico.telems[idx].size + 8)
+
+	def downsamples(self):
+		wanted = self.wanted()
+		downs = {}
+		for idx, rate in wanted.items():
+			native = self.native_rate(idx)
+			downs[idx] = 1 if rate is None or rate <= 0 else max(1, math.ceil(native/rate))
+
+		# Spread the slowdown over every stream when the link can't keep up
+		need = sum(self.native_rate(idx)/down*self.frame_size(idx) for idx, down in downs.items())
+		if need > self.budget:
+			scale = need/self.budget
+			downs = {idx: math.ceil(down*scale) for idx, down in downs.items()}
+
+		return {idx: min(down, MAX_DOWNSAMPLE) for idx, down in downs.items()}
+
+	# Measures the rates since the last call and sends the changes to the pico
+	def update(self):
+		with self.lock:
+			now = time.monotonic()
+			counted, sizes = self.frames, self.nbytes
+			self.frames = {idx: 0 for idx in counted}
+			self.nbytes = {idx: 0 for idx in sizes}
+		dt = now - self.last_update
+		self.last_update = now
+
+		if dt > 0:
+			link = 0
+			for idx, down in self.applied.items():
+				frames, nbytes = counted[idx], sizes[idx]
+				link += nbytes
+				if down is None or frames == 0:
+					continue
+				native = frames/dt*down
+				self.rates[idx] = native if idx not in self.rates else self.rates[idx] + RATE_ALPHA*(native - self.rates[idx])
+				self.frame_sizes[idx] = nbytes/frames
+			self.link_rate += RATE_ALPHA*(link/dt - self.link_rate)
+
+		self.apply(self.downsamples())
+
+	def apply(self, downs):
+		for idx, old in self.applied.items():
+			down = downs.get(idx)
+			if down == old:
+				continue
+			telem = self.pico.telems[idx]
+			if down is None:
+				self.pico.set_telem(telem, False)
+			else:
+				self.pico.set_telem_downsample(telem, down)
+				if old is None:
+					self.pico.set_telem(telem, True)
+			self.applied[idx] = down
+
+	def stop(self):
+		with self.lock:
+			self.subs = {}
+		self.apply({})
@@ -1,13 +1,20 @@
 from dataclasses import dataclass
 import threading
+import time
 import socket
 import struct
 import zlib
 
+import numpy as np
+
 ENDIANNESS = "<"
 
 UPLINK_HEADER = b"\xDE\xAD"
 
+# struct standard sizes to numpy types
+NP_TYPES = {"b": "i1", "B": "u1", "?": "?", "h": "i2", "H": "u2", "i": "i4", "I": "u4",
+	"l": "i4", "L": "u4", "q": "i8", "Q": "u8", "e": "f2", "f": "f4", "d": "f8"}
+
 @dataclass
 class TelemetryPacketBase:
 	timestamp: float
@@ -57,6 +64,7 @@ class Telemetry:
 		self.packet_type = packet_base
 		self.fmt = Telemetry.get_format(packet_base)
 		self.size = struct.calcsize(self.fmt)
+		self.dtype = Telemetry.get_dtype(self.fmt, ("timestamp",) + self.fields())
 
 	def get_format(ty):
 		if "fmt" not in ty.__dict__:
@@ -68,85 +76,289 @@ class Telemetry:
 			st += Telemetry.get_format(base)
 		return st + ty.fmt()
 
+	def get_dtype(fmt, names):
+		types = [NP_TYPES[c] for c in fmt if c not in "<>=!@"]
+		return np.dtype([(name, ENDIANNESS + ty) for name, ty in zip(names, types, strict=True)])
+
 	def to_packet(self, data):
 		return self.packet_type(*struct.unpack(self.fmt,data))
 
 	def to_bytes(self, packet):
 		return struct.pack(self.fmt, *packet.__dict__.values())
 
+	# Structured array of one or more packets
+	def to_array(self, data):
+		return np.frombuffer(data, self.dtype)
+
 	def fields(self):
 		vals = self.packet_type.__dict__["__match_args__"]
 		return tuple(filter(lambda x:x!="timestamp", vals))
 
+# Uplink framing: header, size, idx, payload, crc32 of size+idx+payload
+
+FRAME_HEAD = struct.Struct(ENDIANNESS + "2sBB")
+FRAME_CRC = struct.Struct(ENDIANNESS + "I")
+FRAME_OVERHEAD = FRAME_HEAD.size + FRAME_CRC.size
+
+def frame(idx, data):
+	head = struct.pack(ENDIANNESS + "BB", len(data), idx)
+	return UPLINK_HEADER + head + data + FRAME_CRC.pack(zlib.crc32(head + data))
+
+# Reassembles frames from stream chunks in a reusable buffer.
+# Payloads are views into the buffer, only valid until the next feed.
+
+class FrameParser:
+	def __init__(self, size=1 << 16):
+		self.buf = bytearray(size)
+		self.view = memoryview(self.buf)
+		self.start = 0
+		self.end = 0
+		self.crc_errors = 0
+		# CRC failures by the index the frame claimed, and bytes thrown away looking for a header
+		self.crc_failed = {}
+		self.skipped = 0
+		self.received_bytes = 0
+
+	# Free space to recv_into, moves the leftover partial frame to the front first
+	def space(self):
+		if self.start > 0:
+			left = self.end - self.start
+			self.buf[:left] = self.view[self.start:self.end]
+			self.start, self.end = 0, left
+		return self.view[self.end:]
+
+	def commit(self, n):
+		self.end += n
+		self.received_bytes += n
+
+	def feed(self, data, frames=False):
+		n = len(data)
+		self.space()[:n] = data
+		self.commit(n)
+		return self.parse(frames)
+
+	# [(idx, payload view), ...] of the complete frames in the buffer,
+	# (idx, payload view, whole frame view) with frames=True
+	def parse(self, frames=False):
+		buf, view = self.buf, self.view
+		pos, end = self.start, self.end
+		pkts = []
+
+		while True:
+			found = buf.find(UPLINK_HEADER, pos, end)
+			if found < 0:
+				# Keep a trailing header byte, it may be the start of the next frame
+				found = end - 1 if end > pos and buf[end-1] == UPLINK_HEADER[0] else end
+				self.skipped += found - pos
+				pos = found
+				break
+			self.skipped += found - pos
+			pos = found
+			if end - pos < FRAME_HEAD.size:
+				break
+
+			_, size, idx = FRAME_HEAD.unpack_from(buf, pos)
+			frame_end = pos + FRAME_HEAD.size + size + FRAME_CRC.size
+			if frame_end > end:
+				break
+
+			crc, = FRAME_CRC.unpack_from(buf, frame_end - FRAME_CRC.size)
+			if crc != zlib.crc32(view[pos+2:frame_end-FRAME_CRC.size]):
+				# Not a real header or corrupted, resync on the next one
+				self.crc_errors += 1
+				self.crc_failed[idx] = self.crc_failed.get(idx, 0) + 1
+				pos += 1
+				continue
+
+			payload = view[pos+FRAME_HEAD.size:frame_end-FRAME_CRC.size]
+			pkts.append((idx, payload, view[pos:frame_end]) if frames else (idx, payload))
+			pos = frame_end
+
+		self.start = pos
+		if self.start == self.end:
+			self.start = self.end = 0
+		return pkts
+
+# Groups packets by index and decodes each group into a structured array.
+# Packets of an unknown index or of the wrong size are dropped (and counted in stats if given).
+def decode_batch(telems, pkts, stats=None):
+	groups = {}
+	for idx, data in pkts:
+		telem = telems.get(idx)
+		if telem is None or len(data) != telem.size:
+			if stats is not None:
+				stats.bad[idx] = stats.bad.get(idx, 0) + 1
+			continue
+		groups.setdefault(idx, []).append(data)
+	return {idx: telems[idx].to_array(b"".join(datas)) for idx, datas in groups.items()}
+
+# Timestamp steps longer than this times the usual step count as gaps
+GAP_FACTOR = 1.5
+# That many gaps in a row at a steady step mean the rate changed (set_telem_downsample), not lost packets
+RESTEP_GAPS = 4
+# Min interval between two rate measurements (s)
+STATS_RATE_INTERVAL = 0.5
+
+TIMESTAMP = struct.Struct(ENDIANNESS + "f")
+
+class StreamStats:
+	def __init__(self):
+		self.received = 0
+		self.gaps = 0
+		self.missing = 0
+		self.last_ts = None
+		self.step = None
+		# Current run of gaps: count, missing packets counted for it, shortest and longest step
+		self.run = 0
+		self.run_missing = 0
+		self.run_min = self.run_max = 0.0
+		self.hz = 0.0
+		self.last_count = 0
+
+	def add(self, ts):
+		self.received += 1
+		last, self.last_ts = self.last_ts, ts
+		if last is None or ts <= last:
+			# First packet or telemetry restart
+			return
+
+		dt = ts - last
+		if self.step is not None and dt > GAP_FACTOR*self.step:
+			missing = round(dt/self.step) - 1
+			self.gaps += 1
+			self.missing += missing
+			self.run += 1
+			self.run_missing += missing
+			self.run_min = dt if self.run == 1 else min(self.run_min, dt)
+			self.run_max = max(self.run_max, dt)
+			if self.run >= RESTEP_GAPS and self.run_max <= GAP_FACTOR*self.run_min:
+				# Slower rate, those weren't gaps
+				self.gaps -= self.run
+				self.missing -= self.run_missing
+				self.step = dt
+				self.run = self.run_missing = 0
+				self.run_max = 0.0
+		else:
+			self.step = dt if self.step is None else self.step + 0.1*(dt - self.step)
+			self.run = self.run_missing = 0
+			self.run_max = 0.0
+
+# Received, CRC failed, undecodable, resync and timestamp gaps per telemetry index
+
+class TelemetryStats:
+	def __init__(self, parser):
+		self.parser = parser
+		self.streams = {}
+		# Frames with a valid CRC that decode_batch couldn't decode (unknown index or wrong size)
+		self.bad = {}
+		self.last_time = time.monotonic()
+		self.link_rate = 0.0
+		self.last_bytes = 0
+
+	def update(self, pkts):
+		streams = self.streams
+		for idx, data in pkts:
+			stream = streams.get(idx)
+			if stream is None:
+				stream = streams[idx] = StreamStats()
+			stream.add(TIMESTAMP.unpack_from(data)[0] if len(data) >= TIMESTAMP.size else 0)
+
+	def update_rates(self):
+		now = time.monotonic()
+		dt = now - self.last_time
+		if dt < STATS_RATE_INTERVAL:
+			return
+		self.last_time = now
+		for stream in list(self.streams.values()):
+			stream.hz = (stream.received - stream.last_count)/dt
+			stream.last_count = stream.received
+		nbytes = self.parser.received_bytes
+		self.link_rate = (nbytes - self.last_bytes)/dt
+		self.last_bytes = nbytes
+
+	# {idx: {received, crc_failed, bad, gaps, missing, hz}} and the link totals
+	def snapshot(self):
+		self.update_rates()
+		crc_failed = self.parser.crc_failed
+		idxs = sorted(set(self.streams) | set(crc_failed) | set(self.bad))
+		streams = {}
+		for idx in idxs:
+			stream = self.streams.get(idx, StreamStats())
+			streams[idx] = {"received": stream.received, "crc_failed": crc_failed.get(idx, 0), "bad": self.bad.get(idx, 0),
+				"gaps": stream.gaps, "missing": stream.missing, "hz": stream.hz}
+		return {"streams": streams, "crc_errors": self.parser.crc_errors, "skipped": self.parser.skipped,
+			"bytes": self.parser.received_bytes, "link_rate": self.link_rate}
+
+	def report(self, names=None):
+		snap = self.snapshot()
+		lines = [f"{'telem':<14} {'received':>9} {'crc fail':>8} {'bad':>6} {'gaps':>6} {'missing':>8} {'rate':>9}"]
+		for idx, st in snap["streams"].items():
+			name = names[idx].name if names and idx in names else str(idx)
+			lines.append(f"{name[:14]:<14} {st['received']:9d} {st['crc_failed']:8d} {st['bad']:6d} {st['gaps']:6d} {st['missing']:8d} {st['hz']:7.1f}Hz")
+		lines.append(f"link {snap['link_rate']/1e3:.1f}kB/s, {snap['crc_errors']} CRC errors, {snap['skipped']} bytes skipped resyncing")
+		return "\n".join(lines)
+
+TELEMETRY_PORT = 1337
+
+# Calls callback(idx, data) for every packet, or callback([(idx, data), ...])
+# once per received chunk with batch=True. data is a view, copy it to keep it.
+# With telems ({idx: Telemetry}), calls callback(idx, array) once per index and chunk instead.
+
 class Client:
-	def __init__(self, addr, port, callback):
+	def __init__(self, addr, port, callback, batch=False, telems=None):
 		self.alive = True
 		self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 		self.sock.connect((addr, port))
 
 		self.callback = callback
+		self.batch = batch
+		self.telems = telems
+		self.parser = FrameParser()
+		self.stats = TelemetryStats(self.parser)
 
 		self.client_thread = threading.Thread(target=self.client_handler, daemon=True)
 		self.client_thread.start()
 
 	def stop(self):
-		self.sock.close()
 		self.alive = False
+		try:
+			self.sock.shutdown(socket.SHUT_RDWR)
+		except OSError:
+			pass
+		self.sock.close()
 		self.client_thread.join()
 
+	# Only understood by the fan-out proxy (comm.fanout)
+	def subscribe(self, idxs, policy=None):
+		self.sock.sendall(f"sub {' '.join(str(idx) for idx in idxs)}\n".encode())
+		if policy is not None:
+			self.sock.sendall(f"policy {policy}\n".encode())
+
 	def client_handler(self):
+		parser = self.parser
 		while self.alive:
 			try:
-				dat = self.sock.recv(1)
-				if dat is None:
-					break
-				if struct.unpack(ENDIANNESS + "B",dat)[0] != UPLINK_HEADER[0]:
-					continue
-				#print(dat)
-
-				dat = self.sock.recv(1)
-				if dat is None:
-					break
-
-				if struct.unpack(ENDIANNESS + "B",dat)[0] != UPLINK_HEADER[1]:
-					continue
-			except Exception as e:
-				print(e)
+				n = self.sock.recv_into(parser.space())
+			except OSError as e:
+				if self.alive:
+					print(e)
 				break
-
-			try:
-				size_dat = self.sock.recv(2)
-				if size_dat is None:
-					break
-			except:
+			if n == 0:
 				break
 
-			if len(size_dat) < 2:
+			parser.commit(n)
+			pkts = parser.parse()
+			if not pkts:
 				continue
+			self.stats.update(pkts)
 
-			size, idx = struct.unpack(ENDIANNESS + "BB", size_dat)
+			if self.telems is not None:
+				for idx, arr in decode_batch(self.telems, pkts, self.stats).items():
+					self.callback(idx, arr)
+			elif self.batch:
+				self.callback(pkts)
+			else:
+				for idx, data in pkts:
+					self.callback(idx, data)
 
-			try:
-				pkt_data = self.sock.recv(size)
-				if pkt_data is None:
-					break
-			except:
-				break
-
-			try:
-				dat = self.sock.recv(4)
-				if dat is None:
-					break
-
-				crc, = struct.unpack(ENDIANNESS + "I", dat)
-				calc = zlib.crc32(size_dat+pkt_data)
-
-				if crc != calc:
-					#print("CRC mismatch")
-					continue
-			except Exception as e:
-				continue
-
-			self.callback(idx, pkt_data)
-
-		self.alive = False
\ No newline at end of file
+		self.alive = False
@@ -5,6 +5,7 @@ import cmd2
 
 import enum
 import comm
+import comm.telemetry
 try:
 	import handlers
 except Exception as e:
@@ -151,6 +152,27 @@ class BaseCommander(cmd2.Cmd):
 
 		self.pico.set_telem_downsample(telem, arg.downsample)
 
+	tstats_parser = cmd2.Cmd2ArgumentParser()
+	tstats_parser.add_argument('ip', type=str, nargs='?', help="Telemetry server, reuses the last connection if omitted")
+	tstats_parser.add_argument('duration', type=float, nargs='?', default=2.0, help="Time to measure for (s)")
+	tstats_parser.add_argument('-p', '--port', type=int, default=comm.telemetry.TELEMETRY_PORT)
+
+	@cmd2.with_argparser(tstats_parser)
+	@cmd2.with_category("Telemetry")
+	def do_tstats(self, arg):
+		"""Shows the telemetry link stats: received, CRC failures, gaps, rate"""
+		client = getattr(self, "telem_client", None)
+		if arg.ip is not None or client is None or not client.alive:
+			if arg.ip is None:
+				self.poutput("Give the telemetry server IP")
+				return
+			if client is not None:
+				client.stop()
+			client = self.telem_client = comm.telemetry.Client(arg.ip, arg.port, lambda idx, dat: None)
+
+		time.sleep(arg.duration)
+		self.poutput(client.stats.report(self.pico.telems))
+
 	@cmd2.with_category("Debug")
 	def do_ready(self, arg):
 		"""ready: checks if the robot is ready to receive a new order"""
@@ -1,4 +1,5 @@
 import sys
+import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 
@@ -7,6 +8,49 @@ import comm
 
 robot = comm.make_asserv()
 
+# Visible time window and the highest telemetry rate the buffers can hold for it
+WINDOW = 10.0
+MAX_RATE = 4000
+
+# Fixed size ring of the last samples, every sample is written twice
+# so the last size samples are always a contiguous view
+class RingBuffer:
+	def __init__(self, dtype, size):
+		self.size = size
+		self.buf = np.zeros(2*size, dtype)
+		self.head = 0
+		self.count = 0
+
+	def clear(self):
+		self.head = 0
+		self.count = 0
+
+	def extend(self, arr):
+		arr = arr[-self.size:]
+		n = len(arr)
+		first = min(n, self.size - self.head)
+		for off in (self.head, self.head + self.size):
+			self.buf[off:off+first] = arr[:first]
+		if n > first:
+			self.buf[:n-first] = arr[first:]
+			self.buf[self.size:self.size+n-first] = arr[first:]
+		self.head = (self.head + n) % self.size
+		self.count = min(self.count + n, self.size)
+
+	def view(self):
+		end = self.head + self.size
+		return self.buf[end-self.count:end]
+
+# Min/max of the samples falling in each pixel column, keeps peaks visible
+def decimate(t, y, width):
+	per = len(t)//width
+	if per < 2:
+		return t, y
+	n = per*width
+	tb = t[-n:].reshape(width, per)
+	yb = y[-n:].reshape(width, per)
+	return np.stack((tb[:,0], tb[:,-1]), 1).ravel(), np.stack((yb.min(1), yb.max(1)), 1).ravel()
+
 class TelemetryPlot:
 	def __init__(self, telem):
 		self.telem = telem
@@ -17,45 +61,75 @@ class TelemetryPlot:
 		self.ax.set_title(pretty_name)
 		self.ax.set_xlabel("Time (s)")
 		self.plots = {name:self.ax.plot([], [], label=name)[0] for name in telem.fields()}
-		self.time_data = []
-		self.plot_data = {name:[] for name in telem.fields()}
+		self.ring = RingBuffer(telem.dtype, int(WINDOW*MAX_RATE))
+		self.last_ts = None
+		# Link stats, set once the client is up
+		self.stats = None
+		self.stats_text = self.ax.text(0.01, 0.99, "", transform=self.ax.transAxes, va="top", family="monospace", fontsize=8)
 		self.fig.legend()
 		self.anim = FuncAnimation(self.fig, self.update, interval=16, blit=True)
 
+	def update_stats(self):
+		if self.stats is None:
+			return
+		snap = self.stats.snapshot()
+		st = snap["streams"].get(self.telem.idx)
+		if st is None:
+			return
+		self.stats_text.set_text(f"{st['hz']:.0f}Hz rx {st['received']} crc {st['crc_failed']} bad {st['bad']} gaps {st['gaps']} (-{st['missing']})\n"
+			f"link {snap['link_rate']/1e3:.1f}kB/s skipped {snap['skipped']}B")
+
 	def update(self, i):
+		self.update_stats()
+		artists = (*self.plots.values(), self.stats_text)
+
+		data = self.ring.view()
+		if len(data) == 0:
+			return artists
+
+		time_data = data["timestamp"]
+		mval = time_data[-1]
+		data = data[np.searchsorted(time_data, mval-WINDOW):]
+		time_data = data["timestamp"]
+
+		width = max(1, int(self.ax.get_window_extent().width))
 		for name in self.plots.keys():
-			self.plots[name].set_data(self.time_data, self.plot_data[name])
+			self.plots[name].set_data(*decimate(time_data, data[name], width))
 
-		if len(self.time_data) > 0:
-			mval = self.time_data[-1]
-			self.ax.set_xlim(mval-10.0, mval)
+		self.ax.set_xlim(mval-WINDOW, mval)
 
-		return self.plots.values()
+		return artists
 
-	def handle_data(self, dat):
-		pkt = self.telem.to_packet(dat)
-		ts = pkt.timestamp
+	# The timestamps going back means the telemetry restarted, even when the sample at 0
+	# was downsampled away (same as TelemetryRecorder.handle_data)
+	def handle_data(self, arr):
+		ts = arr["timestamp"]
+		if len(ts) == 0:
+			return
+		resets = np.flatnonzero(ts[1:] < ts[:-1]) + 1
+		if self.last_ts is not None and ts[0] < self.last_ts:
+			resets = np.concatenate(([0], resets))
+		self.last_ts = ts[-1]
 
-		if ts == 0:
-			self.time_data = []
-			for name in self.plot_data.keys():
-				self.plot_data[name] = []
+		if len(resets) > 0:
+			arr = arr[resets[-1]:]
+			self.ring.clear()
 
-		self.time_data.append(ts)
-		for name, val in pkt.vals().items():
-			self.plot_data[name].append(val)
+		self.ring.extend(arr)
 
 plots = {}
 for idx, telem in robot.telems.items():
 	plots[idx] = TelemetryPlot(telem)
 
-def cb_func(idx, dat):
-	plots[idx].handle_data(dat)
+def cb_func(idx, arr):
+	plots[idx].handle_data(arr)
 
 if len(sys.argv) < 2:
 	print("Give IP")
 	exit()
 
-cl = telemetry.Client(sys.argv[1], 1337, cb_func)
+cl = telemetry.Client(sys.argv[1], telemetry.TELEMETRY_PORT, cb_func, telems=robot.telems)
+for plot in plots.values():
+	plot.stats = cl.stats
 
 plt.show()
\ No newline at end of file
@@ -1,24 +1,35 @@
-import RPi.GPIO as GPIO
 import threading, time
 import numpy as np
 import os
+try:
+	import RPi.GPIO as GPIO
+except Exception:
+	# Running off robot, on the simulator
+	GPIO = None
 try:
 	import hokuyolx
 	from RPLCD.i2c import CharLCD
 except Exception:
 	# Running on pami
-	pass
+	hokuyolx = None
+	CharLCD = None
 try:
 	from hcsr04sensor import sensor
 except Exception:
 	# Running on main
-	pass
+	sensor = None
 
 import metacom.mqtt as mqtt
+import comm
+from comm.state import StateSampler
+from comm.arbiter import BusBusy, Priority, bus_priority
 
 # General constants
 MATCH_PLAY_TIME = 99
 INST_WAIT = 1
+# Background sampling of the asserv state, shared by the lidar, ultrasound & scenario
+STATE_RATE = 50
+STATE_MAX_AGE = 2.0/STATE_RATE
 
 # Physical constants
 TABLE_WIDTH = 2000
@@ -44,7 +55,8 @@ LCD_ADDR = 0x3f
 LCD_COLS = 20
 LCD_ROWS = 4
 
-GPIO.setmode(GPIO.BCM)
+if GPIO is not None:
+	GPIO.setmode(GPIO.BCM)
 
 class JumperStart:
 	def __init__(self, pin=JUMPER_PIN, safe=False):
@@ -52,12 +64,19 @@ class JumperStart:
 		self.safe = safe
 
 		# Jumper in input Pull-Up
-		GPIO.setup(pin, GPIO.IN, GPIO.PUD_UP)
+		if GPIO is not None:
+			GPIO.setup(pin, GPIO.IN, GPIO.PUD_UP)
 
 	def state(self):
+		if GPIO is None:
+			return False
 		return not GPIO.input(self.pin)
 
 	def wait(self):
+		if GPIO is None:
+			print("No jumper, starting")
+			return
+
 		if self.safe and GPIO.input(self.pin):
 			print("Waiting for jumper to be inserted...")
 
@@ -152,9 +171,11 @@ class DisplayHandler:
 		self.use_thread = thread
 		self.score = 0
 
-		# Init. LCD
-		self.disp = CharLCD(i2c_expander='PCF8574', address=addr, port=1, cols=cols, rows=rows)
-		self.disp.clear()
+		# Init. LCD, none when simulating
+		self.disp = None
+		if CharLCD is not None and not comm.SIMULATED:
+			self.disp = CharLCD(i2c_expander='PCF8574', address=addr, port=1, cols=cols, rows=rows)
+			self.disp.clear()
 
 		self.thread = None
 		self.alive = False
@@ -189,10 +210,12 @@ class DisplayHandler:
 		return self.score
 
 	def draw_display(self):
+		if self.disp is None:
+			return
+
 		if self.debug:
 			if self.asserv is not None:
-				dst, theta = self.asserv.get_pos()
-				x,y = self.asserv.get_pos_xy()
+				(dst, theta), (x,y), state, lstats, rstats = self.asserv.debug_get_state()
 				theta %= (1 if theta >= 0 else -1)*2*np.pi
 
 				linest = f"{int(x)}"
@@ -208,7 +231,6 @@ class DisplayHandler:
 
 			if self.asserv is not None:
 				run = self.asserv.running
-				state = self.asserv.debug_get_controller_state()
 				if run:
 					if state == 0:
 						linest += "THETA"
@@ -228,7 +250,7 @@ class DisplayHandler:
 
 			if self.action is not None:
 				linest = linest.ljust(10)
-				rd, ld = self.action.right_arm_deployed(), self.action.left_arm_deployed()
+				ld, rd = self.action.arms_deployed()
 				if ld:
 					linest += "DEP"
 				else:
@@ -246,8 +268,8 @@ class DisplayHandler:
 				self.disp.write_string(linest)
 
 			if self.asserv is not None:
-				lvel, lcurr, ltemp, lvbus = self.asserv.debug_get_left_bg_stats()
-				rvel, rcurr, rtemp, rvbus = self.asserv.debug_get_right_bg_stats()
+				lvel, lcurr, ltemp, lvbus = lstats
+				rvel, rcurr, rtemp, rvbus = rstats
 				linest = f"{int(ltemp)}C"
 				linest = linest.ljust(5)
 				linest += f"{lcurr:.1f}A"
@@ -264,9 +286,14 @@ class DisplayHandler:
 		self.disp.write_string(f"     Score: {self.score}".ljust(20))
 
 	def thread_func(self):
-		while self.alive:
-			self.draw_display()
-			time.sleep(1/self.rate)
+		with bus_priority(Priority.DISPLAY):
+			while self.alive:
+				try:
+					self.draw_display()
+				except BusBusy:
+					# Bus is busy with more important stuff, skip this frame
+					pass
+				time.sleep(1/self.rate)
 
 class HCSR04Handler:
 	def __init__(self, trig, echo, width, length, max_dst, margin, pos_func, detected_func, cleared_func=None, dir=1):
@@ -327,14 +354,22 @@ def inst(func):
 	return inner
 
 class BaseScenario:
-	def __init__(self, asserv, start_x, start_y, start_theta, inst_wait=0, ip_nuc=None, mcom_class=None, obs_restart=False):
+	def __init__(self, asserv, start_x, start_y, start_theta, inst_wait=0, ip_nuc=None, mcom_class=None, obs_restart=False, state_battery=True):
 		self.start_x = start_x
 		self.start_y = start_y
 		self.start_theta = start_theta
 
 		self.asserv = asserv
+		self.state = StateSampler(asserv, STATE_RATE, state_battery)
 		self.inst_wait = inst_wait
 		self.obs_restart = obs_restart
+		self.match_time = MATCH_PLAY_TIME
+
+		# The simulator runs faster than real time, so do our waits
+		if comm.SIMULATED:
+			self.inst_wait /= comm.SIM_SPEED
+			self.match_time /= comm.SIM_SPEED
+			ip_nuc = None
 
 		self.start_info = mqtt.InfoDebut()
 		self.mcom = None
@@ -354,9 +389,13 @@ class BaseScenario:
 	def stop_thread_func(self):
 		while not self.started:
 			time.sleep(0.01)
-		time.sleep(MATCH_PLAY_TIME)
+		time.sleep(self.match_time)
 		self.finish()
 
+	# Waits in match time, faster on the simulator
+	def sleep(self, seconds):
+		comm.sleep(seconds)
+
 	# dst in mm, angle in deg
 	@inst
 	def move(self, dst, angle=0, **kwargs):
@@ -372,9 +411,10 @@ class BaseScenario:
 	def move_abs(self, x, y, **kwargs):
 		self.asserv.move_abs(x, y, **kwargs)
 
-	def get_rel_pos(self):
-		_, theta = self.asserv.get_pos()
-		x,y = self.asserv.get_pos_xy()
+	def get_rel_pos(self, max_age=STATE_MAX_AGE):
+		state = self.state.get(max_age)
+		_, theta = state.pos
+		x,y = state.pos_xy
 		return x,y,theta
 
 	def get_pos(self, x_off=0, y_off=0):
@@ -418,6 +458,9 @@ class BaseScenario:
 			self.started = False
 		finally:
 			self.finish()
+			print(f"I2C bus arbiter:\n{self.asserv.lock.report()}")
+			if comm.SIMULATED:
+				print(comm.I2C_BUS.report())
 
 	# ====== To implement =======
 
@@ -431,10 +474,12 @@ class BaseScenario:
 	# Happens before the play, needs to wait for the right time here, either using a jumper or with mcom
 	def startup(self):
 		self.asserv.start()
+		self.state.start()
 
 	# When you play returns, be called after 100s regardless
 	def finish(self):
 		print("Stopping everything")
+		self.state.stop()
 		self.asserv.stop()
 
 class Scenario(BaseScenario):
@@ -444,7 +489,7 @@ class Scenario(BaseScenario):
 
 		self.jumper = JumperStart(safe=jumper_safe)
 		self.lidar = LidarHandler(TABLE_WIDTH, TABLE_LENGTH, lidar_radius, lidar_margin, lambda: self.get_pos(LIDAR_OFFSET_TO_FRONT - ENCODER_OFFSET_TO_FRONT),
-								self.obs_detect, self.obs_cleared) if lidar_enable else None
+								self.obs_detect, self.obs_cleared) if lidar_enable and hokuyolx is not None and not comm.SIMULATED else None
 		self.disp = DisplayHandler(asserv=self.asserv, action=self.action, jumper=self.jumper, thread=False)
 
 	@inst
@@ -510,10 +555,10 @@ class Scenario(BaseScenario):
 
 class PaminableScenario(BaseScenario):
 	def __init__(self, asserv, start_x, start_y, start_theta, inst_wait=0, ultra_enable=True, ultra_restart=False, ultra_radius=300, ultra_margin=10, ip_nuc=None):
-		super().__init__(asserv, start_x, start_y, start_theta, inst_wait, ip_nuc, mqtt.Paminable, ultra_restart)
+		super().__init__(asserv, start_x, start_y, start_theta, inst_wait, ip_nuc, mqtt.Paminable, ultra_restart, False)
 
 		self.ultra = HCSR04Handler(HCSR04_TRIG, HCSR04_ECHO, TABLE_WIDTH, TABLE_LENGTH, ultra_radius, ultra_margin, lambda: self.get_pos(HCSR04_OFFSET_TO_ENCODER),
-								self.obs_detect, self.obs_cleared, -1) if ultra_enable else None
+								self.obs_detect, self.obs_cleared, -1) if ultra_enable and sensor is not None and not comm.SIMULATED else None
 
 	def startup(self):
 		super().startup()
@@ -74,7 +74,7 @@ class CustomScenario(handlers.Scenario):
         self.turn(SIDE_DIR * 45)
         self.move(1135) #petit marche avant pour recaler les plantes
         #self.move(SIDE_DIR * 30)
-        time.sleep(2)
+        self.sleep(2)
         self.move(-400)
         self.turn(SIDE_DIR*35)
         self.move(440)
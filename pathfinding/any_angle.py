@@ -0,0 +1,139 @@
+"""
+Any angle paths with Lazy Theta*, straight segments between waypoints instead of grid moves,
+so fewer move(rho, theta) commands
+"""
+
+import math
+import numpy as np
+
+from working_a_star import AStarPlanner, BinaryGridGraph, MinHeap, castar, c_planners, simplify_path, vectorize_path
+
+
+def line_cells(a, b) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Cells the segment between the centers of a and b goes through, in order
+    Passing exactly on a corner goes diagonally, like the grid moves
+    """
+    (x0, y0), (x1, y1) = a, b
+    dx, dy = abs(x1 - x0), abs(y1 - y0)
+    # Where it crosses the vertical and horizontal cell borders, scaled by 2 * dx * dy to stay exact
+    cross_x = (2 * np.arange(dx) + 1) * max(dy, 1)
+    cross_y = (2 * np.arange(dy) + 1) * max(dx, 1)
+    crossings = np.union1d(cross_x, cross_y)
+    xs = x0 + np.sign(x1 - x0) * np.searchsorted(cross_x, crossings, 'right')
+    ys = y0 + np.sign(y1 - y0) * np.searchsorted(cross_y, crossings, 'right')
+    return np.concatenate(([x0], xs)), np.concatenate(([y0], ys))
+
+
+def line_of_sight(grid: np.ndarray, a, b) -> bool:
+    """Is the segment between the centers of a and b free"""
+    if castar is not None:
+        return castar.line_of_sight(grid, a, b)
+    return not np.any(grid[line_cells(a, b)])
+
+
+def path_length(path) -> float:
+    """Length of a waypoint path in cells"""
+    return float(np.sum(np.hypot(*np.diff(np.asarray(path, float), axis=0).T))) if len(path) > 1 else 0.0
+
+
+class LazyThetaStar:
+    """
+    Same as workspace_theta in c_src/theta.c, same costs (UNIT per cell, rounded the same),
+    neighbor order and heap, so both give the same path
+    """
+    UNIT = 1000
+    # (dx, dy) in the order of nb_index in theta.c
+    NEIGHBORS = [(nb_index % 3 - 1, nb_index // 3 - 1) for nb_index in range(9) if nb_index != 4]
+
+    def __init__(self, graph: BinaryGridGraph):
+        self.graph = graph
+
+    def distance(self, dx, dy) -> int:
+        return int(self.UNIT * math.sqrt(dx * dx + dy * dy) + 0.5)
+
+    def heuristic(self, dx, dy) -> int:
+        """Rounded down so it never overestimates"""
+        return int(self.UNIT * math.sqrt(dx * dx + dy * dy))
+
+    def neighbors(self, x, y):
+        for dx, dy in self.NEIGHBORS:
+            if 0 <= x + dx < self.graph.width and 0 <= y + dy < self.graph.height:
+                yield x + dx, y + dy
+
+    def shortest_path(self, start, end) -> list:
+        """Waypoints from start to end, each one in sight of the next, empty if end can't be reached"""
+        grid, height = self.graph.grid, self.graph.height
+        costs, heuristics, parents = {}, {}, {}
+        heap = MinHeap(np.full(self.graph.width * height, -1, np.intp), lambda node: (costs[node] + heuristics[node], heuristics[node]))
+
+        def closed(node):
+            return node in costs and heap.indices[node] == -1
+
+        start_node, end_node = start[0] * height + start[1], end[0] * height + end[1]
+        costs[start_node], parents[start_node] = 0, start_node
+        heuristics[start_node] = self.heuristic(start[0] - end[0], start[1] - end[1])
+        heap.push(start_node)
+
+        while heap:
+            current = heap.extract_min()
+            x, y = divmod(current, height)
+
+            # The parent was assumed in sight, otherwise take the best expanded neighbor
+            parent = parents[current]
+            if parent != current and not line_of_sight(grid, divmod(parent, height), (x, y)):
+                costs[current] = math.inf
+                for nx, ny in self.neighbors(x, y):
+                    neighbor = nx * height + ny
+                    if not closed(neighbor):
+                        continue
+                    cost = costs[neighbor] + self.distance(nx - x, ny - y)
+                    if cost < costs[current]:
+                        costs[current], parents[current] = cost, neighbor
+            if current == end_node:
+                break
+
+            parent = parents[current]
+            px, py = divmod(parent, height)
+            for nx, ny in self.neighbors(x, y):
+                neighbor = nx * height + ny
+                if grid[nx, ny] or closed(neighbor):
+                    continue
+                # Straight from the parent, checked when the neighbor gets expanded
+                cost = costs[parent] + self.distance(nx - px, ny - py)
+                if neighbor not in costs:
+                    costs[neighbor], parents[neighbor] = cost, parent
+                    heuristics[neighbor] = self.heuristic(nx - end[0], ny - end[1])
+                    heap.push(neighbor)
+                elif cost < costs[neighbor]:
+                    costs[neighbor], parents[neighbor] = cost, parent
+                    heap.update(neighbor)
+
+        if not closed(end_node):
+            return []
+        path = [end_node]
+        while parents[path[-1]] != path[-1]:
+            path.append(parents[path[-1]])
+        return [divmod(node, height) for node in reversed(path)]
+
+
+def any_angle_path(grid: np.ndarray, start, end) -> np.ndarray:
+    """
+    (n, 2) array of waypoints from start to end, empty if end can't be reached
+    Compiled Lazy Theta* when castar is built.
+    Its fallback to the neighbors can zigzag on crowded grids, so it's never longer than
+    string pulling the A* path (vectorize_path), that one is taken instead when shorter.
+    """
+    if castar is not None:
+        planner = c_planners.get(grid.shape)
+        if planner is None:
+            planner = c_planners[grid.shape] = castar.Planner(grid.shape)
+        path, grid_path = planner.plan_any_angle(grid, start, end), planner.plan(grid, start, end)
+    else:
+        graph = BinaryGridGraph(grid)
+        path = np.array(LazyThetaStar(graph).shortest_path(tuple(start), tuple(end)), np.intp).reshape(-1, 2)
+        grid_path = AStarPlanner(graph).shortest_path(tuple(start), tuple(end))
+    if len(path) == 0:
+        return path
+    pulled = simplify_path(vectorize_path(grid, grid_path))
+    return pulled if path_length(pulled) < path_length(path) else path
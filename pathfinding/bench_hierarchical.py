@@ -0,0 +1,56 @@
+"""
+HPA* against A* on the inflated table costmap
+python bench_hierarchical.py [resolution mm] [cluster size]
+"""
+
+import sys
+import time
+import numpy as np
+
+from costmap import Costmap
+from hierarchical import HierarchicalPlanner, path_cost
+from working_a_star import shortest_path_c
+
+RESOLUTION = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+CLUSTER = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+NB_QUERIES = 30
+
+
+def free_cell(rng, grid):
+    while True:
+        cell = int(rng.integers(grid.shape[0])), int(rng.integers(grid.shape[1]))
+        if not grid[cell]:
+            return cell
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    costmap = Costmap(RESOLUTION)
+    for _ in range(6):
+        x, y = rng.integers(3000), rng.integers(2000)
+        costmap.add_static_rect(x, y, x + 450, y + 150)
+    costmap.add_static_rect(1200, 0, 1800, 200)
+    costmap.rebuild()
+    grid = costmap.grid
+    print(f'Grid {grid.shape}, clusters of {CLUSTER}')
+
+    t = time.perf_counter()
+    planner = HierarchicalPlanner(grid, CLUSTER)
+    print(f'Build: {(time.perf_counter() - t) * 1000:.1f} ms')
+
+    queries = [(free_cell(rng, grid), free_cell(rng, grid)) for _ in range(NB_QUERIES)]
+    t = time.perf_counter()
+    paths = [planner.plan(start, end) for start, end in queries]
+    print(f'HPA*: {(time.perf_counter() - t) / NB_QUERIES * 1000:.2f} ms/query')
+    t = time.perf_counter()
+    a_star_paths = [shortest_path_c(grid, start, end) for start, end in queries]
+    print(f'C A*: {(time.perf_counter() - t) / NB_QUERIES * 1000:.2f} ms/query')
+
+    ratios = [path_cost(path) / path_cost(a_star) for path, a_star in zip(paths, a_star_paths) if len(a_star) > 1]
+    print(f'Path cost / A*: mean {np.mean(ratios):.3f}, max {np.max(ratios):.3f}')
+
+    # Opponent showing up
+    changes = costmap.set_obstacles({'opponent': (2000, 600, 200)})
+    t = time.perf_counter()
+    planner.update_cells(changes)
+    print(f'Update after an opponent move: {(time.perf_counter() - t) * 1000:.1f} ms')
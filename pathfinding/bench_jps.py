@@ -0,0 +1,65 @@
+"""
+A* against Jump Point Search on table like grids, 3000x2000 mm at RESOLUTION mm per cell
+python bench_jps.py [resolution]
+"""
+
+import sys
+import time
+import numpy as np
+
+from working_a_star import BinaryGridGraph, AStarPlanner, shortest_path_c, castar
+from jps import shortest_path_jps, jps_table
+
+TABLE_SIZE = 3000, 2000
+RESOLUTION = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+NB_QUERIES = 20
+
+
+def table_grid(rng):
+    """Zones along the borders, a few fixed obstacles and an opponent disc, in cells"""
+    w, h = TABLE_SIZE[0] // RESOLUTION, TABLE_SIZE[1] // RESOLUTION
+    grid = np.zeros((w, h), np.uint8)
+    x, y = np.ogrid[:w, :h]
+    for _ in range(6):
+        cx, cy = rng.integers(w), rng.integers(h)
+        grid[cx:cx + 450 // RESOLUTION, cy:cy + 150 // RESOLUTION] = 1
+    grid[w // 2 - 300 // RESOLUTION:w // 2 + 300 // RESOLUTION, :200 // RESOLUTION] = 1
+    ox, oy = rng.integers(w), rng.integers(h)
+    grid |= ((x - ox) ** 2 + (y - oy) ** 2 < (400 // RESOLUTION) ** 2).astype(np.uint8)
+    return grid
+
+
+def free_cell(rng, grid):
+    while True:
+        cell = int(rng.integers(grid.shape[0])), int(rng.integers(grid.shape[1]))
+        if not grid[cell]:
+            return cell
+
+
+def timed(name, function, queries):
+    t = time.perf_counter()
+    for start, end in queries:
+        function(start, end)
+    print(f'{name}: {(time.perf_counter() - t) / len(queries) * 1000:.2f} ms/query')
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    grid = table_grid(rng)
+    queries = [(free_cell(rng, grid), free_cell(rng, grid)) for _ in range(NB_QUERIES)]
+    print(f'Grid {grid.shape}, {NB_QUERIES} queries')
+
+    if castar is not None:
+        t = time.perf_counter()
+        table = jps_table(grid)
+        print(f'JPS+ table: {(time.perf_counter() - t) * 1000:.2f} ms')
+        timed('C A*', lambda s, e: shortest_path_c(grid, s, e), queries)
+        timed('C JPS', lambda s, e: shortest_path_c(grid, s, e, jps=True), queries)
+        timed('C JPS+', lambda s, e: shortest_path_c(grid, s, e, table=table), queries)
+
+    graph = BinaryGridGraph(grid)
+    planner = AStarPlanner(graph)
+    timed('Python A*', planner.shortest_path, queries)
+    timed('Python JPS', lambda s, e: shortest_path_jps(graph, s, e), queries)
+    if castar is not None:
+        timed('Python JPS+', lambda s, e: shortest_path_jps(graph, s, e, table), queries)
@@ -1,5 +1,6 @@
 rm -fr ./c_src/build
 mkdir ./c_src/build
-cmake -S ./c_src -B ./c_src/build
+cmake -S ./c_src -B ./c_src/build -DPython3_EXECUTABLE="$(command -v python3)"
 make -C ./c_src/build
-cp ./c_src/build/libAstar.so ./libAstar.so
\ No newline at end of file
+cp ./c_src/build/libAstar.so ./libAstar.so
+cp ./c_src/build/castar*.so ./
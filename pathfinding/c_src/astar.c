@@ -1,6 +1,7 @@
 #include "astar.h"
 #include "min_heap.h"
 #include "stdlib.h"
+#include "string.h"
 #define MIN(A, B) (((A) < (B) ? (A) : (B)))
 #define MAX(A, B) (((A) > (B) ? (A) : (B)))
 #define IS_NEGATIVE(X) ((X) & 0x80000000)
@@ -19,36 +20,73 @@ void f_score(uint32_t node_index, void* context, KeyValue* output) {
     output->heuristic = node->heuristic;
 }
 
-uint32_t* grid_astar(const uint32_t width, const uint32_t height, const uint8_t * const grid, const uint32_t start_node, const uint32_t end_node) {
-    // Convert end index to position
-    const uint32_t end_x = end_node / height, end_y = end_node % height;
+uint8_t workspace_init(Workspace* const ws, const uint32_t width, const uint32_t height) {
+    ws->width = width;
+    ws->height = height;
+    ws->generation = 0;
+    ws->path_capacity = 0;
+    ws->path = NULL;
+    ws->nodes = (Node*) malloc(sizeof(Node) * width * height);
+    ws->stamps = (uint32_t*) calloc(width * height, sizeof(uint32_t));
+    ws->heap_key.function = f_score;
+    ws->heap_key.context = (void*) ws->nodes;
+    heap_init(&ws->heap, width * height, &ws->heap_key);
+    return ws->nodes && ws->stamps && ws->heap.values && ws->heap.indices;
+}
+
+void workspace_clear(Workspace* const ws) {
+    free(ws->nodes);
+    free(ws->stamps);
+    free(ws->path);
+    heap_clear(&ws->heap);
+}
 
-    // Initialize nodes
-    Node* nodes = (Node*) malloc(sizeof(Node) * width * height);
-    for (uint32_t index = 0; index < width * height; index++) {
-        nodes[index].cost = -1;
-        nodes[index].heuristic = -1;
-        nodes[index].previous = -1;
+void workspace_new_search(Workspace* const ws) {
+    // Every stamp from the previous searches is now stale
+    if (++ws->generation == 0) {
+        memset(ws->stamps, 0, sizeof(uint32_t) * ws->width * ws->height);
+        ws->generation = 1;
     }
+}
+
+void workspace_end_search(Workspace* const ws) {
+    // Empty the open set, only the nodes still in it need their index reset
+    MinHeap* const heap = &ws->heap;
+    while (heap->length)
+        heap->indices[heap->values[--heap->length]] = UINT32_MAX;
+}
+
+uint8_t workspace_reserve_path(Workspace* const ws, const uint32_t length) {
+    if (length + 1 <= ws->path_capacity) return 1;
+    free(ws->path);
+    ws->path_capacity = MAX(length + 1, 2 * ws->path_capacity);
+    ws->path = (uint32_t*) malloc(ws->path_capacity * sizeof(uint32_t));
+    if (!ws->path) ws->path_capacity = 0;
+    return ws->path != NULL;
+}
+
+uint32_t workspace_astar(Workspace* const ws, const uint8_t * const grid, const uint32_t start_node, const uint32_t end_node) {
+    const uint32_t width = ws->width, height = ws->height;
+    Node* const nodes = ws->nodes;
+    MinHeap* const heap = &ws->heap;
 
-    // Initialize heap
-    ContextFunction heap_key = {
-        .function = f_score,
-        .context = (void*) nodes
-    };
-    MinHeap heap;
-    heap_init(&heap, width * height, &heap_key);
+    workspace_new_search(ws);
+
+    // Convert end index to position
+    const uint32_t end_x = end_node / height, end_y = end_node % height;
 
     // Initialize start node
+    ws->stamps[start_node] = ws->generation;
     nodes[start_node].cost = 0;
+    nodes[start_node].previous = -1;
     // compute start heuristic
     const uint32_t DX = ABS(start_node / height - end_x);
     const uint32_t DY = ABS(start_node % height - end_y);
     nodes[start_node].heuristic = (SQRT2 - ONE) * MIN(DX, DY) + ONE * MAX(DX, DY);
-    heap_push(&heap, start_node);
+    heap_push(heap, start_node);
 
-    while (heap.length) {
-        uint32_t current_node = heap_extract_min(&heap);
+    while (heap->length) {
+        uint32_t current_node = heap_extract_min(heap);
         if (current_node == end_node) break;
 
         uint32_t x = current_node / height, y = current_node % height;
@@ -63,8 +101,9 @@ uint32_t* grid_astar(const uint32_t width, const uint32_t height, const uint8_t
             uint32_t cost = nodes[current_node].cost + COSTS[ABS(dx) + ABS(dy) - 1];
 
             // Have I met that guy before
-            if (nodes[neighbor].cost == UINT32_MAX) {
+            if (!met(ws, neighbor)) {
                 // Never met
+                ws->stamps[neighbor] = ws->generation;
                 nodes[neighbor].cost = cost;
                 nodes[neighbor].previous = current_node;
 
@@ -73,35 +112,55 @@ uint32_t* grid_astar(const uint32_t width, const uint32_t height, const uint8_t
                 dy = ABS(y + dy - end_y);
                 nodes[neighbor].heuristic = (SQRT2 - ONE) * MIN(dx, dy) + ONE * MAX(dx, dy);
 
-                heap_push(&heap, neighbor);
+                heap_push(heap, neighbor);
             // Is it a better way
             } else if (cost < nodes[neighbor].cost) {
                 // Much Better
                 nodes[neighbor].cost = cost;
                 nodes[neighbor].previous = current_node;
-                heap_update(&heap, neighbor);
+                heap_update(heap, neighbor);
             }
         }
     }
-    heap_clear(&heap);
 
-    // Measure path length
-    int path_length = 0;
-    uint32_t current = end_node;
+    workspace_end_search(ws);
+
+    // Measure path length, empty if the end was never reached
+    uint32_t path_length = 0;
+    uint32_t current = met(ws, end_node) ? end_node : UINT32_MAX;
     while (current != UINT32_MAX) {
         path_length += 1;
         current = nodes[current].previous;
     }
 
     // Build path
-    uint32_t* result = (uint32_t*) malloc((path_length+1) * sizeof(uint32_t));
+    if (!workspace_reserve_path(ws, path_length)) return UINT32_MAX;
+    uint32_t length = path_length;
     current = end_node;
-    result[path_length] = UINT32_MAX;
+    ws->path[path_length] = UINT32_MAX;
     while (path_length) {
-        result[--path_length] = current;
+        ws->path[--path_length] = current;
         current = nodes[current].previous;
     }
 
-    free(nodes);
+    return length;
+}
+
+uint32_t* grid_astar(const uint32_t width, const uint32_t height, const uint8_t * const grid, const uint32_t start_node, const uint32_t end_node) {
+    Workspace ws;
+    uint32_t* result = NULL;
+    if (workspace_init(&ws, width, height)) {
+        uint32_t length = workspace_astar(&ws, grid, start_node, end_node);
+        if (length != UINT32_MAX) {
+            // The workspace path is already terminated, hand it over
+            result = ws.path;
+            ws.path = NULL;
+        }
+    }
+    workspace_clear(&ws);
     return result;
-}
\ No newline at end of file
+}
+
+void grid_astar_free(uint32_t* path) {
+    free(path);
+}
@@ -1,12 +1,78 @@
 #ifndef ASTAR_ASTAR_H
 #define ASTAR_ASTAR_H
 #include <stdint.h>
+#include "min_heap.h"
 
 typedef struct {
     uint32_t cost, heuristic, previous;
 } Node;
 
+extern const uint32_t ONE, SQRT2;
 
+
+/**
+ * Search state kept between queries on same size grids.
+ * A node only belongs to the current search if its stamp is the current generation,
+ * so a new search doesn't have to reset every node.
+ */
+typedef struct {
+    uint32_t width, height, generation;
+    Node* nodes;
+    uint32_t* stamps;
+    MinHeap heap;
+    ContextFunction heap_key;
+    uint32_t *path, path_capacity;
+} Workspace;
+
+/**
+ * Allocate the workspace arrays
+ * @return 0 if an allocation failed, clear it anyway
+ */
+uint8_t workspace_init(Workspace* ws, uint32_t width, uint32_t height);
+
+/**
+ * Free the workspace arrays
+ */
+void workspace_clear(Workspace* ws);
+
+/**
+ * Node of the current search, lazily reset the first time it's met
+ */
+static inline uint8_t met(const Workspace* const ws, const uint32_t node) {
+    return ws->stamps[node] == ws->generation;
+}
+
+/**
+ * Start a new search, invalidates every node
+ */
+void workspace_new_search(Workspace* ws);
+
+/**
+ * Empty the open set after a search
+ */
+void workspace_end_search(Workspace* ws);
+
+/**
+ * Make room for a path of length nodes (and its terminator) in ws->path
+ * @return 0 if out of memory
+ */
+uint8_t workspace_reserve_path(Workspace* ws, uint32_t length);
+
+void f_score(uint32_t node_index, void* context, KeyValue* output);
+
+/**
+ * A* reusing the workspace, only touches the nodes it expands
+ * @return path length, the path is in ws->path (terminated by UINT32_MAX), UINT32_MAX if out of memory
+ */
+uint32_t workspace_astar(Workspace* ws, const uint8_t * grid, uint32_t start_node, uint32_t end_node);
+
+/**
+ * A* on a width*height grid (index x * height + y), 8-connected
+ * @return node indices from start to end, terminated by UINT32_MAX, empty if unreachable.
+ * Free it with grid_astar_free
+ */
 uint32_t* grid_astar(uint32_t width, uint32_t height, const uint8_t * grid, uint32_t start_node, uint32_t end_node);
 
+void grid_astar_free(uint32_t* path);
+
 #endif //ASTAR_ASTAR_H
@@ -0,0 +1,311 @@
+//
+// CPython/NumPy binding of grid_astar
+//
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#define NPY_NO_DEPRECATED_API NPY_1_7_API_VERSION
+#include <numpy/arrayobject.h>
+#include <pythread.h>
+
+#include "astar.h"
+#include "jps.h"
+#include "theta.h"
+
+
+/**
+ * Grid argument as an array, not copied if it's a C-contiguous uint8 (or bool) array
+ * @return new reference to the grid, NULL on error
+ */
+static PyArrayObject* grid_from_object(PyObject* grid_obj) {
+    PyArrayObject* grid;
+    if (PyArray_Check(grid_obj) && PyArray_TYPE((PyArrayObject*) grid_obj) == NPY_BOOL)
+        grid = (PyArrayObject*) PyArray_FROMANY(grid_obj, NPY_BOOL, 2, 2, NPY_ARRAY_IN_ARRAY);
+    else
+        grid = (PyArrayObject*) PyArray_FROMANY(grid_obj, NPY_UINT8, 2, 2, NPY_ARRAY_IN_ARRAY);
+    if (grid && (uint64_t) PyArray_DIM(grid, 0) * PyArray_DIM(grid, 1) >= UINT32_MAX) {
+        Py_DECREF(grid);
+        PyErr_SetString(PyExc_ValueError, "grid too large");
+        return NULL;
+    }
+    return grid;
+}
+
+/**
+ * Parse (grid, start, end[, table]), table_obj NULL if there's no table argument
+ * @return new reference to the grid, NULL on error
+ */
+static PyArrayObject* parse_query(PyObject* args, uint32_t* start_node, uint32_t* end_node, PyObject** table_obj) {
+    PyObject* grid_obj;
+    Py_ssize_t start_x, start_y, end_x, end_y;
+    if (table_obj) *table_obj = NULL;
+    if (!PyArg_ParseTuple(args, table_obj ? "O(nn)(nn)|O" : "O(nn)(nn)", &grid_obj, &start_x, &start_y, &end_x, &end_y, table_obj)) return NULL;
+
+    PyArrayObject* grid = grid_from_object(grid_obj);
+    if (!grid) return NULL;
+
+    const npy_intp width = PyArray_DIM(grid, 0), height = PyArray_DIM(grid, 1);
+    if (start_x < 0 || start_x >= width || start_y < 0 || start_y >= height ||
+        end_x < 0 || end_x >= width || end_y < 0 || end_y >= height) {
+        Py_DECREF(grid);
+        PyErr_SetString(PyExc_ValueError, "start and end must be inside the grid");
+        return NULL;
+    }
+
+    *start_node = start_x * height + start_y;
+    *end_node = end_x * height + end_y;
+    return grid;
+}
+
+/**
+ * (n, 2) array of (x, y) from node indices terminated by UINT32_MAX
+ */
+static PyObject* path_to_array(const uint32_t* const result, const uint32_t height) {
+    npy_intp length = 0;
+    while (result[length] != UINT32_MAX) length++;
+
+    npy_intp dims[2] = {length, 2};
+    PyArrayObject* path = (PyArrayObject*) PyArray_SimpleNew(2, dims, NPY_INTP);
+    if (!path) return NULL;
+
+    npy_intp* out = (npy_intp*) PyArray_DATA(path);
+    for (npy_intp index = 0; index < length; index++) {
+        out[2 * index] = result[index] / height;
+        out[2 * index + 1] = result[index] % height;
+    }
+    return (PyObject*) path;
+}
+
+static PyObject* castar_grid_astar(PyObject* self, PyObject* args) {
+    (void) self;
+    uint32_t start_node, end_node;
+    PyArrayObject* grid = parse_query(args, &start_node, &end_node, NULL);
+    if (!grid) return NULL;
+
+    const uint32_t width = PyArray_DIM(grid, 0), height = PyArray_DIM(grid, 1);
+    const uint8_t* cells = (const uint8_t*) PyArray_DATA(grid);
+    uint32_t* result;
+    // The grid stays referenced, other threads can run while planning
+    Py_BEGIN_ALLOW_THREADS
+    result = grid_astar(width, height, cells, start_node, end_node);
+    Py_END_ALLOW_THREADS
+    Py_DECREF(grid);
+
+    if (!result) return PyErr_NoMemory();
+
+    PyObject* path = path_to_array(result, height);
+    grid_astar_free(result);
+    return path;
+}
+
+static PyObject* castar_jps_table(PyObject* self, PyObject* args) {
+    (void) self;
+    PyObject* grid_obj;
+    if (!PyArg_ParseTuple(args, "O", &grid_obj)) return NULL;
+    PyArrayObject* grid = grid_from_object(grid_obj);
+    if (!grid) return NULL;
+
+    npy_intp dims[3] = {PyArray_DIM(grid, 0), PyArray_DIM(grid, 1), 8};
+    PyArrayObject* table = (PyArrayObject*) PyArray_SimpleNew(3, dims, NPY_INT32);
+    if (!table) {
+        Py_DECREF(grid);
+        return NULL;
+    }
+
+    const uint8_t* cells = (const uint8_t*) PyArray_DATA(grid);
+    int32_t* dists = (int32_t*) PyArray_DATA(table);
+    Py_BEGIN_ALLOW_THREADS
+    jps_table(dims[0], dims[1], cells, dists);
+    Py_END_ALLOW_THREADS
+    Py_DECREF(grid);
+    return (PyObject*) table;
+}
+
+
+static PyObject* castar_line_of_sight(PyObject* self, PyObject* args) {
+    (void) self;
+    uint32_t start_node, end_node;
+    PyArrayObject* grid = parse_query(args, &start_node, &end_node, NULL);
+    if (!grid) return NULL;
+
+    const uint32_t height = PyArray_DIM(grid, 1);
+    const uint8_t visible = line_of_sight(PyArray_DIM(grid, 0), height, (const uint8_t*) PyArray_DATA(grid),
+                                          start_node / height, start_node % height, end_node / height, end_node % height);
+    Py_DECREF(grid);
+    return PyBool_FromLong(visible);
+}
+
+
+// Planner, owns a workspace reused by every query on the same grid size
+
+enum { PLAN_ASTAR, PLAN_JPS, PLAN_THETA };
+
+typedef struct {
+    PyObject_HEAD
+    Workspace ws;
+    PyThread_type_lock lock;
+} PlannerObject;
+
+static int Planner_init(PlannerObject* self, PyObject* args, PyObject* kwds) {
+    (void) kwds;
+    Py_ssize_t width, height;
+    if (!PyArg_ParseTuple(args, "(nn)", &width, &height)) return -1;
+    if (width <= 0 || height <= 0 || (uint64_t) width * height >= UINT32_MAX) {
+        PyErr_SetString(PyExc_ValueError, "invalid grid shape");
+        return -1;
+    }
+
+    if (self->lock) workspace_clear(&self->ws);
+    else if (!(self->lock = PyThread_allocate_lock())) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    if (!workspace_init(&self->ws, width, height)) {
+        workspace_clear(&self->ws);
+        PyThread_free_lock(self->lock);
+        self->lock = NULL;
+        PyErr_NoMemory();
+        return -1;
+    }
+    return 0;
+}
+
+static void Planner_dealloc(PlannerObject* self) {
+    if (self->lock) {
+        workspace_clear(&self->ws);
+        PyThread_free_lock(self->lock);
+    }
+    Py_TYPE(self)->tp_free((PyObject*) self);
+}
+
+static PyObject* Planner_run(PlannerObject* self, PyObject* args, const int mode) {
+    if (!self->lock) {
+        PyErr_SetString(PyExc_RuntimeError, "Planner not initialized");
+        return NULL;
+    }
+
+    uint32_t start_node, end_node;
+    PyObject* table_obj = NULL;
+    PyArrayObject* grid = parse_query(args, &start_node, &end_node, mode == PLAN_JPS ? &table_obj : NULL);
+    if (!grid) return NULL;
+    if (PyArray_DIM(grid, 0) != self->ws.width || PyArray_DIM(grid, 1) != self->ws.height) {
+        Py_DECREF(grid);
+        PyErr_SetString(PyExc_ValueError, "grid shape doesn't match the planner");
+        return NULL;
+    }
+
+    PyArrayObject* table = NULL;
+    if (table_obj && table_obj != Py_None) {
+        table = (PyArrayObject*) PyArray_FROMANY(table_obj, NPY_INT32, 3, 3, NPY_ARRAY_IN_ARRAY);
+        if (table && (PyArray_DIM(table, 0) != self->ws.width || PyArray_DIM(table, 1) != self->ws.height || PyArray_DIM(table, 2) != 8)) {
+            Py_DECREF(table);
+            table = NULL;
+            PyErr_SetString(PyExc_ValueError, "table doesn't match the grid, use jps_table(grid)");
+        }
+        if (!table) {
+            Py_DECREF(grid);
+            return NULL;
+        }
+    }
+
+    const uint8_t* cells = (const uint8_t*) PyArray_DATA(grid);
+    const int32_t* dists = table ? (const int32_t*) PyArray_DATA(table) : NULL;
+    uint32_t length;
+    // One query at a time per workspace, the others wait without the GIL
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(self->lock, WAIT_LOCK);
+    switch (mode) {
+        case PLAN_JPS: length = workspace_jps(&self->ws, cells, dists, start_node, end_node); break;
+        case PLAN_THETA: length = workspace_theta(&self->ws, cells, start_node, end_node); break;
+        default: length = workspace_astar(&self->ws, cells, start_node, end_node);
+    }
+    Py_END_ALLOW_THREADS
+    Py_DECREF(grid);
+    Py_XDECREF(table);
+
+    PyObject* path = length == UINT32_MAX ? PyErr_NoMemory() : path_to_array(self->ws.path, self->ws.height);
+    PyThread_release_lock(self->lock);
+    return path;
+}
+
+static PyObject* Planner_plan(PlannerObject* self, PyObject* args) {
+    return Planner_run(self, args, PLAN_ASTAR);
+}
+
+static PyObject* Planner_plan_jps(PlannerObject* self, PyObject* args) {
+    return Planner_run(self, args, PLAN_JPS);
+}
+
+static PyObject* Planner_plan_any_angle(PlannerObject* self, PyObject* args) {
+    return Planner_run(self, args, PLAN_THETA);
+}
+
+static PyObject* Planner_get_shape(PlannerObject* self, void* closure) {
+    (void) closure;
+    return Py_BuildValue("(II)", self->ws.width, self->ws.height);
+}
+
+static PyMethodDef Planner_methods[] = {
+    {"plan", (PyCFunction) Planner_plan, METH_VARARGS,
+     "plan(grid, start, end) -> same as grid_astar, reusing the planner's memory.\n"
+     "Only the expanded nodes are touched, queries on a planner are serialized."},
+    {"plan_jps", (PyCFunction) Planner_plan_jps, METH_VARARGS,
+     "plan_jps(grid, start, end, table=None) -> same as plan with Jump Point Search.\n"
+     "With table from jps_table(grid) it's JPS+, the table must be rebuilt when the grid changes."},
+    {"plan_any_angle", (PyCFunction) Planner_plan_any_angle, METH_VARARGS,
+     "plan_any_angle(grid, start, end) -> (n, 2) array of waypoints with Lazy Theta*, empty if unreachable.\n"
+     "Each waypoint is in line_of_sight of the next one."},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyGetSetDef Planner_getset[] = {
+    {"shape", (getter) Planner_get_shape, NULL, "(width, height) of the grids it plans on", NULL},
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
+static PyTypeObject PlannerType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "castar.Planner",
+    .tp_doc = "Planner((width, height)), A* workspace reused between queries",
+    .tp_basicsize = sizeof(PlannerObject),
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_new = PyType_GenericNew,
+    .tp_init = (initproc) Planner_init,
+    .tp_dealloc = (destructor) Planner_dealloc,
+    .tp_methods = Planner_methods,
+    .tp_getset = Planner_getset,
+};
+
+
+static PyMethodDef castar_methods[] = {
+    {"grid_astar", castar_grid_astar, METH_VARARGS,
+     "grid_astar(grid, start, end) -> (n, 2) array of (x, y) from start to end, empty if unreachable.\n"
+     "grid[x, y] != 0 are obstacles, 8-connected. Releases the GIL while planning."},
+    {"jps_table", castar_jps_table, METH_VARARGS,
+     "jps_table(grid) -> (width, height, 8) int32 JPS+ jump distances for Planner.plan_jps.\n"
+     "Directions E, W, N, S, NE, NW, SE, SW; positive: steps to a jump point, else -steps to an obstacle."},
+    {"line_of_sight", castar_line_of_sight, METH_VARARGS,
+     "line_of_sight(grid, a, b) -> True if the segment between the cell centers only goes through free cells.\n"
+     "Passing exactly on a corner is allowed, like the diagonal moves."},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef castar_module = {
+    PyModuleDef_HEAD_INIT, "castar", "Compiled grid A*", -1, castar_methods,
+    NULL, NULL, NULL, NULL
+};
+
+PyMODINIT_FUNC PyInit_castar(void) {
+    import_array();
+    if (PyType_Ready(&PlannerType) < 0) return NULL;
+
+    PyObject* module = PyModule_Create(&castar_module);
+    if (!module) return NULL;
+
+    Py_INCREF(&PlannerType);
+    if (PyModule_AddObject(module, "Planner", (PyObject*) &PlannerType) < 0) {
+        Py_DECREF(&PlannerType);
+        Py_DECREF(module);
+        return NULL;
+    }
+    return module;
+}
@@ -0,0 +1,232 @@
+//
+// Jump Point Search on the same grids as grid_astar (Harabor & Grastien 2011, diagonal corner cutting allowed)
+// and JPS+, the same search with the jump distances precomputed
+//
+#include "jps.h"
+#include "stdlib.h"
+
+// Directions, straight ones first, index of (dx, dy) is DIRECTION[dx + 1][dy + 1]
+const int8_t DX[8] = {1, -1, 0, 0, 1, -1, 1, -1};
+const int8_t DY[8] = {0, 0, 1, -1, 1, 1, -1, -1};
+static const int8_t DIRECTION[3][3] = {{7, 1, 5}, {3, -1, 2}, {6, 0, 4}};
+
+static inline int64_t sign(const int64_t x) {
+    return (x > 0) - (x < 0);
+}
+
+static inline int64_t abs64(const int64_t x) {
+    return x < 0 ? -x : x;
+}
+
+static inline uint8_t walkable(const uint32_t width, const uint32_t height, const uint8_t * const grid, const int64_t x, const int64_t y) {
+    return x >= 0 && y >= 0 && x < width && y < height && !grid[x * height + y];
+}
+
+#define FREE(X, Y) walkable(width, height, grid, (X), (Y))
+
+// Entering (x, y) with (dx, dy), is there a neighbor only reachable through it
+static inline uint8_t forced(const uint32_t width, const uint32_t height, const uint8_t * const grid,
+                             const int64_t x, const int64_t y, const int64_t dx, const int64_t dy) {
+    if (dx && dy)
+        return (!FREE(x - dx, y) && FREE(x - dx, y + dy)) || (!FREE(x, y - dy) && FREE(x + dx, y - dy));
+    if (dx)
+        return (!FREE(x, y + 1) && FREE(x + dx, y + 1)) || (!FREE(x, y - 1) && FREE(x + dx, y - 1));
+    return (!FREE(x + 1, y) && FREE(x + 1, y + dy)) || (!FREE(x - 1, y) && FREE(x - 1, y + dy));
+}
+
+/**
+ * Steps from (x, y) towards (dx, dy) until the end or a jump point
+ * @return number of steps, 0 if it hits an obstacle first
+ */
+static uint32_t jump(const uint32_t width, const uint32_t height, const uint8_t * const grid,
+                     int64_t x, int64_t y, const int64_t dx, const int64_t dy, const int64_t end_x, const int64_t end_y) {
+    uint32_t steps = 0;
+    while (1) {
+        x += dx;
+        y += dy;
+        steps++;
+        if (!FREE(x, y)) return 0;
+        if ((x == end_x && y == end_y) || forced(width, height, grid, x, y, dx, dy)) return steps;
+        // Diagonal moves stop where a straight jump finds something
+        if (dx && dy && (jump(width, height, grid, x, y, dx, 0, end_x, end_y) || jump(width, height, grid, x, y, 0, dy, end_x, end_y)))
+            return steps;
+    }
+}
+
+void jps_table(const uint32_t width, const uint32_t height, const uint8_t * const grid, int32_t * const table) {
+    for (int dir = 0; dir < 8; dir++) {
+        const int64_t dx = DX[dir], dy = DY[dir];
+        // Walk against the direction so the next cell is always done first
+        for (int64_t i = 0; i < width; i++) {
+            const int64_t x = dx > 0 ? width - 1 - i : i;
+            for (int64_t j = 0; j < height; j++) {
+                const int64_t y = dy > 0 ? height - 1 - j : j;
+                int32_t * const dist = &table[(x * height + y) * 8 + dir];
+                const int64_t nx = x + dx, ny = y + dy;
+
+                if (!FREE(x, y) || !FREE(nx, ny)) {
+                    *dist = 0;
+                    continue;
+                }
+
+                const int32_t * const next = &table[(nx * height + ny) * 8];
+                if (forced(width, height, grid, nx, ny, dx, dy) || (dx && dy && (next[DIRECTION[dx + 1][1]] > 0 || next[DIRECTION[1][dy + 1]] > 0))) {
+                    *dist = 1;
+                } else {
+                    *dist = next[dir] > 0 ? next[dir] + 1 : next[dir] - 1;
+                }
+            }
+        }
+    }
+}
+
+/**
+ * Directions to search from a node reached with (dx, dy), all of them for the start
+ * @return number of directions written
+ */
+static int pruned_directions(const uint32_t width, const uint32_t height, const uint8_t * const grid,
+                             const int64_t x, const int64_t y, const int64_t dx, const int64_t dy, int8_t * const dirs) {
+    int length = 0;
+    if (!dx && !dy) {
+        for (int dir = 0; dir < 8; dir++) dirs[length++] = dir;
+    } else if (dx && dy) {
+        dirs[length++] = DIRECTION[dx + 1][1];
+        dirs[length++] = DIRECTION[1][dy + 1];
+        dirs[length++] = DIRECTION[dx + 1][dy + 1];
+        if (!FREE(x - dx, y)) dirs[length++] = DIRECTION[-dx + 1][dy + 1];
+        if (!FREE(x, y - dy)) dirs[length++] = DIRECTION[dx + 1][-dy + 1];
+    } else if (dx) {
+        dirs[length++] = DIRECTION[dx + 1][1];
+        if (!FREE(x, y + 1)) dirs[length++] = DIRECTION[dx + 1][2];
+        if (!FREE(x, y - 1)) dirs[length++] = DIRECTION[dx + 1][0];
+    } else {
+        dirs[length++] = DIRECTION[1][dy + 1];
+        if (!FREE(x + 1, y)) dirs[length++] = DIRECTION[2][dy + 1];
+        if (!FREE(x - 1, y)) dirs[length++] = DIRECTION[0][dy + 1];
+    }
+    return length;
+}
+
+/**
+ * Steps to the successor in a direction with the precomputed distances, 0 if there's none
+ */
+static uint32_t jump_table(const int32_t * const dists, const int64_t x, const int64_t y, const int dir, const int64_t end_x, const int64_t end_y) {
+    const int64_t dx = DX[dir], dy = DY[dir];
+    const int64_t dist = dists[dir];
+    const int64_t to_x = end_x - x, to_y = end_y - y;
+
+    if (dx && dy) {
+        // Stop in line with the end if it's reachable from there
+        if (sign(to_x) == dx && sign(to_y) == dy) {
+            const int64_t steps = abs64(to_x) < abs64(to_y) ? abs64(to_x) : abs64(to_y);
+            if (steps <= abs64(dist)) return steps;
+        }
+    } else if ((dx && !to_y && sign(to_x) == dx && abs64(to_x) <= abs64(dist)) ||
+               (dy && !to_x && sign(to_y) == dy && abs64(to_y) <= abs64(dist))) {
+        return abs64(to_x + to_y);
+    }
+    return dist > 0 ? dist : 0;
+}
+
+uint32_t workspace_jps(Workspace* const ws, const uint8_t * const grid, const int32_t * const table, const uint32_t start_node, const uint32_t end_node) {
+    const uint32_t width = ws->width, height = ws->height;
+    Node* const nodes = ws->nodes;
+    MinHeap* const heap = &ws->heap;
+
+    workspace_new_search(ws);
+
+    const int64_t end_x = end_node / height, end_y = end_node % height;
+    const int64_t start_x = start_node / height, start_y = start_node % height;
+    const uint64_t start_dx = abs64(start_x - end_x), start_dy = abs64(start_y - end_y);
+
+    ws->stamps[start_node] = ws->generation;
+    nodes[start_node].cost = 0;
+    nodes[start_node].previous = UINT32_MAX;
+    nodes[start_node].heuristic = (SQRT2 - ONE) * (start_dx < start_dy ? start_dx : start_dy) + ONE * (start_dx > start_dy ? start_dx : start_dy);
+    heap_push(heap, start_node);
+
+    int8_t dirs[8];
+    while (heap->length) {
+        const uint32_t current_node = heap_extract_min(heap);
+        if (current_node == end_node) break;
+
+        const int64_t x = current_node / height, y = current_node % height;
+        int64_t dx = 0, dy = 0;
+        if (nodes[current_node].previous != UINT32_MAX) {
+            dx = sign(x - nodes[current_node].previous / height);
+            dy = sign(y - (int64_t) (nodes[current_node].previous % height));
+        }
+
+        const int nb_dirs = pruned_directions(width, height, grid, x, y, dx, dy, dirs);
+        for (int index = 0; index < nb_dirs; index++) {
+            const int dir = dirs[index];
+            const uint32_t steps = table ?
+                jump_table(&table[(size_t) current_node * 8], x, y, dir, end_x, end_y) :
+                jump(width, height, grid, x, y, DX[dir], DY[dir], end_x, end_y);
+            if (!steps) continue;
+
+            const int64_t nx = x + DX[dir] * (int64_t) steps, ny = y + DY[dir] * (int64_t) steps;
+            const uint32_t neighbor = nx * height + ny;
+            const uint32_t cost = nodes[current_node].cost + steps * (dir < 4 ? ONE : SQRT2);
+
+            // Have I met that guy before
+            if (!met(ws, neighbor)) {
+                ws->stamps[neighbor] = ws->generation;
+                nodes[neighbor].cost = cost;
+                nodes[neighbor].previous = current_node;
+
+                const uint64_t hx = abs64(nx - end_x), hy = abs64(ny - end_y);
+                nodes[neighbor].heuristic = (SQRT2 - ONE) * (hx < hy ? hx : hy) + ONE * (hx > hy ? hx : hy);
+
+                heap_push(heap, neighbor);
+            // Is it a better way
+            } else if (cost < nodes[neighbor].cost) {
+                nodes[neighbor].cost = cost;
+                nodes[neighbor].previous = current_node;
+                heap_update(heap, neighbor);
+            }
+        }
+    }
+
+    workspace_end_search(ws);
+
+    // Path length with every cell between the jump points
+    uint32_t path_length = 0;
+    uint32_t current = met(ws, end_node) ? end_node : UINT32_MAX;
+    while (current != UINT32_MAX) {
+        const uint32_t previous = nodes[current].previous;
+        if (previous == UINT32_MAX) {
+            path_length += 1;
+        } else {
+            const int64_t step_x = abs64((int64_t) (current / height) - previous / height);
+            const int64_t step_y = abs64((int64_t) (current % height) - previous % height);
+            path_length += step_x > step_y ? step_x : step_y;
+        }
+        current = previous;
+    }
+
+    if (!workspace_reserve_path(ws, path_length)) return UINT32_MAX;
+    const uint32_t length = path_length;
+    ws->path[path_length] = UINT32_MAX;
+
+    // Fill the segments backwards, they're straight or diagonal
+    current = end_node;
+    while (path_length) {
+        const uint32_t previous = nodes[current].previous;
+        if (previous == UINT32_MAX) {
+            ws->path[--path_length] = current;
+            break;
+        }
+        const int64_t px = previous / height, py = previous % height;
+        int64_t cx = current / height, cy = current % height;
+        const int64_t sx = sign(px - cx), sy = sign(py - cy);
+        while (cx != px || cy != py) {
+            ws->path[--path_length] = cx * height + cy;
+            cx += sx;
+            cy += sy;
+        }
+        current = previous;
+    }
+
+    return length;
+}
@@ -0,0 +1,20 @@
+#ifndef ASTAR_JPS_H
+#define ASTAR_JPS_H
+#include <stdint.h>
+#include "astar.h"
+
+/**
+ * Precompute the JPS+ jump distances, table is width*height*8 (index (x * height + y) * 8 + direction).
+ * Positive: steps to the next jump point, otherwise minus the steps to the next obstacle.
+ * Directions are E, W, N, S, NE, NW, SE, SW ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1)...)
+ */
+void jps_table(uint32_t width, uint32_t height, const uint8_t * grid, int32_t * table);
+
+/**
+ * Jump Point Search reusing the workspace, with the table from jps_table (JPS+) or NULL to jump on the grid.
+ * Same costs and path format as workspace_astar.
+ * @return path length, the path is in ws->path (terminated by UINT32_MAX), UINT32_MAX if out of memory
+ */
+uint32_t workspace_jps(Workspace* ws, const uint8_t * grid, const int32_t * table, uint32_t start_node, uint32_t end_node);
+
+#endif //ASTAR_JPS_H
@@ -4,23 +4,21 @@
 #include "min_heap.h"
 #include "stdlib.h"
 
-KeyValue KEY0, KEY1;
-
-void call_context_function(const ContextFunction * const f, const uint32_t value) {
-    return f->function(value, f->context, &KEY0);
+void call_context_function(MinHeap * const heap, const uint32_t value) {
+    heap->key->function(value, heap->key->context, &heap->key0);
 }
 
-uint8_t compare_keys() {
-    if (KEY0.f_score < KEY1.f_score)
+uint8_t compare_keys(const MinHeap * const heap) {
+    if (heap->key0.f_score < heap->key1.f_score)
         return 1;
-    if (KEY0.f_score == KEY1.f_score)
-        return KEY0.heuristic < KEY1.heuristic;
+    if (heap->key0.f_score == heap->key1.f_score)
+        return heap->key0.heuristic < heap->key1.heuristic;
     return 0;
 }
 
-uint8_t call_and_compare(const ContextFunction * const f, const uint32_t value) {
-    f->function(value, f->context, &KEY1);
-    return compare_keys();
+uint8_t call_and_compare(MinHeap * const heap, const uint32_t value) {
+    heap->key->function(value, heap->key->context, &heap->key1);
+    return compare_keys(heap);
 }
 
 void heap_init(MinHeap* const heap, const uint32_t max_size, ContextFunction *key) {
@@ -49,9 +47,9 @@ void heap_push(MinHeap *const heap, const uint32_t value) {
 void heap_update(MinHeap *const heap, const uint32_t value) {
     uint32_t index = heap->indices[value];
     uint32_t parent_index = (index - 1) / 2;
-    call_context_function(heap->key, value);
+    call_context_function(heap, value);
 
-    while (index >= 1 && call_and_compare(heap->key, heap->values[parent_index])) {
+    while (index >= 1 && call_and_compare(heap, heap->values[parent_index])) {
         // Exchange in the array
         heap->values[index] = heap->values[parent_index];
         heap->values[parent_index] = value;
@@ -68,26 +66,26 @@ void heap_update(MinHeap *const heap, const uint32_t value) {
 uint32_t heap_extract_min(MinHeap *heap) {
     // Minimum is out
     uint32_t result = heap->values[0];
-    heap->indices[result] = UINT32_MAX;
 
     // Last value becomes root
     heap->values[0] = heap->values[--heap->length];
     heap->indices[heap->values[0]] = 0;
+    heap->indices[result] = UINT32_MAX;
 
     uint64_t index = 0;
     while (2 * index + 1 < heap->length) {
-        call_context_function(heap->key, heap->values[index]);
+        call_context_function(heap, heap->values[index]);
 
         uint64_t min_index = index;
 
         uint64_t left = 2 * index + 1;
-        if (left < heap->length && !call_and_compare(heap->key, heap->values[left])) {
-            KEY0.value = KEY1.value;
+        if (left < heap->length && !call_and_compare(heap, heap->values[left])) {
+            heap->key0.value = heap->key1.value;
             min_index = left;
         }
 
         uint64_t right = 2 * index + 2;
-        if (right < heap->length && !call_and_compare(heap->key, heap->values[right]))
+        if (right < heap->length && !call_and_compare(heap, heap->values[right]))
             min_index = right;
 
         // Current is the minimum, no need to go further down
@@ -24,29 +24,32 @@ typedef struct {
 typedef struct {
     uint32_t length, *values, *indices;
     ContextFunction *key;
+    // Keys being compared, per heap so several heaps can be used from different threads
+    KeyValue key0, key1;
 } MinHeap;
 
 /**
- * KEY0 < KEY1
+ * key0 < key1
+ * @param heap
  * @return
  */
-uint8_t compare_keys();
+uint8_t compare_keys(const MinHeap *heap);
 
 /**
- * Fill KEY0 with f(value)
- * @param f
+ * Fill key0 with key(value)
+ * @param heap
  * @param value
  */
-void call_context_function(const ContextFunction *f, uint32_t value);
+void call_context_function(MinHeap *heap, uint32_t value);
 
 
 /**
- * Fill KEY1 with f(value) and compare KEY0 and KEY1
- * @param f
+ * Fill key1 with key(value) and compare key0 and key1
+ * @param heap
  * @param value
- * @return KEY0 < KEY1
+ * @return key0 < key1
  */
-uint8_t call_and_compare(const ContextFunction * f, uint32_t value);
+uint8_t call_and_compare(MinHeap *heap, uint32_t value);
 
 /**
  * Allocate heap arrays
@@ -0,0 +1,148 @@
+//
+// Lazy Theta* (Nash, Koenig & Tovey 2010), A* where a node takes the parent of its predecessor
+// when it can see it, line of sight only checked when the node is expanded
+//
+#include "theta.h"
+#include "math.h"
+
+static inline int64_t sign(const int64_t x) {
+    return (x > 0) - (x < 0);
+}
+
+static inline int64_t abs64(const int64_t x) {
+    return x < 0 ? -x : x;
+}
+
+// Finer than ONE, the segments aren't multiples of the grid moves
+#define UNIT 1000
+
+static inline uint32_t distance(const int64_t dx, const int64_t dy) {
+    return (uint32_t) (UNIT * sqrt((double) (dx * dx + dy * dy)) + 0.5);
+}
+
+// Rounded down so it never overestimates
+static inline uint32_t heuristic(const int64_t dx, const int64_t dy) {
+    return (uint32_t) (UNIT * sqrt((double) (dx * dx + dy * dy)));
+}
+
+uint8_t line_of_sight(const uint32_t width, const uint32_t height, const uint8_t * const grid,
+                      int64_t x, int64_t y, const int64_t x1, const int64_t y1) {
+    (void) width;
+    const int64_t dx = abs64(x1 - x), dy = abs64(y1 - y);
+    const int64_t sx = sign(x1 - x), sy = sign(y1 - y);
+    // Where the segment crosses the next vertical and horizontal cell border, scaled by 2 * dx * dy
+    int64_t cross_x = dy, cross_y = dx;
+
+    if (grid[x * height + y]) return 0;
+    while (x != x1 || y != y1) {
+        if (cross_x < cross_y || !dy) {
+            x += sx;
+            cross_x += 2 * dy;
+        } else if (cross_y < cross_x || !dx) {
+            y += sy;
+            cross_y += 2 * dx;
+        } else {
+            // Exactly on a corner
+            x += sx;
+            y += sy;
+            cross_x += 2 * dy;
+            cross_y += 2 * dx;
+        }
+        if (grid[x * height + y]) return 0;
+    }
+    return 1;
+}
+
+static inline uint8_t closed(const Workspace* const ws, const uint32_t node) {
+    return met(ws, node) && ws->heap.indices[node] == UINT32_MAX;
+}
+
+uint32_t workspace_theta(Workspace* const ws, const uint8_t * const grid, const uint32_t start_node, const uint32_t end_node) {
+    const uint32_t width = ws->width, height = ws->height;
+    Node* const nodes = ws->nodes;
+    MinHeap* const heap = &ws->heap;
+
+    workspace_new_search(ws);
+
+    const int64_t end_x = end_node / height, end_y = end_node % height;
+
+    // The start is its own parent
+    ws->stamps[start_node] = ws->generation;
+    nodes[start_node].cost = 0;
+    nodes[start_node].previous = start_node;
+    nodes[start_node].heuristic = heuristic((int64_t) (start_node / height) - end_x, (int64_t) (start_node % height) - end_y);
+    heap_push(heap, start_node);
+
+    while (heap->length) {
+        const uint32_t current_node = heap_extract_min(heap);
+        const int64_t x = current_node / height, y = current_node % height;
+        Node* const current = &nodes[current_node];
+
+        // The parent was assumed in sight, otherwise take the best expanded neighbor
+        const uint32_t parent = current->previous;
+        if (parent != current_node && !line_of_sight(width, height, grid, parent / height, parent % height, x, y)) {
+            current->cost = UINT32_MAX;
+            for (int nb_index = 0; nb_index < 9; nb_index++) {
+                const int64_t nx = x + nb_index % 3 - 1, ny = y + nb_index / 3 - 1;
+                if (nb_index == 4 || nx < 0 || nx >= width || ny < 0 || ny >= height) continue;
+                const uint32_t neighbor = nx * height + ny;
+                if (!closed(ws, neighbor)) continue;
+                const uint32_t cost = nodes[neighbor].cost + distance(nx - x, ny - y);
+                if (cost < current->cost) {
+                    current->cost = cost;
+                    current->previous = neighbor;
+                }
+            }
+        }
+        if (current_node == end_node) break;
+
+        const uint32_t parent_node = current->previous;
+        const int64_t px = parent_node / height, py = parent_node % height;
+        for (int nb_index = 0; nb_index < 9; nb_index++) {
+            const int64_t nx = x + nb_index % 3 - 1, ny = y + nb_index / 3 - 1;
+            if (nb_index == 4 || nx < 0 || nx >= width || ny < 0 || ny >= height) continue;
+            const uint32_t neighbor = nx * height + ny;
+            if (grid[neighbor] || closed(ws, neighbor)) continue;
+
+            // Straight from the parent, checked when the neighbor gets expanded
+            const uint32_t cost = nodes[parent_node].cost + distance(nx - px, ny - py);
+
+            if (!met(ws, neighbor)) {
+                ws->stamps[neighbor] = ws->generation;
+                nodes[neighbor].cost = cost;
+                nodes[neighbor].previous = parent_node;
+                nodes[neighbor].heuristic = heuristic(nx - end_x, ny - end_y);
+                heap_push(heap, neighbor);
+            } else if (cost < nodes[neighbor].cost) {
+                nodes[neighbor].cost = cost;
+                nodes[neighbor].previous = parent_node;
+                heap_update(heap, neighbor);
+            }
+        }
+    }
+
+    // Reached only if it was expanded
+    const uint8_t found = closed(ws, end_node);
+    workspace_end_search(ws);
+
+    uint32_t path_length = 0;
+    if (found) {
+        uint32_t current = end_node;
+        path_length = 1;
+        while (nodes[current].previous != current) {
+            current = nodes[current].previous;
+            path_length++;
+        }
+    }
+
+    if (!workspace_reserve_path(ws, path_length)) return UINT32_MAX;
+    const uint32_t length = path_length;
+    ws->path[path_length] = UINT32_MAX;
+    uint32_t current = end_node;
+    while (path_length) {
+        ws->path[--path_length] = current;
+        current = nodes[current].previous;
+    }
+
+    return length;
+}
@@ -0,0 +1,20 @@
+#ifndef ASTAR_THETA_H
+#define ASTAR_THETA_H
+#include <stdint.h>
+#include "astar.h"
+
+/**
+ * Is the segment between the centers of (x0, y0) and (x1, y1) free.
+ * Checks every cell it goes through, passing exactly on a corner is allowed like the diagonal moves.
+ */
+uint8_t line_of_sight(uint32_t width, uint32_t height, const uint8_t * grid, int64_t x0, int64_t y0, int64_t x1, int64_t y1);
+
+/**
+ * Lazy Theta* reusing the workspace, any angle paths on the same grids as workspace_astar.
+ * Costs are euclidean distances (1000 per cell).
+ * @return number of waypoints, each one in sight of the next, in ws->path (terminated by UINT32_MAX),
+ * UINT32_MAX if out of memory
+ */
+uint32_t workspace_theta(Workspace* ws, const uint8_t * grid, uint32_t start_node, uint32_t end_node);
+
+#endif //ASTAR_THETA_H
@@ -0,0 +1,191 @@
+"""
+Configuration space of the robot on the table: obstacles inflated by the robot footprint,
+so the planners can keep treating the robot as one cell.
+
+Static obstacles are inflated once, dynamic ones (lidar, camera) only around what moved.
+costmap.grid is the uint8 grid for shortest_path_c/castar and costmap.graph the BinaryGridGraph on it.
+"""
+
+import math
+import numpy as np
+
+from working_a_star import BinaryGridGraph
+
+TABLE_SIZE = 3000, 2000
+# mm per cell
+RESOLUTION = 10
+
+# Same as handlers.py, the robot turns around its encoders
+ROBOT_LENGTH, ROBOT_WIDTH = 350, 200
+ENCODER_OFFSET_TO_FRONT = 145
+
+
+def footprint_radius(length=ROBOT_LENGTH, width=ROBOT_WIDTH, offset_to_front=ENCODER_OFFSET_TO_FRONT) -> float:
+    """Farthest corner from the rotation center, what sweeps the table when it turns in place (mm)"""
+    return math.hypot(max(offset_to_front, length - offset_to_front), width / 2)
+
+
+ROBOT_RADIUS = footprint_radius()
+
+
+def distance_transform(mask: np.ndarray, max_dist: int) -> np.ndarray:
+    """
+    Squared euclidean distance (in cells) of every cell to the nearest True cell of mask
+    Exact up to max_dist, everything farther is (max_dist + 1)²
+    """
+    width, height = mask.shape
+    cap = max_dist + 1
+
+    # Distance along y to the nearest obstacle of the same column
+    index = np.arange(height)
+    before = np.maximum.accumulate(np.where(mask, index, -cap), axis=1)
+    after = np.minimum.accumulate(np.where(mask, index, height + cap)[:, ::-1], axis=1)[:, ::-1]
+    column = np.minimum(np.minimum(index - before, after - index), cap).astype(np.int32)
+    column *= column
+
+    # Then the nearest column within max_dist along x
+    dist2 = column.copy()
+    for dx in range(1, min(cap, width)):
+        np.minimum(dist2[dx:], column[:-dx] + dx * dx, out=dist2[dx:])
+        np.minimum(dist2[:-dx], column[dx:] + dx * dx, out=dist2[:-dx])
+    return np.minimum(dist2, cap * cap, out=dist2)
+
+
+def merge_boxes(boxes) -> list:
+    """Merge overlapping (x0, y0, x1, y1) boxes, end excluded"""
+    boxes = sorted(boxes)
+    merged = True
+    while merged and len(boxes) > 1:
+        merged = False
+        result = []
+        for box in boxes:
+            for index, other in enumerate(result):
+                if box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]:
+                    result[index] = min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3])
+                    merged = True
+                    break
+            else:
+                result.append(box)
+        boxes = result
+    return boxes
+
+
+class Costmap:
+    def __init__(self, resolution=RESOLUTION, size=TABLE_SIZE, radius=ROBOT_RADIUS, walls=True):
+        """
+        resolution: mm per cell
+        size: table size (mm), x along the length like the robot position
+        radius: inflation (mm), the footprint radius by default
+        walls: the table borders are obstacles
+        """
+        self.resolution = resolution
+        self.shape = size[0] // resolution, size[1] // resolution
+        self.radius = int(math.ceil(radius / resolution))
+
+        self.static = np.zeros(self.shape, bool)
+        if walls:
+            self.static[[0, -1], :] = self.static[:, [0, -1]] = True
+        self.dynamic = np.zeros(self.shape, bool)
+        # Dynamic obstacles as (x0, y0, x1, y1) cell boxes, to know where they were
+        self.obstacles = {}
+
+        self.dist2 = np.empty(self.shape, np.int32)
+        self.grid = np.zeros(self.shape, np.uint8)
+        self.graph = BinaryGridGraph(self.grid)
+        self.rebuild()
+
+    def cell(self, pos) -> tuple[int, int]:
+        """Cell of a position in mm, clipped to the table"""
+        return (min(max(int(pos[0] // self.resolution), 0), self.shape[0] - 1),
+                min(max(int(pos[1] // self.resolution), 0), self.shape[1] - 1))
+
+    def position(self, cell) -> tuple[float, float]:
+        """Center of a cell in mm"""
+        return (cell[0] + 0.5) * self.resolution, (cell[1] + 0.5) * self.resolution
+
+    def disc(self, center, radius) -> tuple[tuple, np.ndarray]:
+        """Box and mask of the cells of a disc in mm"""
+        cx, cy = center[0] / self.resolution - 0.5, center[1] / self.resolution - 0.5
+        r = radius / self.resolution
+        x0, y0 = max(int(math.floor(cx - r)), 0), max(int(math.floor(cy - r)), 0)
+        x1, y1 = min(int(math.ceil(cx + r)) + 1, self.shape[0]), min(int(math.ceil(cy + r)) + 1, self.shape[1])
+        if x0 >= x1 or y0 >= y1:
+            return (0, 0, 0, 0), np.zeros((0, 0), bool)
+        x, y = np.ogrid[x0:x1, y0:y1]
+        return (x0, y0, x1, y1), (x - cx) ** 2 + (y - cy) ** 2 <= r * r
+
+    def add_static_rect(self, x0, y0, x1, y1):
+        """Static obstacle rectangle in mm, every cell it overlaps, call rebuild after the last one"""
+        cx0, cy0 = max(int(x0 // self.resolution), 0), max(int(y0 // self.resolution), 0)
+        cx1, cy1 = int(math.ceil(x1 / self.resolution)), int(math.ceil(y1 / self.resolution))
+        self.static[cx0:cx1, cy0:cy1] = True
+
+    def add_static_disc(self, center, radius):
+        """Static obstacle disc in mm, call rebuild after the last one"""
+        (x0, y0, x1, y1), mask = self.disc(center, radius)
+        self.static[x0:x1, y0:y1] |= mask
+
+    def rebuild(self):
+        """Inflate everything from scratch"""
+        self.dist2[:] = distance_transform(self.static | self.dynamic, self.radius)
+        self.graph[:] = self.dist2 <= self.radius ** 2
+
+    def update_box(self, x0, y0, x1, y1) -> list:
+        """
+        Inflate again around cells that changed in [x0, x1[ x [y0, y1[
+        return [((x, y), value), ...] of the grid cells that changed, already written, for DStarLite.update_cells
+        """
+        r = self.radius
+        width, height = self.shape
+        # Cells whose distance can change, and the obstacles that can be near them
+        tx0, ty0, tx1, ty1 = max(x0 - r, 0), max(y0 - r, 0), min(x1 + r, width), min(y1 + r, height)
+        sx0, sy0, sx1, sy1 = max(tx0 - r, 0), max(ty0 - r, 0), min(tx1 + r, width), min(ty1 + r, height)
+
+        mask = self.static[sx0:sx1, sy0:sy1] | self.dynamic[sx0:sx1, sy0:sy1]
+        dist2 = distance_transform(mask, r)[tx0 - sx0:tx1 - sx0, ty0 - sy0:ty1 - sy0]
+        self.dist2[tx0:tx1, ty0:ty1] = dist2
+
+        inflated = (dist2 <= r * r).astype(np.uint8)
+        xs, ys = np.nonzero(inflated != self.grid[tx0:tx1, ty0:ty1])
+        # Not through the graph, that would make DStarLite start over instead of repairing the changes
+        self.grid[tx0:tx1, ty0:ty1] = inflated
+        return [((int(x) + tx0, int(y) + ty0), int(inflated[x, y])) for x, y in zip(xs, ys)]
+
+    def set_obstacles(self, obstacles: dict) -> list:
+        """
+        Dynamic obstacles {key: (x, y, radius)} in mm, replaces the previous ones
+        Only the ones that appeared, moved or disappeared are inflated again
+        return the grid changes like update_box
+        """
+        boxes = []
+        shapes = {}
+        for key, (x, y, radius) in obstacles.items():
+            box, mask = self.disc((x, y), radius)
+            shapes[key] = box, mask
+            old = self.obstacles.get(key)
+            if old is None or old[0] != box or not np.array_equal(old[1], mask):
+                boxes.append(box)
+                if old is not None:
+                    boxes.append(old[0])
+        boxes += [old[0] for key, old in self.obstacles.items() if key not in obstacles]
+        if not boxes:
+            return []
+
+        self.obstacles = shapes
+        boxes = merge_boxes(box for box in boxes if box[0] < box[2])
+        # Only where obstacles moved, with what's left of the others there
+        for bx0, by0, bx1, by1 in boxes:
+            self.dynamic[bx0:bx1, by0:by1] = False
+            for (x0, y0, x1, y1), mask in shapes.values():
+                ix0, iy0, ix1, iy1 = max(x0, bx0), max(y0, by0), min(x1, bx1), min(y1, by1)
+                if ix0 < ix1 and iy0 < iy1:
+                    self.dynamic[ix0:ix1, iy0:iy1] |= mask[ix0 - x0:ix1 - x0, iy0 - y0:iy1 - y0]
+
+        changes = []
+        for box in boxes:
+            changes += self.update_box(*box)
+        return changes
+
+    def set_points(self, points, radius) -> list:
+        """Lidar points [(x, y), ...] in mm as obstacles of the given radius"""
+        return self.set_obstacles({(int(x // self.resolution), int(y // self.resolution)): (x, y, radius) for x, y in points})
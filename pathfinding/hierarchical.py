@@ -0,0 +1,288 @@
+"""
+Hierarchical path planning (HPA*, Botea, Müller & Schaeffer 2004) for fine grids of the whole table.
+
+The grid is cut in square clusters, their borders have entrances and the paths between the entrances
+of a cluster are planned once and cached. A query only plans inside the start and end clusters,
+searches the small graph of entrances and joins the cached paths.
+Paths are near optimal, a few % longer than A* on the grid.
+"""
+
+import heapq
+import numpy as np
+
+from working_a_star import BinaryGridGraph, AStarPlanner, castar
+
+# Cells per cluster side
+CLUSTER_SIZE = 64
+# Free runs along a border at least this long get an entrance at each end, shorter ones one in the middle
+ENTRANCE_SPLIT = 6
+
+ONE, SQRT2 = BinaryGridGraph.ONE, BinaryGridGraph.SQRT2
+
+
+def path_cost(path) -> int:
+    """Cost of an 8-connected cell path, in BinaryGridGraph units"""
+    if len(path) < 2:
+        return 0
+    diagonal = np.count_nonzero(np.all(np.diff(path, axis=0), axis=1))
+    return int(diagonal * SQRT2 + (len(path) - 1 - diagonal) * ONE)
+
+
+def octile(a, b) -> int:
+    dx, dy = abs(a[0] - b[0]), abs(a[1] - b[1])
+    return (SQRT2 - ONE) * min(dx, dy) + ONE * max(dx, dy)
+
+
+def free_runs(free: np.ndarray) -> list:
+    """[(begin, end), ...] of the runs of True, end excluded"""
+    edges = np.diff(np.concatenate(([0], free.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+class LocalPlanner:
+    """Plans inside a box of the grid, compiled when castar is built"""
+
+    def __init__(self):
+        self.planners = {}
+
+    def plan(self, grid, box, start, ends) -> dict:
+        """{end: path (n, 2) in grid coordinates} for the ends reachable from start without leaving the box"""
+        x0, y0, x1, y1 = box
+        sub = np.ascontiguousarray(grid[x0:x1, y0:y1])
+        local_start = start[0] - x0, start[1] - y0
+        paths = {}
+        if castar is not None:
+            planner = self.planners.get(sub.shape)
+            if planner is None:
+                planner = self.planners[sub.shape] = castar.Planner(sub.shape)
+            for end in ends:
+                path = planner.plan(sub, local_start, (end[0] - x0, end[1] - y0))
+                if len(path):
+                    paths[end] = path + (x0, y0)
+        else:
+            planner = AStarPlanner(BinaryGridGraph(sub))
+            for end in ends:
+                path = planner.shortest_path(local_start, (end[0] - x0, end[1] - y0))
+                if path:
+                    paths[end] = np.array(path, np.intp) + (x0, y0)
+        return paths
+
+
+class HierarchicalPlanner:
+    def __init__(self, grid: np.ndarray, cluster_size=CLUSTER_SIZE):
+        """
+        grid[x, y] != 0 are obstacles, kept by reference: call update_box after changing it
+        """
+        self.grid = grid
+        self.size = cluster_size
+        self.width, self.height = grid.shape
+        self.nb_clusters = -(-self.width // cluster_size), -(-self.height // cluster_size)
+        self.local = LocalPlanner()
+
+        # {(axis, i, j): [(cell, cell across), ...]} border between cluster (i, j) and the next one along axis,
+        # axis 2 and 3 are the corners towards the clusters (i + 1, j + 1) and (i + 1, j - 1)
+        self.entrances = {}
+        # {cluster: {(a, b): (cost, path)}} cached paths between the entrances of a cluster
+        self.edges = {}
+        self.adjacency = None
+
+        for i in range(self.nb_clusters[0]):
+            for j in range(self.nb_clusters[1]):
+                self.find_entrances((i, j))
+        for cluster in np.ndindex(self.nb_clusters):
+            self.connect_cluster(cluster)
+
+    def cluster(self, cell) -> tuple[int, int]:
+        return cell[0] // self.size, cell[1] // self.size
+
+    def box(self, cluster) -> tuple[int, int, int, int]:
+        i, j = cluster
+        return i * self.size, j * self.size, min((i + 1) * self.size, self.width), min((j + 1) * self.size, self.height)
+
+    def find_entrances(self, cluster):
+        """Entrances on the right and top borders of a cluster, and on its right corners"""
+        x0, y0, x1, y1 = self.box(cluster)
+        grid = self.grid
+        if x1 < self.width:
+            pairs = self.crossings(grid[x1 - 1, y0:y1] == 0, grid[x1, y0:y1] == 0)
+            self.entrances[(0, *cluster)] = [((x1 - 1, y0 + a), (x1, y0 + b)) for a, b in pairs]
+        if y1 < self.height:
+            pairs = self.crossings(grid[x0:x1, y1 - 1] == 0, grid[x0:x1, y1] == 0)
+            self.entrances[(1, *cluster)] = [((x0 + a, y1 - 1), (x0 + b, y1)) for a, b in pairs]
+        # Diagonal moves between the corner cells, when the two cells beside them are blocked
+        if x1 < self.width and y1 < self.height:
+            corner = (x1 - 1, y1 - 1), (x1, y1)
+            self.entrances[(2, *cluster)] = [corner] if self.squeeze(*corner) else []
+        if x1 < self.width and y0 > 0:
+            corner = (x1 - 1, y0), (x1, y0 - 1)
+            self.entrances[(3, *cluster)] = [corner] if self.squeeze(*corner) else []
+        self.adjacency = None
+
+    def squeeze(self, a, b) -> bool:
+        """Is the diagonal move from a to b the only way between them"""
+        grid = self.grid
+        return bool(not grid[a] and not grid[b] and grid[a[0], b[1]] and grid[b[0], a[1]])
+
+    @classmethod
+    def crossings(cls, inside, outside) -> list:
+        """
+        [(offset inside, offset across), ...] along a border, inside and outside are the free cells of both sides.
+        Free runs get straight transitions, diagonal moves get their own only where no run is next to them
+        """
+        free = inside & outside
+        blocked = ~free[:-1] & ~free[1:]
+        pairs = [(offset, offset) for offset in cls.transitions(free)]
+        pairs += [(int(k), int(k) + 1) for k in np.flatnonzero(inside[:-1] & outside[1:] & blocked)]
+        pairs += [(int(k) + 1, int(k)) for k in np.flatnonzero(inside[1:] & outside[:-1] & blocked)]
+        return pairs
+
+    @staticmethod
+    def transitions(free) -> list:
+        result = []
+        for begin, end in free_runs(free):
+            if end - begin < ENTRANCE_SPLIT:
+                result.append(int(begin + end - 1) // 2)
+            else:
+                result += [int(begin), int(end - 1)]
+        return result
+
+    def cluster_nodes(self, cluster) -> set:
+        """Entrance cells on the cluster's side of its 4 borders and 4 corners"""
+        i, j = cluster
+        nodes = set()
+        for key in ((0, i, j), (1, i, j), (2, i, j), (3, i, j)):
+            for inside, outside in self.entrances.get(key, []):
+                nodes.add(inside)
+        for key in ((0, i - 1, j), (1, i, j - 1), (2, i - 1, j - 1), (3, i - 1, j + 1)):
+            for inside, outside in self.entrances.get(key, []):
+                nodes.add(outside)
+        return nodes
+
+    def connect_cluster(self, cluster):
+        """Plan and cache the paths between every pair of entrances of the cluster"""
+        nodes = sorted(self.cluster_nodes(cluster))
+        box = self.box(cluster)
+        edges = {}
+        for index, a in enumerate(nodes):
+            for b, path in self.local.plan(self.grid, box, a, nodes[index + 1:]).items():
+                edges[a, b] = path_cost(path), path
+        self.edges[cluster] = edges
+        self.adjacency = None
+
+    def update_box(self, x0, y0, x1, y1):
+        """Update the clusters after grid changes in [x0, x1[ x [y0, y1["""
+        ci0, cj0 = self.cluster((max(x0 - 1, 0), max(y0 - 1, 0)))
+        ci1, cj1 = self.cluster((min(x1, self.width - 1), min(y1, self.height - 1)))
+        # Clusters own their right and top borders, the next ones get new entrances too
+        for i in range(ci0, ci1 + 1):
+            for j in range(cj0, cj1 + 1):
+                self.find_entrances((i, j))
+        for i in range(ci0, min(ci1 + 2, self.nb_clusters[0])):
+            for j in range(cj0, min(cj1 + 2, self.nb_clusters[1])):
+                self.connect_cluster((i, j))
+
+    def update_cells(self, changes):
+        """Grid changes [((x, y), value), ...] like Costmap.set_obstacles returns, already written in the grid"""
+        cells = np.array([cell for cell, _ in changes]).reshape(-1, 2)
+        if len(cells):
+            (x0, y0), (x1, y1) = cells.min(axis=0), cells.max(axis=0) + 1
+            self.update_box(int(x0), int(y0), int(x1), int(y1))
+
+    def build_adjacency(self):
+        adjacency = {}
+        for edges in self.edges.values():
+            for (a, b), (cost, _) in edges.items():
+                adjacency.setdefault(a, []).append((b, cost))
+                adjacency.setdefault(b, []).append((a, cost))
+        for entrances in self.entrances.values():
+            for a, b in entrances:
+                # ONE straight, SQRT2 diagonal
+                adjacency.setdefault(a, []).append((b, octile(a, b)))
+                adjacency.setdefault(b, []).append((a, octile(a, b)))
+        self.adjacency = adjacency
+
+    def connect_query_node(self, cell) -> dict:
+        """{node: path} from cell to the other entrances of its cluster"""
+        cluster = self.cluster(cell)
+        return self.local.plan(self.grid, self.box(cluster), cell, self.cluster_nodes(cluster) - {cell})
+
+    def abstract_path(self, start, end, start_paths, end_paths) -> list:
+        """
+        [(node, path from the previous node), ...] from start to end on the abstract graph, empty if there's none
+        start and end are linked to their cluster's entrances by start_paths and end_paths
+        """
+        adjacency = self.adjacency
+        costs = {start: 0}
+        predecessors = {start: (None, None)}
+        heap = [(octile(start, end), start)]
+        closed = set()
+
+        while heap:
+            _, current = heapq.heappop(heap)
+            if current in closed:
+                continue
+            closed.add(current)
+            if current == end:
+                break
+
+            # Cached edges have their path in the clusters, the query ones are given
+            neighbors = [(nb, cost, None) for nb, cost in adjacency.get(current, ())]
+            if current == start:
+                neighbors += [(node, path_cost(path), path) for node, path in start_paths.items()]
+            if current in end_paths:
+                neighbors.append((end, path_cost(end_paths[current]), end_paths[current]))
+            for nb, cost, path in neighbors:
+                cost += costs[current]
+                if nb not in closed and cost < costs.get(nb, cost + 1):
+                    costs[nb] = cost
+                    predecessors[nb] = current, path
+                    heapq.heappush(heap, (cost + octile(nb, end), nb))
+
+        if end not in closed:
+            return []
+        path, node = [], end
+        while node is not None:
+            previous, segment = predecessors[node]
+            path.append((node, segment))
+            node = previous
+        path.reverse()
+        return path
+
+    def segment(self, a, b) -> np.ndarray:
+        """Cached cells from entrance a to entrance b"""
+        if self.cluster(a) != self.cluster(b):
+            return np.array([a, b], np.intp)
+        edges = self.edges[self.cluster(a)]
+        if (a, b) in edges:
+            return edges[a, b][1]
+        return edges[b, a][1][::-1]
+
+    def plan(self, start, end, refine=True):
+        """
+        (n, 2) array of cells from start to end like shortest_path_c, empty if end can't be reached
+        refine=False: only the abstract path (start, entrances..., end)
+        """
+        start, end = (int(start[0]), int(start[1])), (int(end[0]), int(end[1]))
+        if self.grid[start] or self.grid[end]:
+            return np.zeros((0, 2), np.intp)
+        if start == end:
+            return np.array([start], np.intp)
+        if self.adjacency is None:
+            self.build_adjacency()
+
+        start_paths = self.connect_query_node(start)
+        end_paths = {node: path[::-1] for node, path in self.connect_query_node(end).items()}
+        # Without leaving the cluster, still compared with the way through the entrances
+        if self.cluster(start) == self.cluster(end):
+            start_paths.update(self.local.plan(self.grid, self.box(self.cluster(start)), start, [end]))
+
+        nodes = self.abstract_path(start, end, start_paths, end_paths)
+        if not nodes:
+            return np.zeros((0, 2), np.intp)
+        if not refine:
+            return np.array([node for node, _ in nodes], np.intp)
+
+        segments = [np.array([start], np.intp)]
+        for (a, _), (b, path) in zip(nodes[:-1], nodes[1:]):
+            segments.append((self.segment(a, b) if path is None else path)[1:])
+        return np.concatenate(segments)
@@ -0,0 +1,162 @@
+"""
+D* Lite incremental planner, repairs the previous solution when cells change
+instead of searching again from scratch
+"""
+
+import heapq
+import numpy as np
+
+from working_a_star import BinaryGridGraph
+
+INF = float('inf')
+
+# Neighbor offsets, the first 4 are the straight ones
+OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, -1), (-1, 1), (1, 1))
+
+
+class DStarLite:
+    """
+    D* Lite on a BinaryGridGraph, searches from the goal so the robot can move and cells change
+    between queries (Koenig & Likhachev, 2002)
+
+    Costs and node order are the same as shortest_path on the graph
+    """
+
+    def __init__(self, graph: BinaryGridGraph, start, goal):
+        self.graph = graph
+        self.offsets = OFFSETS[:4] if graph.connectivity == BinaryGridGraph._4CONNECTED else OFFSETS
+        self.goal = goal
+        self.reset(start)
+
+    def reset(self, start):
+        """Forgets everything, the next path() is a full search"""
+        self.start = self.last_start = start
+        self.km = 0
+        self.g, self.rhs = {}, {self.goal: 0}
+        self.queue, self.queued = [], {}
+        self.push(self.goal)
+        self.graph.has_updated_collider_since_last_path_calculation = False
+        self.expanded = 0
+
+    def neighbors(self, node):
+        """Every neighbor inside the grid with its cost, obstacles included"""
+        x, y = node
+        graph = self.graph
+        for dx, dy in self.offsets:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < graph.width and 0 <= ny < graph.height:
+                yield (nx, ny), graph.SQRT2 if dx and dy else graph.ONE
+
+    def key(self, node):
+        g = min(self.g.get(node, INF), self.rhs.get(node, INF))
+        return g + self.graph.heuristic(self.start, node) + self.km, g
+
+    def push(self, node):
+        key = self.key(node)
+        self.queued[node] = key
+        heapq.heappush(self.queue, (key, node))
+
+    def top_key(self):
+        # Drop entries replaced or removed since they were pushed
+        queue = self.queue
+        while queue and self.queued.get(queue[0][1]) != queue[0][0]:
+            heapq.heappop(queue)
+        return queue[0][0] if queue else (INF, INF)
+
+    def update_queue(self, node):
+        self.queued.pop(node, None)
+        if self.g.get(node, INF) != self.rhs.get(node, INF):
+            self.push(node)
+
+    def update_vertex(self, node):
+        """Recomputes rhs from every neighbor"""
+        grid, g = self.graph.grid, self.g
+        if node != self.goal:
+            rhs = INF
+            if not grid[node]:
+                for nb, cost in self.neighbors(node):
+                    if not grid[nb]:
+                        rhs = min(rhs, cost + g.get(nb, INF))
+            self.rhs[node] = rhs
+        self.update_queue(node)
+
+    def compute_shortest_path(self):
+        g, rhs, start, goal, grid = self.g, self.rhs, self.start, self.goal, self.graph.grid
+        while self.top_key() < self.key(start) or rhs.get(start, INF) != g.get(start, INF):
+            if not self.queue:
+                break
+            key_old, node = heapq.heappop(self.queue)
+            del self.queued[node]
+            self.expanded += 1
+
+            key_new = self.key(node)
+            if key_old < key_new:
+                self.queued[node] = key_new
+                heapq.heappush(self.queue, (key_new, node))
+            elif g.get(node, INF) > rhs.get(node, INF):
+                # Got better, it can only lower its neighbors
+                g[node] = g_node = rhs[node]
+                blocked = grid[node]
+                for nb, cost in self.neighbors(node):
+                    if nb != goal and not blocked and not grid[nb] and cost + g_node < rhs.get(nb, INF):
+                        rhs[nb] = cost + g_node
+                        self.update_queue(nb)
+            else:
+                # Got worse, only the neighbors that went through it need a full update
+                g_old = g.get(node, INF)
+                g[node] = INF
+                self.update_vertex(node)
+                for nb, cost in self.neighbors(node):
+                    if nb != goal and rhs.get(nb, INF) == cost + g_old:
+                        self.update_vertex(nb)
+
+    def move_start(self, start):
+        """The robot moved, keeps the previous search"""
+        self.start = start
+
+    def update_cells(self, changes):
+        """
+        Cell changes [((x, y), value), ...], 0: walkable, 1: obstacle
+        They can already be in the grid, like Costmap.set_obstacles writes them
+        Only the edges around the changed cells are repaired
+        """
+        grid = self.graph.grid
+        changed = list(changes)
+        if not changed:
+            return
+
+        self.km += self.graph.heuristic(self.last_start, self.start)
+        self.last_start = self.start
+        for cell, value in changed:
+            grid[cell] = value
+        for cell, _ in changed:
+            self.update_vertex(cell)
+            for nb, _ in self.neighbors(cell):
+                self.update_vertex(nb)
+
+    def path(self) -> list:
+        """Path from start to goal, empty if there's none"""
+        # Changes written straight to the graph have no delta, start over
+        if self.graph.has_updated_collider_since_last_path_calculation:
+            self.reset(self.start)
+
+        self.compute_shortest_path()
+        g, grid = self.g, self.graph.grid
+        if g.get(self.start, INF) == INF:
+            return []
+
+        path, current = [self.start], self.start
+        while current != self.goal:
+            best, best_cost = None, INF
+            for nb, cost in self.neighbors(current):
+                if not grid[nb] and cost + g.get(nb, INF) < best_cost:
+                    best, best_cost = nb, cost + g.get(nb, INF)
+            if best is None or len(path) > grid.size:
+                return []
+            path.append(best)
+            current = best
+        return path
+
+    def cost(self):
+        """Cost from start to goal"""
+        return self.g.get(self.start, INF)
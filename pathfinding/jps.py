@@ -0,0 +1,184 @@
+"""
+Jump Point Search on BinaryGridGraph (8-connected, diagonal corner cutting allowed like get_8_neighbors)
+and JPS+ with precomputed jump distances, same results as shortest_path
+"""
+
+import heapq
+import numpy as np
+
+from working_a_star import BinaryGridGraph, castar
+
+# Directions, straight ones first, same order as the C table
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1))
+DIRECTION_INDEX = {d: index for index, d in enumerate(DIRECTIONS)}
+
+
+def sign(x):
+    return (x > 0) - (x < 0)
+
+
+class JumpPointSearch:
+    def __init__(self, graph: BinaryGridGraph):
+        self.graph = graph
+        self.width, self.height = graph.width, graph.height
+
+    def free(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height and not self.graph.grid[x, y]
+
+    def forced(self, x, y, dx, dy):
+        """Entering (x, y) with (dx, dy), is there a neighbor only reachable through it"""
+        free = self.free
+        if dx and dy:
+            return (not free(x - dx, y) and free(x - dx, y + dy)) or (not free(x, y - dy) and free(x + dx, y - dy))
+        if dx:
+            return (not free(x, y + 1) and free(x + dx, y + 1)) or (not free(x, y - 1) and free(x + dx, y - 1))
+        return (not free(x + 1, y) and free(x + 1, y + dy)) or (not free(x - 1, y) and free(x - 1, y + dy))
+
+    def jump(self, x, y, dx, dy, end):
+        """Steps to the end or the next jump point, 0 if it hits an obstacle first"""
+        steps = 0
+        while True:
+            x, y = x + dx, y + dy
+            steps += 1
+            if not self.free(x, y):
+                return 0
+            if (x, y) == end or self.forced(x, y, dx, dy):
+                return steps
+            # Diagonal moves stop where a straight jump finds something
+            if dx and dy and (self.jump(x, y, dx, 0, end) or self.jump(x, y, 0, dy, end)):
+                return steps
+
+    def directions(self, node, dx, dy):
+        """Directions to search from a node reached with (dx, dy), all of them for the start"""
+        x, y = node
+        free = self.free
+        if not dx and not dy:
+            return DIRECTIONS
+        if dx and dy:
+            dirs = [(dx, 0), (0, dy), (dx, dy)]
+            if not free(x - dx, y):
+                dirs.append((-dx, dy))
+            if not free(x, y - dy):
+                dirs.append((dx, -dy))
+        elif dx:
+            dirs = [(dx, 0)]
+            if not free(x, y + 1):
+                dirs.append((dx, 1))
+            if not free(x, y - 1):
+                dirs.append((dx, -1))
+        else:
+            dirs = [(0, dy)]
+            if not free(x + 1, y):
+                dirs.append((1, dy))
+            if not free(x - 1, y):
+                dirs.append((-1, dy))
+        return dirs
+
+    def successor(self, node, direction, end):
+        return self.jump(*node, *direction, end)
+
+    def shortest_path(self, start, end) -> list:
+        """Same as shortest_path on the graph, empty if end can't be reached"""
+        graph = self.graph
+        costs, predecessors = {start: 0}, {start: None}
+        heap = [(graph.heuristic(start, end), graph.heuristic(start, end), start)]
+        closed = set()
+
+        while heap:
+            _, _, current = heapq.heappop(heap)
+            if current in closed:
+                continue
+            closed.add(current)
+            if current == end:
+                break
+
+            x, y = current
+            previous = predecessors[current]
+            dx, dy = (sign(x - previous[0]), sign(y - previous[1])) if previous else (0, 0)
+            for direction in self.directions(current, dx, dy):
+                steps = self.successor(current, direction, end)
+                if not steps:
+                    continue
+                nb = x + direction[0] * steps, y + direction[1] * steps
+                cost = costs[current] + steps * (graph.SQRT2 if direction[0] and direction[1] else graph.ONE)
+                if cost < costs.get(nb, cost + 1):
+                    costs[nb] = cost
+                    predecessors[nb] = current
+                    heuristic = graph.heuristic(nb, end)
+                    heapq.heappush(heap, (cost + heuristic, heuristic, nb))
+
+        if end not in closed:
+            return []
+        return expand(predecessors, end)
+
+
+class JumpPointSearchPlus(JumpPointSearch):
+    """JPS with the jump distances from jps_table, the table must be rebuilt when the grid changes"""
+
+    def __init__(self, graph: BinaryGridGraph, table=None):
+        super().__init__(graph)
+        self.table = jps_table(graph.grid) if table is None else table
+
+    def successor(self, node, direction, end):
+        (x, y), (dx, dy) = node, direction
+        dist = int(self.table[x, y, DIRECTION_INDEX[direction]])
+        to_x, to_y = end[0] - x, end[1] - y
+
+        if dx and dy:
+            # Stop in line with the end if it's reachable from there
+            if sign(to_x) == dx and sign(to_y) == dy:
+                steps = min(abs(to_x), abs(to_y))
+                if steps <= abs(dist):
+                    return steps
+        elif (dx and not to_y and sign(to_x) == dx and abs(to_x) <= abs(dist)) or \
+                (dy and not to_x and sign(to_y) == dy and abs(to_y) <= abs(dist)):
+            return abs(to_x + to_y)
+        return max(dist, 0)
+
+
+def expand(predecessors, end) -> list:
+    """Every cell between the jump points, they're in straight or diagonal lines"""
+    path, current = [end], end
+    while predecessors[current] is not None:
+        previous = predecessors[current]
+        dx, dy = sign(previous[0] - current[0]), sign(previous[1] - current[1])
+        x, y = current
+        while (x, y) != previous:
+            x, y = x + dx, y + dy
+            path.append((x, y))
+        current = previous
+    path.reverse()
+    return path
+
+
+def jps_table(grid: np.ndarray) -> np.ndarray:
+    """
+    JPS+ jump distances, (width, height, 8) in DIRECTIONS order
+    Positive: steps to the next jump point, otherwise minus the steps to the next obstacle
+    """
+    if castar is not None:
+        return castar.jps_table(grid)
+
+    search = JumpPointSearch(BinaryGridGraph(grid))
+    width, height = grid.shape
+    table = np.zeros((width, height, 8), np.int32)
+    free, forced = search.free, search.forced
+    for index, (dx, dy) in enumerate(DIRECTIONS):
+        # Walk against the direction so the next cell is always done first
+        for x in (range(width - 1, -1, -1) if dx > 0 else range(width)):
+            for y in (range(height - 1, -1, -1) if dy > 0 else range(height)):
+                nx, ny = x + dx, y + dy
+                if not free(x, y) or not free(nx, ny):
+                    continue
+                if forced(nx, ny, dx, dy) or (dx and dy and (table[nx, ny, DIRECTION_INDEX[dx, 0]] > 0 or table[nx, ny, DIRECTION_INDEX[0, dy]] > 0)):
+                    table[x, y, index] = 1
+                else:
+                    dist = table[nx, ny, index]
+                    table[x, y, index] = dist + 1 if dist > 0 else dist - 1
+    return table
+
+
+def shortest_path_jps(graph: BinaryGridGraph, start, end, table=None) -> list:
+    """Jump Point Search, JPS+ if given the jps_table of the grid"""
+    search = JumpPointSearch(graph) if table is None else JumpPointSearchPlus(graph, table)
+    return search.shortest_path(start, end)
@@ -0,0 +1,155 @@
+"""
+Cache of the paths between the places the scenarios go to.
+
+Zones are given for the blue side in mm, the yellow side is the same table mirrored along x
+(x -> TABLE_LENGTH - x, like START_X in main.py), so a route is only planned once for both sides
+and both directions when the static obstacles are symmetric.
+
+A cached path stays in use until an obstacle lands on its corridor, then the route is planned
+again and kept under the hash of the obstacles, the obstacle free one is used again once they're gone.
+Only the last MAX_OBSTACLE_ROUTES of those are kept, the opponent never stops moving.
+
+    cache = PathCache(costmap, {"start": (250, 250), "plants": (1000, 700), ...})
+    cache.prebuild()  # or cache.load("paths.npz")
+    path = cache.route("start", "plants", blue_side=BLUE_SIDE)
+"""
+
+import collections
+import hashlib
+import itertools
+import numpy as np
+
+from costmap import distance_transform
+from working_a_star import castar, shortest_path_c, lines_of_sight, AStarPlanner, BinaryGridGraph
+
+# Routes planned around obstacles kept, the least recently used go first
+MAX_OBSTACLE_ROUTES = 32
+
+
+def default_planner(grid, start, end) -> np.ndarray:
+    if castar is not None:
+        return shortest_path_c(grid, start, end)
+    return np.array(AStarPlanner(BinaryGridGraph(grid)).shortest_path(start, end), np.intp).reshape(-1, 2)
+
+
+def grid_hash(grid: np.ndarray) -> str:
+    return hashlib.blake2b(np.ascontiguousarray(grid).tobytes(), digest_size=8).hexdigest()
+
+
+class PathCache:
+    def __init__(self, costmap, zones: dict, planner=default_planner, max_obstacle_routes=MAX_OBSTACLE_ROUTES):
+        """
+        costmap: Costmap with the static obstacles, its dynamic ones are checked against the corridors
+        zones: {name: (x, y)} on the blue side in mm
+        planner: planner(grid, start cell, end cell) -> (n, 2) array, shortest_path_c by default
+        max_obstacle_routes: routes planned around obstacles kept
+        """
+        self.costmap = costmap
+        self.zones = zones
+        self.planner = planner
+        self.symmetric = np.array_equal(costmap.static, costmap.static[::-1])
+        self.static_grid = (distance_transform(costmap.static, costmap.radius) <= costmap.radius ** 2).astype(np.uint8)
+        self.static_hash = grid_hash(self.static_grid)
+
+        # {(start, goal, blue side, None): path} static routes
+        self.paths = {}
+        # {(start, goal, blue side, obstacles hash): path} least recently used first
+        self.obstacle_paths = collections.OrderedDict()
+        self.max_obstacle_routes = max_obstacle_routes
+        self.hits = self.misses = 0
+
+    def mirror(self, path: np.ndarray) -> np.ndarray:
+        return np.stack((self.costmap.shape[0] - 1 - path[:, 0], path[:, 1]), axis=1)
+
+    def zone_cell(self, zone, blue_side=True) -> tuple[int, int]:
+        x, y = self.zones[zone]
+        cell = self.costmap.cell((x, y))
+        return cell if blue_side else (self.costmap.shape[0] - 1 - cell[0], cell[1])
+
+    def lookup(self, start, goal, blue_side, obstacles):
+        """Cached path for the key, either direction, mirrored if that's how it was computed"""
+        for (a, b), reverse in (((start, goal), False), ((goal, start), True)):
+            for side, mirrored in ((blue_side, False), (not blue_side, True)):
+                if mirrored and (obstacles is not None or not self.symmetric):
+                    continue
+                key = a, b, side, obstacles
+                path = self.paths.get(key) if obstacles is None else self.obstacle_paths.get(key)
+                if path is not None:
+                    if obstacles is not None:
+                        self.obstacle_paths.move_to_end(key)
+                    path = self.mirror(path) if mirrored else path
+                    return path[::-1] if reverse else path
+        return None
+
+    def clear(self, path) -> bool:
+        if len(path) < 2:
+            return len(path) > 0 and not self.costmap.grid[tuple(path[0])]
+        return bool(np.all(lines_of_sight(self.costmap.grid, path[:-1], path[1:])))
+
+    def build(self, start, goal, blue_side=True, grid=None) -> np.ndarray:
+        grid = self.static_grid if grid is None else grid
+        path = self.planner(grid, self.zone_cell(start, blue_side), self.zone_cell(goal, blue_side))
+        self.paths[start, goal, blue_side, None] = path
+        return path
+
+    def prebuild(self):
+        """Plan every static route, once per pair of zones, and per side when the table isn't symmetric"""
+        grid = self.static_grid
+        for start, goal in itertools.combinations(self.zones, 2):
+            for blue_side in ((True,) if self.symmetric else (True, False)):
+                if self.lookup(start, goal, blue_side, None) is None:
+                    self.build(start, goal, blue_side, grid)
+
+    def route(self, start, goal, blue_side=True) -> np.ndarray:
+        """
+        (n, 2) array of cells from zone start to zone goal on the current costmap, empty if there's no way
+        Planned again only when an obstacle is on the cached corridor
+        """
+        path = self.lookup(start, goal, blue_side, None)
+        cached = path is not None
+        if not cached:
+            path = self.build(start, goal, blue_side)
+        # Obstacles only ever block more
+        if len(path) == 0 or self.clear(path):
+            self.hits += cached
+            self.misses += not cached
+            return path
+
+        obstacles = grid_hash(self.costmap.dynamic)
+        path = self.lookup(start, goal, blue_side, obstacles)
+        if path is not None and (len(path) == 0 or self.clear(path)):
+            self.hits += 1
+            return path
+
+        self.misses += 1
+        grid = self.costmap.grid
+        start_cell, goal_cell = self.zone_cell(start, blue_side), self.zone_cell(goal, blue_side)
+        # An obstacle on a zone, the planners would go through it
+        if grid[start_cell] or grid[goal_cell]:
+            path = np.zeros((0, 2), np.intp)
+        else:
+            path = self.planner(grid, start_cell, goal_cell)
+        self.obstacle_paths[start, goal, blue_side, obstacles] = path
+        if len(self.obstacle_paths) > self.max_obstacle_routes:
+            self.obstacle_paths.popitem(last=False)
+        return path
+
+    def forget_obstacles(self):
+        """Drop the routes planned around obstacles, the static ones stay"""
+        self.obstacle_paths.clear()
+
+    def save(self, filename):
+        keys = list(self.paths)
+        np.savez_compressed(filename, static_hash=self.static_hash,
+                            starts=np.array([key[0] for key in keys]), goals=np.array([key[1] for key in keys]),
+                            sides=np.array([key[2] for key in keys], bool),
+                            **{f'path{index}': self.paths[key] for index, key in enumerate(keys)})
+
+    def load(self, filename) -> bool:
+        """Load saved static routes, False if they were built for other static obstacles"""
+        with np.load(filename) as data:
+            if str(data['static_hash']) != self.static_hash:
+                return False
+            for index, (start, goal, blue_side) in enumerate(zip(data['starts'], data['goals'], data['sides'])):
+                self.paths[str(start), str(goal), bool(blue_side), None] = data[f'path{index}']
+        return True
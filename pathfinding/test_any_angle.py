@@ -0,0 +1,62 @@
+import numpy as np
+from working_a_star import BinaryGridGraph, AStarPlanner, shortest_path_c, vectorize_path, castar
+from any_angle import LazyThetaStar, any_angle_path, line_cells, line_of_sight, path_length
+
+
+def random_grid(rng, w, h):
+    return (rng.random((w, h)) < rng.random() * 0.4).astype(np.uint8)
+
+
+def random_cell(rng, w, h):
+    return int(rng.integers(w)), int(rng.integers(h))
+
+
+def test_line_of_sight(nb_tests=500):
+    rng = np.random.default_rng(0)
+    for test_index in range(nb_tests):
+        w, h = (int(n) for n in rng.integers(2, 40, 2))
+        grid = random_grid(rng, w, h)
+        a, b = random_cell(rng, w, h), random_cell(rng, w, h)
+        xs, ys = line_cells(a, b)
+        assert (xs[0], ys[0]) == a and (xs[-1], ys[-1]) == b
+        assert np.all(np.maximum(np.abs(np.diff(xs)), np.abs(np.diff(ys))) == 1)
+        if castar is not None:
+            assert castar.line_of_sight(grid, a, b) == (not np.any(grid[xs, ys]))
+    print(f'\rLine of sight test: {nb_tests}/{nb_tests}')
+
+
+def check_path(grid, path, start, end, grid_path):
+    if len(grid_path) == 0:
+        assert len(path) == 0
+        return
+    assert tuple(path[0]) == start and tuple(path[-1]) == end
+    assert all(line_of_sight(grid, tuple(a), tuple(b)) for a, b in zip(path[:-1], path[1:]))
+
+
+def test_any_angle(nb_tests=300):
+    rng = np.random.default_rng(0)
+    for test_index in range(nb_tests):
+        w, h = (int(n) for n in rng.integers(3, 50, 2))
+        grid = random_grid(rng, w, h)
+        start, end = random_cell(rng, w, h), random_cell(rng, w, h)
+        grid[start] = grid[end] = 0
+
+        grid_path = shortest_path_c(grid, start, end) if castar is not None else AStarPlanner(BinaryGridGraph(grid)).shortest_path(start, end)
+        theta_path = np.array(LazyThetaStar(BinaryGridGraph(grid)).shortest_path(start, end), np.intp).reshape(-1, 2)
+        check_path(grid, theta_path, start, end, grid_path)
+        if castar is not None:
+            # Same costs, neighbor order and heap ties, the very same waypoints
+            assert np.array_equal(castar.Planner(grid.shape).plan_any_angle(grid, start, end), theta_path)
+
+        path = any_angle_path(grid, start, end)
+        check_path(grid, path, start, end, grid_path)
+        if len(grid_path):
+            assert path_length(path) <= path_length(vectorize_path(grid, grid_path)) + 1e-9
+
+        print(f'\rAny angle test: {test_index + 1}/{nb_tests}', end='')
+    print()
+
+
+if __name__ == '__main__':
+    test_line_of_sight()
+    test_any_angle()
@@ -0,0 +1,87 @@
+import random
+import numpy as np
+from costmap import Costmap, distance_transform
+from incremental import DStarLite
+from working_a_star import BinaryGridGraph
+
+
+def brute_distance(mask, max_dist):
+    xs, ys = np.nonzero(mask)
+    x, y = np.indices(mask.shape)
+    dist2 = np.full(mask.shape, (max_dist + 1) ** 2)
+    for ox, oy in zip(xs, ys):
+        dist2 = np.minimum(dist2, (x - ox) ** 2 + (y - oy) ** 2)
+    return dist2
+
+
+def test_distance_transform(nb_tests=100):
+    for test_index in range(nb_tests):
+        mask = np.random.random((random.randrange(1, 40), random.randrange(1, 40))) < random.random() * 0.05
+        max_dist = random.randrange(0, 15)
+        assert np.array_equal(distance_transform(mask, max_dist), brute_distance(mask, max_dist))
+    print(f'\rDistance transform test: {nb_tests}/{nb_tests}')
+
+
+def test_incremental(nb_tests=10, nb_steps=20):
+    for test_index in range(nb_tests):
+        costmap = Costmap(resolution=20, radius=random.randrange(50, 250))
+        for _ in range(5):
+            costmap.add_static_rect(*sorted(random.sample(range(3000), 2)), *sorted(random.sample(range(2000), 2)))
+        costmap.rebuild()
+
+        obstacles = {}
+        for _ in range(nb_steps):
+            key = random.randrange(4)
+            if random.random() < 0.2:
+                obstacles.pop(key, None)
+            else:
+                obstacles[key] = random.uniform(0, 3000), random.uniform(0, 2000), random.uniform(50, 250)
+
+            before = costmap.grid.copy()
+            changes = costmap.set_obstacles(dict(obstacles))
+            grid, dist2 = costmap.grid.copy(), costmap.dist2.copy()
+            for cell, value in changes:
+                before[cell] = value
+            costmap.rebuild()
+
+            assert np.array_equal(grid, costmap.grid)
+            assert np.array_equal(before, costmap.grid)
+            r2 = costmap.radius ** 2
+            assert np.array_equal(np.minimum(dist2, r2 + 1), np.minimum(costmap.dist2, r2 + 1))
+
+        print(f'\rIncremental costmap test: {test_index + 1}/{nb_tests}', end='')
+    print()
+
+
+def test_dstar_lite_repair(nb_steps=10):
+    """set_obstacles changes are repaired by DStarLite, not searched again from scratch"""
+    rng = np.random.default_rng(0)
+    costmap = Costmap(resolution=50, radius=100)
+    for rect in ((1200, 600, 1300, 1400), (1700, 0, 1800, 800), (1700, 1200, 1800, 2000)):
+        costmap.add_static_rect(*rect)
+    costmap.rebuild()
+    start, goal = costmap.cell((300, 1000)), costmap.cell((2700, 1000))
+    planner = DStarLite(costmap.graph, start, goal)
+    planner.path()
+
+    # Opponent wandering between the robot and the walls
+    x, y = 800, 1000
+    for step in range(nb_steps):
+        x, y = x + rng.uniform(-100, 100), y + rng.uniform(-100, 100)
+        expanded = planner.expanded
+        planner.update_cells(costmap.set_obstacles({'opponent': (x, y, 150)}))
+        assert not costmap.graph.has_updated_collider_since_last_path_calculation
+        path = planner.path()
+
+        fresh = DStarLite(BinaryGridGraph(costmap.grid.copy()), start, goal)
+        assert len(fresh.path()) > 0 and len(path) > 0 and planner.cost() == fresh.cost()
+        assert 0 <= planner.expanded - expanded < fresh.expanded
+    print(f'\rD* Lite repair test: {nb_steps}/{nb_steps}')
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    np.random.seed(0)
+    test_distance_transform()
+    test_incremental()
+    test_dstar_lite_repair()
@@ -1,6 +1,11 @@
+import ctypes
+import os
+import platform
 import random
+import threading
 import numpy as np
-from working_a_star import MinHeap
+import pytest
+from working_a_star import MinHeap, DIR, castar
 
 
 def test_straight(nb_tests=20, nb_points=2000):
@@ -65,6 +70,105 @@ def test_random_order(nb_tests=20, nb_points=2000):
     print()
 
 
+class KeyValue(ctypes.Structure):
+    _fields_ = [('f_score', ctypes.c_uint32), ('heuristic', ctypes.c_uint32)]
+
+
+KEY_FUNCTION = ctypes.CFUNCTYPE(None, ctypes.c_uint32, ctypes.c_void_p, ctypes.POINTER(KeyValue))
+
+
+class ContextFunction(ctypes.Structure):
+    _fields_ = [('function', KEY_FUNCTION), ('context', ctypes.c_void_p)]
+
+
+class CMinHeap(ctypes.Structure):
+    _fields_ = [('length', ctypes.c_uint32), ('values', ctypes.POINTER(ctypes.c_uint32)),
+                ('indices', ctypes.POINTER(ctypes.c_uint32)), ('key', ctypes.POINTER(ContextFunction)),
+                ('key0', KeyValue), ('key1', KeyValue)]
+
+
+def test_c_extract_min(nb_tests=20, nb_points=500):
+    """Extracted values are closed (index UINT32_MAX) in the C heap, the last one too"""
+    path = os.path.join(DIR, 'libAstar.dll' if platform.system() == 'Windows' else 'libAstar.so')
+    if not os.path.exists(path):
+        pytest.skip('libAstar not built, run build_c_astar.sh')
+    lib = ctypes.CDLL(path)
+    lib.heap_extract_min.restype = ctypes.c_uint32
+
+    rng = np.random.default_rng(0)
+    for test_index in range(nb_tests):
+        keys = rng.integers(0, 1000, nb_points)
+
+        def key(value, context, output):
+            output[0].f_score, output[0].heuristic = int(keys[value]), value
+
+        key_function = ContextFunction(KEY_FUNCTION(key), None)
+        heap = CMinHeap()
+        lib.heap_init(ctypes.byref(heap), nb_points, ctypes.byref(key_function))
+
+        popped = []
+        for pt in rng.permutation(nb_points):
+            lib.heap_push(ctypes.byref(heap), int(pt))
+            # Sometimes empty the heap, the last value out is the tricky one
+            if rng.random() < 0.3:
+                while heap.length:
+                    popped.append(lib.heap_extract_min(ctypes.byref(heap)))
+                    assert heap.indices[popped[-1]] == 0xffffffff
+        while heap.length:
+            popped.append(lib.heap_extract_min(ctypes.byref(heap)))
+            assert heap.indices[popped[-1]] == 0xffffffff
+        lib.heap_clear(ctypes.byref(heap))
+
+        assert sorted(popped) == list(range(nb_points))
+        print(f'\rC heap test: {test_index + 1}/{nb_tests}', end='')
+    print()
+
+
+def test_c_concurrent(nb_threads=4, nb_grids=40):
+    """Planners in different threads give the same paths as one after the other, the GIL is released while they run"""
+    if castar is None:
+        pytest.skip('castar not built, run build_c_astar.sh')
+    rng = np.random.default_rng(0)
+    queries = []
+    for _ in range(nb_grids):
+        grid = (rng.random((120, 80)) < 0.25).astype(np.uint8)
+        start, end = (0, int(rng.integers(80))), (119, int(rng.integers(80)))
+        grid[start] = grid[end] = 0
+        queries.append((grid, start, end))
+
+    def plan(planner, grid, start, end):
+        return planner.plan(grid, start, end), planner.plan_jps(grid, start, end, None), \
+            planner.plan_any_angle(grid, start, end), castar.grid_astar(grid, start, end)
+
+    planner = castar.Planner((120, 80))
+    expected = [plan(planner, *query) for query in queries]
+
+    results = [[None] * nb_grids for _ in range(nb_threads)]
+    errors = []
+
+    def worker(thread_index):
+        try:
+            planner = castar.Planner((120, 80))
+            for _ in range(3):
+                for i, query in enumerate(queries):
+                    results[thread_index][i] = plan(planner, *query)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(nb_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    for thread_results in results:
+        for paths, expected_paths in zip(thread_results, expected):
+            for path, expected_path in zip(paths, expected_paths):
+                assert np.array_equal(path, expected_path)
+    print(f'\rC concurrent planners test: {nb_threads} threads x {nb_grids} grids')
+
+
 if __name__ == '__main__':
     # For reproducibility
     random.seed(1)
@@ -72,3 +176,5 @@ if __name__ == '__main__':
     # Don't fool around with nb_points, 10_000 already takes ages because of the invariant check
     # test_straight()
     test_random_order(nb_points=50_000)
+    test_c_extract_min()
+    test_c_concurrent()
@@ -0,0 +1,84 @@
+import random
+import numpy as np
+from working_a_star import BinaryGridGraph, AStarPlanner
+from hierarchical import HierarchicalPlanner
+
+
+def check_path(grid, path, start, end, reachable):
+    if not reachable:
+        assert len(path) == 0
+        return
+    assert tuple(path[0]) == start and tuple(path[-1]) == end
+    assert np.all(np.abs(np.diff(path, axis=0)).max(axis=1) == 1)
+    assert not np.any(grid[path[:, 0], path[:, 1]])
+
+
+def random_query(rng, grid):
+    w, h = grid.shape
+    return (rng.randrange(w), rng.randrange(h)), (rng.randrange(w), rng.randrange(h))
+
+
+def test_hierarchical(nb_tests=100, nb_queries=5):
+    rng = random.Random(0)
+    np_rng = np.random.default_rng(0)
+    for test_index in range(nb_tests):
+        w, h = rng.randrange(5, 100), rng.randrange(5, 100)
+        grid = (np_rng.random((w, h)) < rng.random() * 0.5).astype(np.uint8)
+        planner = HierarchicalPlanner(grid, rng.choice((2, 3, 4, 8, 16, 32)))
+        a_star = AStarPlanner(BinaryGridGraph(grid))
+
+        for _ in range(nb_queries):
+            start, end = random_query(rng, grid)
+            reachable = not grid[start] and not grid[end] and bool(a_star.shortest_path(start, end))
+            check_path(grid, planner.plan(start, end), start, end, reachable)
+
+        print(f'\rHierarchical test: {test_index + 1}/{nb_tests}', end='')
+    print()
+
+
+def test_diagonal_entrances():
+    """Clusters only linked by diagonal moves, across a border or a corner"""
+    # Reported case, A* goes through 33 cells
+    grid = (np.random.RandomState(19).random_sample((48, 7)) < 0.2).astype(np.uint8)
+    start, end = (38, 2), (6, 2)
+    grid[start] = grid[end] = 0
+    check_path(grid, HierarchicalPlanner(grid, 4).plan(start, end), start, end, True)
+
+    # Two corridors joined by a diagonal move between blocked cells: across a border, on both corners of 4 clusters
+    for y0, y1 in ((1, 2), (3, 4), (4, 3)):
+        grid = np.ones((8, 8), np.uint8)
+        grid[1:4, y0] = grid[4:7, y1] = 0
+        check_path(grid, HierarchicalPlanner(grid, 4).plan((1, y0), (6, y1)), (1, y0), (6, y1), True)
+    print('\rHierarchical diagonal entrances test: 4/4')
+
+
+def test_update(nb_tests=20, nb_steps=5):
+    rng = random.Random(0)
+    np_rng = np.random.default_rng(0)
+    for test_index in range(nb_tests):
+        w, h = rng.randrange(20, 80), rng.randrange(20, 80)
+        grid = (np_rng.random((w, h)) < 0.3).astype(np.uint8)
+        planner = HierarchicalPlanner(grid, rng.choice((4, 8)))
+
+        for _ in range(nb_steps):
+            x, y = rng.randrange(w - 5), rng.randrange(h - 5)
+            value = rng.randrange(2)
+            changes = [((x + dx, y + dy), value) for dx in range(5) for dy in range(5)]
+            for cell, value in changes:
+                grid[cell] = value
+            planner.update_cells(changes)
+
+            rebuilt = HierarchicalPlanner(grid, planner.size)
+            assert planner.entrances == rebuilt.entrances
+            assert planner.edges.keys() == rebuilt.edges.keys()
+            for cluster, edges in rebuilt.edges.items():
+                assert {key: cost for key, (cost, _) in planner.edges[cluster].items()} == {key: cost for key, (cost, _) in edges.items()}
+
+        print(f'\rHierarchical update test: {test_index + 1}/{nb_tests}', end='')
+    print()
+
+
+if __name__ == '__main__':
+    test_hierarchical()
+    test_diagonal_entrances()
+    test_update()
@@ -0,0 +1,72 @@
+import random
+import numpy as np
+from working_a_star import BinaryGridGraph, shortest_path
+from incremental import DStarLite
+
+
+def random_grid(w, h, nb_obstacles, radius):
+    grid = np.zeros((w, h), np.uint8)
+    x, y = np.ogrid[:w, :h]
+    for _ in range(nb_obstacles):
+        cx, cy = random.random() * w, random.random() * h
+        grid |= (x - cx) ** 2 + (y - cy) ** 2 < radius ** 2
+    return grid
+
+
+def a_star_cost(graph, start, end):
+    _, costs = shortest_path(graph, start, end)
+    return costs[end] if costs[end] != -1 else float('inf')
+
+
+def test_moving_obstacle(nb_tests=5, nb_steps=20):
+    w, h = 60, 40
+    for test_index in range(nb_tests):
+        grid = random_grid(w, h, 5, 4)
+        start, goal = (1, 1), (w - 2, h - 2)
+        grid[start] = grid[goal] = 0
+        graph = BinaryGridGraph(grid)
+        planner = DStarLite(graph, start, goal)
+
+        ox, oy = w // 2, h // 2
+        x, y = np.ogrid[:w, :h]
+        for _ in range(nb_steps):
+            # Opponent moves a cell, the robot follows its path
+            changes = {cell: 0 for cell in zip(*np.nonzero((x - ox) ** 2 + (y - oy) ** 2 < 9))}
+            ox, oy = ox + random.choice((-1, 0, 1)), oy + random.choice((-1, 0, 1))
+            changes.update({cell: 1 for cell in zip(*np.nonzero((x - ox) ** 2 + (y - oy) ** 2 < 9))})
+
+            path = planner.path()
+            if len(path) > 2:
+                planner.move_start(path[1])
+            planner.update_cells((cell, value) for cell, value in changes.items() if cell not in (planner.start, goal))
+
+            path = planner.path()
+            assert planner.cost() == a_star_cost(graph, planner.start, goal)
+            if path:
+                assert path[0] == planner.start and path[-1] == goal
+                assert not any(grid[cell] for cell in path)
+
+        print(f'\rMoving obstacle test: {test_index + 1}/{nb_tests}', end='')
+    print()
+
+
+def test_direct_grid_change():
+    grid = np.zeros((30, 20), np.uint8)
+    graph = BinaryGridGraph(grid)
+    planner = DStarLite(graph, (0, 0), (29, 0))
+    assert planner.cost() == float('inf') and len(planner.path()) == 30
+
+    # Written without a delta, the planner has to start over
+    graph[15, :19] = 1
+    assert planner.path()[0] == (0, 0)
+    assert planner.cost() == a_star_cost(graph, (0, 0), (29, 0))
+
+    planner.update_cells([((15, 19), 1)])
+    assert planner.path() == []
+
+
+if __name__ == '__main__':
+    # For reproducibility
+    random.seed(1)
+    test_moving_obstacle()
+    test_direct_grid_change()
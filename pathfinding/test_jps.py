@@ -0,0 +1,43 @@
+import numpy as np
+from working_a_star import BinaryGridGraph, shortest_path, shortest_path_c, castar
+from jps import shortest_path_jps, jps_table
+
+
+def path_cost(graph, path):
+    steps = np.abs(np.diff(np.asarray(path), axis=0))
+    assert np.all(steps.max(axis=1) == 1)
+    return int(np.sum(np.where(steps.min(axis=1), graph.SQRT2, graph.ONE)))
+
+
+def check_path(graph, path, start, end, cost):
+    if cost == -1:
+        assert len(path) == 0
+        return
+    assert tuple(path[0]) == start and tuple(path[-1]) == end
+    assert not any(graph.grid[tuple(cell)] for cell in path)
+    assert path_cost(graph, path) == cost
+
+
+def test_jps(nb_tests=200):
+    rng = np.random.default_rng(0)
+    for test_index in range(nb_tests):
+        w, h = (int(n) for n in rng.integers(5, 50, 2))
+        grid = (rng.random((w, h)) < rng.random() * 0.4).astype(np.uint8)
+        start, end = (int(rng.integers(w)), int(rng.integers(h))), (int(rng.integers(w)), int(rng.integers(h)))
+        grid[start] = grid[end] = 0
+        graph = BinaryGridGraph(grid)
+
+        _, costs = shortest_path(graph, start, end)
+        table = jps_table(grid)
+        check_path(graph, shortest_path_jps(graph, start, end), start, end, costs[end])
+        check_path(graph, shortest_path_jps(graph, start, end, table), start, end, costs[end])
+        if castar is not None:
+            check_path(graph, shortest_path_c(grid, start, end, jps=True), start, end, costs[end])
+            check_path(graph, shortest_path_c(grid, start, end, table=table), start, end, costs[end])
+
+        print(f'\rJPS test: {test_index + 1}/{nb_tests}', end='')
+    print()
+
+
+if __name__ == '__main__':
+    test_jps()
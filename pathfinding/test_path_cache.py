@@ -0,0 +1,112 @@
+import os
+import random
+import tempfile
+import numpy as np
+from costmap import Costmap
+from path_cache import PathCache
+from working_a_star import shortest_path_c, lines_of_sight
+from hierarchical import path_cost
+
+ZONES = {'start': (300, 300), 'panels': (700, 400), 'plants': (1000, 500), 'middle': (1400, 1000), 'drop': (400, 1600)}
+
+
+def symmetric_costmap():
+    costmap = Costmap(resolution=20)
+    for x0, y0, x1, y1 in ((600, 800, 900, 950), (1200, 0, 1800, 200), (200, 1100, 500, 1250)):
+        costmap.add_static_rect(x0, y0, x1, y1)
+        costmap.add_static_rect(3000 - x1, y0, 3000 - x0, y1)
+    costmap.rebuild()
+    return costmap
+
+
+def check_route(cache, path, start, goal, blue_side):
+    expected = shortest_path_c(cache.costmap.grid, cache.zone_cell(start, blue_side), cache.zone_cell(goal, blue_side))
+    assert len(expected) > 0 and path_cost(path) == path_cost(expected)
+    assert tuple(path[0]) == cache.zone_cell(start, blue_side) and tuple(path[-1]) == cache.zone_cell(goal, blue_side)
+    assert np.all(lines_of_sight(cache.costmap.grid, path[:-1], path[1:]))
+
+
+def test_mirror():
+    cache = PathCache(symmetric_costmap(), ZONES)
+    assert cache.symmetric
+    cache.prebuild()
+    # One route per pair of zones for both sides and directions
+    assert len(cache.paths) == len(ZONES) * (len(ZONES) - 1) // 2
+    for start in ZONES:
+        for goal in ZONES:
+            if start != goal:
+                for blue_side in (True, False):
+                    check_route(cache, cache.route(start, goal, blue_side), start, goal, blue_side)
+    assert cache.misses == 0
+    print('Path cache mirror test: 1/1')
+
+
+def test_obstacles(nb_tests=30):
+    rng = random.Random(0)
+    cache = PathCache(symmetric_costmap(), ZONES)
+    cache.prebuild()
+    for test_index in range(nb_tests):
+        start, goal = rng.sample(list(ZONES), 2)
+        blue_side = rng.random() < 0.5
+        static_path = cache.lookup(start, goal, blue_side, None)
+        # Opponent on the cached path, or somewhere else
+        x, y = cache.costmap.position(static_path[rng.randrange(len(static_path))])
+        if rng.random() < 0.5:
+            x, y = rng.uniform(0, 3000), rng.uniform(0, 2000)
+        cache.costmap.set_obstacles({'opponent': (x, y, 150)})
+
+        grid = cache.costmap.grid
+        on_corridor = np.any(grid[static_path[:, 0], static_path[:, 1]])
+        misses = cache.misses
+        path = cache.route(start, goal, blue_side)
+        assert cache.misses == misses + on_corridor
+        start_cell, goal_cell = cache.zone_cell(start, blue_side), cache.zone_cell(goal, blue_side)
+        if len(path):
+            check_route(cache, path, start, goal, blue_side)
+        else:
+            assert grid[start_cell] or grid[goal_cell] or not len(shortest_path_c(grid, start_cell, goal_cell))
+        # Same obstacles, no new planning
+        cache.route(start, goal, blue_side)
+        assert cache.misses == misses + on_corridor
+    print(f'Path cache obstacles test: {nb_tests}/{nb_tests}')
+
+
+def test_obstacle_routes_bound(nb_tests=50):
+    rng = random.Random(0)
+    cache = PathCache(symmetric_costmap(), ZONES, max_obstacle_routes=4)
+    cache.prebuild()
+    static_path = cache.lookup('start', 'middle', True, None)
+    for test_index in range(nb_tests):
+        # Opponent moving along the route
+        x, y = cache.costmap.position(static_path[rng.randrange(len(static_path) // 4, 3 * len(static_path) // 4)])
+        cache.costmap.set_obstacles({'opponent': (x, y, 150)})
+        cache.route('start', 'middle', True)
+        assert len(cache.obstacle_paths) <= 4
+    assert len(cache.paths) == len(ZONES) * (len(ZONES) - 1) // 2
+    cache.forget_obstacles()
+    assert not cache.obstacle_paths
+    print(f'Path cache bound test: {nb_tests}/{nb_tests}')
+
+
+def test_save_load():
+    cache = PathCache(symmetric_costmap(), ZONES)
+    cache.prebuild()
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'paths.npz')
+        cache.save(filename)
+        loaded = PathCache(symmetric_costmap(), ZONES)
+        assert loaded.load(filename)
+        assert loaded.paths.keys() == cache.paths.keys()
+        assert all(np.array_equal(loaded.paths[key], cache.paths[key]) for key in cache.paths)
+
+        other = Costmap(resolution=20)
+        assert not PathCache(other, ZONES).load(filename)
+    print('Path cache save test: 1/1')
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    test_mirror()
+    test_obstacles()
+    test_obstacle_routes_bound()
+    test_save_load()
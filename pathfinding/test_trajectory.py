@@ -0,0 +1,74 @@
+import math
+import random
+import numpy as np
+from working_a_star import lines_of_sight, simplify_path, shortest_path_c, vectorize_path, castar
+import trajectory as trajectory_module
+from trajectory import Trajectory, trapezoid_duration
+
+
+def test_trapezoid():
+    # Reaches 600 mm/s after 225 mm, cruises 550 mm
+    assert math.isclose(trapezoid_duration(1000, 600, 800), 0.75 + 550 / 600 + 0.75)
+    assert math.isclose(trapezoid_duration(-200, 600, 800), 2 * math.sqrt(200 / 800))
+    assert trapezoid_duration(0, 600, 800) == 0
+
+
+def test_moves():
+    trajectory = Trajectory(resolution=10)
+    points = [(0, 0), (-100, 0), (-100, 100)]
+    assert trajectory.moves(points, 0) == [(-100, 0), (-100, -math.pi / 2)]
+    assert Trajectory(reverse=False).moves(points, 0) == [(100, -math.pi), (100, -math.pi / 2)]
+    assert math.isclose(trajectory.duration(points, 0), 2 * trapezoid_duration(100, 600, 800) + trapezoid_duration(math.pi / 2, 4, 8))
+
+
+def test_fastest(nb_tests=100):
+    if castar is None:
+        return
+    rng = random.Random(0)
+    np_rng = np.random.default_rng(0)
+    for test_index in range(nb_tests):
+        w, h = rng.randrange(3, 60), rng.randrange(3, 60)
+        grid = (np_rng.random((w, h)) < rng.random() * 0.3).astype(np.uint8)
+        start, end = (rng.randrange(w), rng.randrange(h)), (rng.randrange(w), rng.randrange(h))
+        grid[start] = grid[end] = 0
+        path = shortest_path_c(grid, start, end)
+        if len(path) == 0:
+            continue
+
+        trajectory = Trajectory(resolution=10, overhead=rng.choice((0, 0.05)), reverse=rng.random() < 0.5)
+        theta = rng.uniform(-math.pi, math.pi)
+        points = trajectory.fastest(grid, path, theta)
+        assert tuple(points[0]) == start and tuple(points[-1]) == end
+        assert np.all(lines_of_sight(grid, points[:-1], points[1:]))
+
+        time = trajectory.duration(trajectory.positions(points), theta)
+        for other in (simplify_path(path), simplify_path(vectorize_path(grid, path))):
+            assert time <= trajectory.duration(trajectory.positions(other), theta) + 1e-9
+
+        # Fewer candidates than corners, still in sight and never slower than string pulling
+        cap = trajectory_module.MAX_CANDIDATES
+        try:
+            trajectory_module.MAX_CANDIDATES = rng.randrange(2, 8)
+            thinned = trajectory.fastest(grid, path, theta)
+        finally:
+            trajectory_module.MAX_CANDIDATES = cap
+        assert tuple(thinned[0]) == start and tuple(thinned[-1]) == end
+        assert np.all(lines_of_sight(grid, thinned[:-1], thinned[1:]))
+        pulled = trajectory.duration(trajectory.positions(vectorize_path(grid, path)), theta)
+        assert trajectory.duration(trajectory.positions(thinned), theta) <= pulled + 1e-9
+
+        # Following the moves, backwards or not, ends at the end
+        x, y = trajectory.positions(points)[0]
+        for rho, turn in trajectory.moves(trajectory.positions(points), theta):
+            theta += turn
+            x, y = x + rho * math.cos(theta), y + rho * math.sin(theta)
+        assert math.isclose(x, (end[0] + 0.5) * 10, abs_tol=1e-6) and math.isclose(y, (end[1] + 0.5) * 10, abs_tol=1e-6)
+
+        print(f'\rFastest trajectory test: {test_index + 1}/{nb_tests}', end='')
+    print()
+
+
+if __name__ == '__main__':
+    test_trapezoid()
+    test_moves()
+    test_fastest()
@@ -0,0 +1,79 @@
+import math
+import random
+import numpy as np
+import working_a_star
+from working_a_star import lines_of_sight, simplify_path, shortest_path_c, shortest_vectorized_path, path_to_moves, castar
+from any_angle import line_cells
+
+
+def test_lines_of_sight(nb_tests=300):
+    for test_index in range(nb_tests):
+        w, h = random.randrange(1, 40), random.randrange(1, 40)
+        grid = (np.random.random((w, h)) < random.random() * 0.4).astype(np.uint8)
+        k = random.randrange(1, 10)
+        starts = [(random.randrange(w), random.randrange(h)) for _ in range(k)]
+        ends = [(random.randrange(w), random.randrange(h)) for _ in range(k)]
+        expected = [not np.any(grid[line_cells(a, b)]) for a, b in zip(starts, ends)]
+        assert list(lines_of_sight(grid, starts, ends)) == expected
+    print(f'\rLines of sight test: {nb_tests}/{nb_tests}')
+
+
+def test_lines_of_sight_chunks(nb_tests=50):
+    rng = np.random.default_rng(0)
+    chunk = working_a_star.LINE_OF_SIGHT_CHUNK
+    try:
+        for test_index in range(nb_tests):
+            grid = (rng.random((50, 50)) < 0.2).astype(np.uint8)
+            starts, ends = rng.integers(0, 50, (40, 2)), rng.integers(0, 50, (40, 2))
+            working_a_star.LINE_OF_SIGHT_CHUNK = chunk
+            expected = lines_of_sight(grid, starts, ends)
+            # Smaller than most segments too
+            working_a_star.LINE_OF_SIGHT_CHUNK = int(rng.integers(1, 200))
+            assert np.array_equal(lines_of_sight(grid, starts, ends), expected)
+    finally:
+        working_a_star.LINE_OF_SIGHT_CHUNK = chunk
+    print(f'\rLines of sight chunks test: {nb_tests}/{nb_tests}')
+
+
+def test_simplify():
+    path = np.array([(0, 0), (1, 1), (2, 2), (3, 2), (4, 2), (4, 3), (3, 3)])
+    assert simplify_path(path).tolist() == [[0, 0], [2, 2], [4, 2], [4, 3], [3, 3]]
+    assert simplify_path(path[:2]).tolist() == [[0, 0], [1, 1]]
+
+
+def test_vectorized_path(nb_tests=100):
+    if castar is None:
+        return
+    for test_index in range(nb_tests):
+        w, h = random.randrange(3, 60), random.randrange(3, 60)
+        grid = (np.random.random((w, h)) < random.random() * 0.3).astype(np.uint8)
+        start, end = (random.randrange(w), random.randrange(h)), (random.randrange(w), random.randrange(h))
+        grid[start] = grid[end] = 0
+
+        path = shortest_vectorized_path(grid, start, end)
+        if len(shortest_path_c(grid, start, end)) == 0:
+            assert len(path) == 0
+            continue
+        assert tuple(path[0]) == start and tuple(path[-1]) == end
+        assert np.all(lines_of_sight(grid, path[:-1], path[1:]))
+
+        # Following the moves from the start ends at the end
+        theta = random.uniform(-math.pi, math.pi)
+        x, y = path[0]
+        for rho, turn in path_to_moves(path, theta):
+            assert -math.pi <= turn <= math.pi
+            theta += turn
+            x, y = x + rho * math.cos(theta), y + rho * math.sin(theta)
+        assert math.isclose(x, end[0], abs_tol=1e-6) and math.isclose(y, end[1], abs_tol=1e-6)
+
+        print(f'\rVectorized path test: {test_index + 1}/{nb_tests}', end='')
+    print()
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    np.random.seed(0)
+    test_lines_of_sight()
+    test_lines_of_sight_chunks()
+    test_simplify()
+    test_vectorized_path()
@@ -0,0 +1,126 @@
+"""
+Time of a path for the robot, from the speed profiles of the pico.
+
+Asserv.move rotates then drives, both with a trapezoidal speed profile (comm.sim.Trapezoid),
+and stops between moves, so a path costs a rotation and a straight line per waypoint.
+The shortest path isn't the fastest one: a few longer lines can beat many short ones with turns.
+
+    trajectory = Trajectory.from_asserv(asserv, resolution=costmap.resolution)
+    points = trajectory.fastest(costmap.grid, path, theta)
+    for rho, turn in trajectory.moves(points, theta):
+        asserv.move(rho, turn)
+"""
+
+import numpy as np
+
+from working_a_star import lines_of_sight, path_corners, vectorize_path, path_to_moves
+
+# Same as comm.sim, (vmax mm/s, amax mm/s²) and (vmax rad/s, amax rad/s²)
+DST_PROFILE = 600.0, 800.0
+ANGLE_PROFILE = 4.0, 8.0
+# Corners the fastest waypoints are picked from, every pair of them is checked for line of sight
+MAX_CANDIDATES = 48
+
+
+def trapezoid_duration(dist, vmax, amax):
+    """Time to go over dist from stop to stop, a triangle when vmax can't be reached, like comm.sim.Trapezoid"""
+    dist = np.abs(dist)
+    return np.where(dist * amax < vmax * vmax, 2 * np.sqrt(dist / amax), dist / vmax + vmax / amax)
+
+
+class Trajectory:
+    def __init__(self, dst_profile=DST_PROFILE, angle_profile=ANGLE_PROFILE, resolution=1, overhead=0.0, reverse=True):
+        """
+        dst_profile, angle_profile: (vmax, amax) like get_dst_speedprofile and get_angle_speedprofile
+        resolution: mm per cell of the grids given to fastest
+        overhead: time lost per move (s), to send it and see it's done
+        reverse: drive backwards instead of turning around
+        """
+        self.dst_profile = tuple(dst_profile)
+        self.angle_profile = tuple(angle_profile)
+        self.resolution = resolution
+        self.overhead = overhead
+        self.reverse = reverse
+
+    @classmethod
+    def from_asserv(cls, asserv, **kwargs):
+        """With the speed profiles currently set on the pico"""
+        return cls(asserv.get_dst_speedprofile(), asserv.get_angle_speedprofile(), **kwargs)
+
+    def turn(self, angle):
+        """Rotation time, half a turn at most when it can go backwards"""
+        half = np.pi / 2 if self.reverse else np.pi
+        angle = (np.asarray(angle) + half) % (2 * half) - half
+        return trapezoid_duration(angle, *self.angle_profile)
+
+    def drive(self, dist):
+        return trapezoid_duration(dist, *self.dst_profile) + self.overhead
+
+    def moves(self, points, theta) -> list:
+        """[(rho, turn), ...] for Asserv.move, points in mm"""
+        return path_to_moves(points, theta, self.reverse)
+
+    def duration(self, points, theta) -> float:
+        """Time to follow the waypoints in mm from heading theta (rad), stopping at each one"""
+        moves = np.array(self.moves(points, theta)).reshape(-1, 2)
+        return float(np.sum(trapezoid_duration(moves[:, 1], *self.angle_profile)) + np.sum(self.drive(moves[:, 0])))
+
+    def positions(self, cells) -> np.ndarray:
+        """Cell centers in mm"""
+        return (np.asarray(cells, float).reshape(-1, 2) + 0.5) * self.resolution
+
+    def fastest(self, grid: np.ndarray, path, theta) -> np.ndarray:
+        """
+        Waypoints (cells) through the corners of a grid path that take the least time, each one in sight of the next
+        Never slower than vectorize_path
+        theta: robot heading at the start of the path (rad)
+        """
+        path = np.asarray(path).reshape(-1, 2)
+        if len(path) < 3:
+            return path
+        # The string pulled corners, and others spread along the path up to MAX_CANDIDATES
+        corners = path[path_corners(path)]
+        index = {tuple(cell): i for i, cell in enumerate(corners.tolist())}
+        pulled = {index[tuple(cell)] for cell in vectorize_path(grid, path).tolist()}
+        others = np.setdiff1d(np.arange(len(corners)), list(pulled))
+        extra = max(MAX_CANDIDATES - len(pulled), 0)
+        if len(others) > extra:
+            others = others[np.linspace(0, len(others) - 1, extra).round().astype(np.intp)] if extra else others[:0]
+        nodes = np.union1d(list(pulled), others)
+        cells = corners[nodes]
+        n = len(cells)
+
+        a, b = np.triu_indices(n, 1)
+        visible = np.zeros((n, n), bool)
+        visible[a, b] = lines_of_sight(grid, cells[a], cells[b])
+        # Consecutive corners are linked by the path itself
+        linked = np.flatnonzero(np.diff(nodes) == 1)
+        visible[linked, linked + 1] = True
+
+        points = self.positions(cells)
+        delta = points[None, :] - points[:, None]
+        heading = np.arctan2(delta[..., 1], delta[..., 0])
+        drive = np.where(visible, self.drive(np.hypot(delta[..., 0], delta[..., 1])), np.inf)
+
+        # times[i, j]: fastest to j with the last line from i
+        times = np.full((n, n), np.inf)
+        previous = np.zeros((n, n), np.intp)
+        times[0] = self.turn(heading[0] - theta) + drive[0]
+        for j in range(1, n - 1):
+            before = np.flatnonzero(np.isfinite(times[:j, j]))
+            after = np.flatnonzero(visible[j, j + 1:]) + j + 1
+            if not len(before) or not len(after):
+                continue
+            total = times[before, j][:, None] + self.turn(heading[j, after][None, :] - heading[before, j][:, None])
+            best = np.argmin(total, axis=0)
+            times[j, after] = total[best, np.arange(len(after))] + drive[j, after]
+            previous[j, after] = before[best]
+
+        waypoints = [n - 1, int(np.argmin(times[:, n - 1]))]
+        while waypoints[-1]:
+            waypoints.append(int(previous[waypoints[-1], waypoints[-2]]))
+        return cells[waypoints[::-1]]
+
+    def best(self, candidates, theta) -> int:
+        """Index of the fastest of the waypoint lists in mm"""
+        return int(np.argmin([self.duration(points, theta) for points in candidates]))
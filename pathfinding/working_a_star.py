@@ -10,21 +10,38 @@ import platform
 
 DIR = os.path.dirname(__file__)
 
-if platform.system() == 'Windows':
-    c_astar = CDLL(os.path.join(DIR, 'libAstar.dll')).grid_astar
-else:
-    if not os.path.exists(os.path.join(DIR, 'libAstar.so')):
-        print('Astar library not found, building it')
-        old_dir = os.getcwd()
-        os.chdir(DIR)
-        os.system('sh ./build_c_astar.sh')
-        os.chdir(old_dir)
-        print('Astar libray built')
-    c_astar = CDLL(os.path.join(DIR, 'libAstar.so')).grid_astar
-
-c_astar.restype = POINTER(c_uint32)
+# Compiled extension, built with build_c_astar.sh
+try:
+    from . import castar
+except ImportError:
+    try:
+        import castar
+    except ImportError:
+        castar = None
+
+# Compiled planners, one per grid shape so their workspace is reused
+c_planners = {}
+
+# ctypes fallback on the bare library (prebuilt dll on Windows)
+c_astar = c_astar_free = None
+if castar is None:
+    LIB_PATH = os.path.join(DIR, 'libAstar.dll' if platform.system() == 'Windows' else 'libAstar.so')
+    if os.path.exists(LIB_PATH):
+        lib = CDLL(LIB_PATH)
+        c_astar = lib.grid_astar
+        c_astar.restype = POINTER(c_uint32)
+        # Older builds don't export it
+        c_astar_free = getattr(lib, 'grid_astar_free', None)
+    else:
+        print('Astar library not found, run build_c_astar.sh to use shortest_path_c')
+
 MAX_UINT32 = 0xffffffff
 
+# Cells checked at once by lines_of_sight, bounds its memory on fine grids
+LINE_OF_SIGHT_CHUNK = 1 << 16
+# Corners string pulling checks at once
+VECTORIZE_WINDOW = 32
+
 
 class Graph:
     """Graph interface"""
@@ -59,6 +76,7 @@ class BinaryGridGraph(Graph):
         """
         self.width, self.height = grid.shape
         self.grid = grid
+        self.connectivity = connectivity
         self.has_updated_collider_since_last_path_calculation = False
 
         self.get_neighbors = (self.get_4_neighbors, self.get_8_neighbors)[connectivity]
@@ -107,7 +125,7 @@ class BinaryGridGraph(Graph):
         return hash_value % self.width, hash_value // self.width
 
     def __setitem__(self, item, value):
-        if self.grid[item] != value:
+        if np.any(self.grid[item] != value):
             self.has_updated_collider_since_last_path_calculation = True
         self.grid[item] = value
 
@@ -145,13 +163,14 @@ class MinHeap(list):
         self[0] = self.pop()
         self.indices[self[0]] = 0
 
+        # Ties go down like heap_extract_min in c_src/min_heap.c, both pop in the same order
         index = 0
         while 2 * index + 1 < len(self):
             minimum, min_index = self.key(self[index]), index
             left, right = 2 * index + 1, 2 * index + 2
-            if left < len(self) and self.key(self[left]) < minimum:
+            if left < len(self) and self.key(self[left]) <= minimum:
                 minimum, min_index = self.key(self[left]), left
-            if right < len(self) and self.key(self[right]) < minimum:
+            if right < len(self) and self.key(self[right]) <= minimum:
                 min_index = right
 
             # index is the min, no need go further down
@@ -235,6 +254,83 @@ def shortest_path(graph: Graph, start, end) -> tuple[list, np.ndarray]:
         path.insert(0, current)
     return path, costs
 
+class AStarPlanner:
+    """
+    A* keeping its arrays between queries on the same graph
+
+    A node belongs to the current query only if its stamp is the current generation,
+    so a query only touches the nodes it expands
+    """
+
+    def __init__(self, graph: Graph):
+        self.graph = graph
+        self.costs, self.heuristics, self.predecessors = (
+            graph.caching_array(np.int32, -1),
+            graph.caching_array(np.int32, -1),
+            graph.caching_array(np.int32, -1)
+        )
+        self.stamps = graph.caching_array(np.uint32, 0)
+        self.generation = 0
+        self.heap = MinHeap(graph.caching_array(np.int32, -1), self.f_score)
+
+    def f_score(self, node):
+        # Favor closest to the end
+        return self.costs[node] + self.heuristics[node], self.heuristics[node]
+
+    def meet(self, node, cost, predecessor, end):
+        self.stamps[node] = self.generation
+        self.costs[node] = cost
+        self.predecessors[node] = predecessor
+        self.heuristics[node] = self.graph.heuristic(node, end)
+        self.heap.push(node)
+
+    def shortest_path(self, start, end) -> list:
+        """Same as shortest_path, returns the path only (see visited_costs)"""
+        graph, costs, predecessors, stamps, heap = self.graph, self.costs, self.predecessors, self.stamps, self.heap
+
+        self.generation += 1
+        if self.generation > np.iinfo(np.uint32).max:
+            stamps[:] = 0
+            self.generation = 1
+        generation = self.generation
+
+        for node in (start if isinstance(start, list) else [start]):
+            self.meet(node, 0, -1, end)
+
+        while heap:
+            current_node = heap.extract_min()
+            if current_node == end:
+                break
+
+            for nb, cost in graph.get_neighbors(current_node):
+                cost += costs[current_node]
+                # Have I met that guy ?
+                if stamps[nb] != generation:
+                    self.meet(nb, cost, graph.hash(current_node), end)
+                # Is it a better path ?
+                elif cost < costs[nb]:
+                    costs[nb] = cost
+                    predecessors[nb] = graph.hash(current_node)
+                    heap.update(nb)
+
+        # Only the nodes left in the heap need their index reset
+        for node in heap:
+            heap.indices[node] = -1
+        heap.clear()
+
+        if stamps[end] != generation:
+            return []
+        path, current = [end], end
+        while predecessors[current] != -1:
+            current = graph.de_hash(predecessors[current])
+            path.insert(0, current)
+        return path
+
+    def visited_costs(self) -> np.ndarray:
+        """Costs of the last query, -1 for nodes it didn't reach (visual debug)"""
+        return np.where(self.stamps == self.generation, self.costs, -1)
+
+
 def shortest_path_no_heap_optimization(graph: Graph, start, end) -> tuple[list, np.ndarray]:
     """
     A* shortest path algorithm
@@ -293,75 +389,165 @@ def shortest_path_no_heap_optimization(graph: Graph, start, end) -> tuple[list,
     return path, costs
 
 
-def shortest_path_c(grid: np.ndarray, start, end):
+def shortest_path_c(grid: np.ndarray, start, end, jps=False, table=None) -> np.ndarray:
     """
     A* algorithm on grid graph, 8-connected, with heap optimization
     compiled in c
+
+    return (n, 2) array of (x, y), empty if end can't be reached.
+    The GIL is released while planning, it can run in a worker thread.
+    jps: Jump Point Search instead, same path cost, JPS+ when given table = castar.jps_table(grid)
     """
+    if castar is not None:
+        planner = c_planners.get(grid.shape)
+        if planner is None:
+            planner = c_planners[grid.shape] = castar.Planner(grid.shape)
+        if jps or table is not None:
+            return planner.plan_jps(grid, start, end, table)
+        return planner.plan(grid, start, end)
+    if jps or table is not None:
+        raise RuntimeError('Jump Point Search needs the castar extension, run build_c_astar.sh')
+    if c_astar is None:
+        raise RuntimeError('Astar library not built, run build_c_astar.sh')
+
+    grid = np.ascontiguousarray(grid, np.uint8)
     width, height = grid.shape
-    start = width * start[1] + start[0]
-    end = width * end[1] + end[0]
+    start = height * start[0] + start[1]
+    end = height * end[0] + end[1]
     result = c_astar(width, height, grid.ctypes.data_as(POINTER(c_uint8)), start, end)
-    index, path = 0, []
-    while result[index] != MAX_UINT32:
-        x, y = divmod(result[index], height)
-        path.append((x, y))
-        index += 1
-    return path
-
-
-def simplify_path(path):
-    i = 1
-    while i < len(path) - 1:
-        delta0: tuple[int, int] = (path[i][0] - path[i - 1][0]), (path[i][1] - path[i - 1][1])
-        inv_norm0 = 1.0 / np.sqrt(delta0[0] ** 2 + delta0[1] ** 2)
-        delta0[0] *= inv_norm0
-        delta0[1] *= inv_norm0
-        delta1: tuple[int, int] = (path[i + 1][0] - path[i][0]), (path[i + 1][1] - path[i][1])
-        inv_norm1 = 1.0 / np.sqrt(delta1[0] ** 2 + delta1[1] ** 2)
-        delta1[0] *= inv_norm1
-        delta1[1] *= inv_norm1
-
-        diff = delta0[0] - delta1[0], delta0[1] - delta1[1]
-
-        if diff[0] ** 2 + diff[1] ** 2 < 0.1:
-            del path[i]
-        else:
-            i += 1
-
-
-def collide_on_line(pos_from: tuple[int, int], pos_to: tuple[int, int]) -> bool:
-    x0 = min(pos_from[0], pos_to[0])
-    x1 = max(pos_from[0], pos_to[0])
-    y0 = min(pos_from[1], pos_to[1])
-    y1 = max(pos_from[1], pos_to[1])
-
-    dx = x1 - x0
-    dy = y1 - y0
-    if dx > dy:
-        for x in range(int(x0), int(x1 + 1)):
-            y = int(y0 + dy * (x - x1) / dx)
-            if self.board[y][x] == 1:
-                return True
-        for y in range(int(y0), int(y1 + 1)):
-            x = int(x0 + dx * (y - y1) / dy)
-            if self.board[y][x] == 1:
-                return True
-    return False
-
-
-def vectorize_path(path, pos: tuple[int, int]):
-    for i in range(len(path) - 1, 0, -1):
-        if not collide_on_line(pos, path[i]):
-            for j in range(i - 1):
-                path.pop(1)
-            return
-
-
-def shortest_vectorized_path(grid: np.ndarray, start, end):
+    length = 0
+    while result[length] != MAX_UINT32:
+        length += 1
+    path = np.ctypeslib.as_array(result, (length,)).astype(np.intp)
+    if c_astar_free is not None:
+        c_astar_free(result)
+    return np.stack(np.divmod(path, height), axis=1)
+
+
+def path_corners(path) -> np.ndarray:
+    """Indices of the ends and the points where the path changes direction"""
+    path = np.asarray(path).reshape(-1, 2)
+    if len(path) < 3:
+        return np.arange(len(path))
+    before, after = np.diff(path[:-1], axis=0), np.diff(path[1:], axis=0)
+    cross = before[:, 0] * after[:, 1] - before[:, 1] * after[:, 0]
+    dot = np.sum(before * after, axis=1)
+    keep = np.ones(len(path), bool)
+    keep[1:-1] = (cross != 0) | (dot <= 0)
+    return np.flatnonzero(keep)
+
+
+def simplify_path(path) -> np.ndarray:
+    """Path without the points in the middle of straight lines"""
+    path = np.asarray(path).reshape(-1, 2)
+    return path[path_corners(path)]
+
+
+def lines_of_sight(grid: np.ndarray, starts, ends) -> np.ndarray:
+    """
+    For each segment between the cell centers starts[k] and ends[k], is every cell it goes through free
+    All segments at once, passing exactly on a corner is allowed like the diagonal moves
+    """
+    starts, ends = np.asarray(starts, np.int64).reshape(-1, 2), np.asarray(ends, np.int64).reshape(-1, 2)
+    starts, ends = np.broadcast_arrays(starts, ends)
+    delta = ends - starts
+    # In chunks of about LINE_OF_SIGHT_CHUNK cells, one entry per cell is built for each segment
+    cells = np.cumsum(np.abs(delta).max(axis=1) + 1)
+    if len(cells) > 1 and cells[-1] > LINE_OF_SIGHT_CHUNK:
+        result, first = [], 0
+        while first < len(cells):
+            done = cells[first - 1] if first else 0
+            last = max(int(np.searchsorted(cells, done + LINE_OF_SIGHT_CHUNK, side='right')), first + 1)
+            result.append(lines_of_sight(grid, starts[first:last], ends[first:last]))
+            first = last
+        return np.concatenate(result)
+
+    # Walk along the major axis, the segment covers at most 2 cells per column
+    swap = np.abs(delta[:, 1]) > np.abs(delta[:, 0])
+    major, minor = np.where(swap, 1, 0), np.where(swap, 0, 1)
+    rows = np.arange(len(starts))
+    d_major, d_minor = delta[rows, major], delta[rows, minor]
+    length, width = np.abs(d_major), np.abs(d_minor)
+
+    # One entry per column of every segment
+    segment = np.repeat(rows, length + 1)
+    i = np.arange(len(segment)) - np.repeat(np.cumsum(length + 1) - length - 1, length + 1)
+    n, m = length[segment], width[segment]
+
+    # Minor coordinate range of the segment in the column, scaled by 2 * n
+    low = np.where(i == 0, 0, m * (2 * i - 1))
+    high = np.where(i == n, 2 * n * m, m * (2 * i + 1))
+    n = np.maximum(n, 1)
+    # Cells j with (j - 0.5, j + 0.5) overlapping it
+    first = (low - n) // (2 * n) + 1
+    last = -((-high - n) // (2 * n)) - 1
+    first, last = np.minimum(first, last), np.maximum(first, last)
+
+    sign_major = np.sign(d_major)[segment]
+    sign_minor = np.sign(d_minor)[segment]
+    major_pos = starts[segment, major[segment]] + sign_major * i
+    blocked = np.zeros(len(segment), bool)
+    for j in (first, last):
+        minor_pos = starts[segment, minor[segment]] + sign_minor * j
+        xs = np.where(swap[segment], minor_pos, major_pos)
+        ys = np.where(swap[segment], major_pos, minor_pos)
+        blocked |= grid[xs, ys] != 0
+    return ~np.logical_or.reduceat(blocked, np.cumsum(length + 1) - length - 1)
+
+
+def collide_on_line(grid: np.ndarray, pos_from: tuple[int, int], pos_to: tuple[int, int]) -> bool:
+    return not lines_of_sight(grid, pos_from, pos_to)[0]
+
+
+def vectorize_path(grid: np.ndarray, path) -> np.ndarray:
+    """
+    String pulling on the corners of the path, from each waypoint straight to the farthest corner in sight,
+    looking at VECTORIZE_WINDOW corners at a time from the end
+    return the waypoints, each one in sight of the next
+    """
+    path = np.asarray(path).reshape(-1, 2)
+    if len(path) < 3:
+        return path
+    corners = path[path_corners(path)]
+    waypoints = [0]
+    while waypoints[-1] < len(corners) - 1:
+        origin = waypoints[-1]
+        # The next corner is always reachable, it's the path
+        reach = origin + 1
+        end = len(corners)
+        while end > reach + 1:
+            begin = max(end - VECTORIZE_WINDOW, reach + 1)
+            visible = np.flatnonzero(lines_of_sight(grid, corners[origin], corners[begin:end]))
+            if len(visible):
+                reach = begin + int(visible[-1])
+                break
+            end = begin
+        waypoints.append(reach)
+    return corners[waypoints]
+
+
+def shortest_vectorized_path(grid: np.ndarray, start, end) -> np.ndarray:
+    """Waypoints of the shortest path with straight lines between them, empty if end can't be reached"""
     path = shortest_path_c(grid, start, end)
+    return simplify_path(vectorize_path(grid, path))
 
-    simplify_path(path)
-    vectorize_path(path, path[0])
 
-    return path
+def path_to_moves(points, theta: float, reverse=False) -> list:
+    """
+    [(rho, theta), ...] for Asserv.move to follow a polyline, rotate by theta (rad) then drive rho
+    points: (n, 2) positions in mm from the robot position, theta: current robot heading (rad)
+    reverse: drive backwards (rho < 0) when it's less turning
+    """
+    points = np.asarray(points, float).reshape(-1, 2)
+    delta = np.diff(points, axis=0)
+    rho = np.hypot(delta[:, 0], delta[:, 1])
+    delta, rho = delta[rho > 0], rho[rho > 0]
+    headings = np.arctan2(delta[:, 1], delta[:, 0])
+    turns = np.diff(np.concatenate(([theta], headings)))
+    # Shortest way around, half a turn at most when it can go backwards
+    half = np.pi / 2 if reverse else np.pi
+    turns = (turns + half) % (2 * half) - half
+    if reverse:
+        # Backwards when the robot ends up facing away from the segment
+        rho = np.where(np.cos(theta + np.cumsum(turns) - headings) > 0, rho, -rho)
+    return [(float(r), float(t)) for r, t in zip(rho, turns)]